@@ -1,12 +1,16 @@
 
 from pymodbus.client import AsyncModbusTcpClient
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 from utils import is_nth_bit_on
 import asyncio
-from pymodbus.exceptions import ConnectionException, ModbusIOException
 from time import sleep
 import time
 from utils import IEG_MODE_bitmask_alternative, IEG_MODE_bitmask_default
+from register_map import build_register_map, plan_spans, decode_spans
+from pipelined_client import PipelinedModbusClient
+from fast_writer import ModbusCntrlFastWriter
+from retry_policy import RetryPolicy, CircuitBreaker
+from latency_stats import LatencyStats, TimedClient, FUNCTION_CODES
 
 class ModbusClients:
     def __init__(self, config, logger):
@@ -14,52 +18,64 @@ class ModbusClients:
         self.logger = logger
         self.client_left: Optional[AsyncModbusTcpClient] = None
         self.client_right: Optional[AsyncModbusTcpClient] = None
-        self.max_retries = 10
-        self.retry_delay = 0.2
+        self.retry_policy = RetryPolicy.from_config(config)
+        # Stopping, fault reset and homing get more attempts but still a bounded time,
+        # and reconnect a lost motor within it instead of failing on a link about to come back
+        self.critical_policy = RetryPolicy.from_config(config, max_attempts=10, deadline=config.CRITICAL_RETRY_DEADLINE,
+                                                       wait_for_connection=True)
+        self.connect_locks = {"left": asyncio.Lock(), "right": asyncio.Lock()}
+        self.breakers = {
+            side: CircuitBreaker(config.BREAKER_FAILURE_THRESHOLD, config.BREAKER_RESET_TIMEOUT)
+            for side in ("left", "right")
+        }
+        self.register_map = build_register_map(config)
+        self.span_plans = {}
+        self.fast_writers = {}
+        self.latency = LatencyStats()
+
+    def drive_address(self, side):
+        """
+        Returns (host, port) the given motor is reached at,
+        the local gateway if the config says so
+        """
+        if self.config.USE_GATEWAY:
+            port = self.config.GATEWAY_PORT_LEFT if side == "left" else self.config.GATEWAY_PORT_RIGHT
+            return self.config.GATEWAY_HOST, port
+        if side == "left":
+            return self.config.SERVER_IP_LEFT, self.config.SERVER_PORT_LEFT or self.config.SERVER_PORT
+        return self.config.SERVER_IP_RIGHT, self.config.SERVER_PORT_RIGHT or self.config.SERVER_PORT
+
+    def _create_client(self, host, port):
+        if self.config.PIPELINED:
+            return PipelinedModbusClient(host=host, port=port, config=self.config, logger=self.logger)
+        return AsyncModbusTcpClient(host=host, port=port)
 
     async def connect(self):
         """
-        Establishes connections to both Modbus clients.
+        Establishes connections to both Modbus clients in parallel.
+        Existing client objects are reused so this can also be used to reconnect.
         Returns True if both connections are successful, or False if either fails
         and returns None if error
         """
         try:
-            self.client_left = AsyncModbusTcpClient(
-                host=self.config.SERVER_IP_LEFT,
-                port=self.config.SERVER_PORT 
-            )
+            if self.client_left is None or self.client_right is None:
+                self.client_left = self._create_client(*self.drive_address("left"))
+                self.client_right = self._create_client(*self.drive_address("right"))
+                if self.config.LATENCY_STATS:
+                    self.client_left = TimedClient(self.client_left, "left", self.latency)
+                    self.client_right = TimedClient(self.client_right, "right", self.latency)
 
-            self.client_right = AsyncModbusTcpClient(
-                host=self.config.SERVER_IP_RIGHT,
-                port=self.config.SERVER_PORT  
+            max_attempts = 3
+            left_connected, right_connected = await asyncio.gather(
+                self.connect_side("left", max_attempts),
+                self.connect_side("right", max_attempts)
             )
 
-            left_connected = False
-            right_connected = False
-            max_attempts = 3
-            attempt_left = 0
-            attempt_right = 0
-
-            while (not left_connected or not right_connected) and \
-            (attempt_left < max_attempts or attempt_right < max_attempts):
-                if not left_connected:
-                    left_connected = await self.client_left.connect()
-                    attempt_left += 1
-                    if not left_connected:
-                         self.logger.debug(f"Left connection attempt {attempt_left} failed")
-
-                if not right_connected:
-                    right_connected = await self.client_right.connect()
-                    attempt_right += 1
-                    if not right_connected:
-                         self.logger.debug(f"Right connection attempt {attempt_right} failed")
-                
             if left_connected and right_connected:
                 self.logger.info("Both clients connected succesfully")
 
-                # if "fault_poller.py" in self.config.MODULE_NAME:
-                #     self.client_left.ctx.next_tid = self.config.START_TID
-                #     self.client_right.ctx.next_tid = self.config.START_TID
+                if self.config.FAST_CNTRL_WRITE:
+                    await self.connect_fast_writers()
 
                 return True
             else: 
@@ -71,11 +87,35 @@ class ModbusClients:
             self.logger.error(f"Error connecting to clients {str(e)}")
             return None
 
-    # def check_and_reset_tids(self):
-    #     for client in [self.client_left, self.client_right]:
-    #         if client and client.ctx.next_tid >= self.config.LAST_TID:
-    #             client.ctx.next_tid = self.config.START_TID
-    #             self.logger.debug(f"Reset TID for client")
+    async def connect_side(self, side, max_attempts=1) -> bool:
+        """
+        Connects the client of one motor, returns True if connected.
+        One connect at a time per motor, a caller arriving during one waits for its result
+        """
+        client = self.client_for(side)
+        async with self.connect_locks[side]:
+            for attempt in range(1, max_attempts + 1):
+                if client.connected or await client.connect():
+                    return True
+                self.logger.debug(f"{side.capitalize()} connection attempt {attempt} failed")
+        return False
+
+    async def _wait_for_connection(self, side, deadline) -> bool:
+        """
+        Reconnects one motor, or waits for the reconnect the connection supervisor
+        already started, until deadline (event loop time). Returns True once connected
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                if await asyncio.wait_for(self.connect_side(side), timeout=remaining):
+                    return True
+            except asyncio.TimeoutError:
+                return False
+            await asyncio.sleep(min(self.config.RECONNECT_MIN_DELAY, max(0, deadline - loop.time())))
 
     async def reset_motors(self):
         """ 
@@ -85,89 +125,235 @@ class ModbusClients:
         await self.client_left.write_register(address=4001, value=1)
         await self.client_right.write_register(address=4001, value=1)
 
-    async def get_recent_fault(self) -> tuple[Optional[int], Optional[int]]:
+
+    async def _request_with_retries(self, client, side, request, description, max_retries=None,
+                                    quiet=False, policy=None, use_breaker=True, record_breaker=True):
         """
-        Read fault registers from both clients.
-        Returns tuple of (left_fault, right_fault), None if read fails
+        Sends one request to a single motor and retries it on its own
+        until it succeeds, the attempts are used up or the policy deadline passes.
+        Args:
+            client: Modbus client of the motor
+            side (str): "left" or "right", used in the log lines
+            request: coroutine function taking the client and returning a Modbus response
+            description (str): what is being done, eg. "set analog position max"
+            max_retries (int): how many attempts this motor gets, overrides the policy
+            quiet (bool): log success only on debug level, for high rate requests
+            policy (RetryPolicy): deadline and backoff, self.retry_policy if None
+            use_breaker (bool): fail fast if the motors circuit breaker is open
+            record_breaker (bool): count the result in the circuit breaker, off for keepalives
+                so they never close or trip it past the half open probe
+        Returns:
+            The successful response or None if every attempt failed
         """
-        try:
-            left_response = await self.client_left.read_holding_registers(
-                address=self.config.RECENT_FAULT_ADDRESS,
-                count=1,
-                slave=self.config.SLAVE_ID
-            )
-            right_response = await self.client_right.read_holding_registers(
-                address=self.config.RECENT_FAULT_ADDRESS,
-                count=1,
-                slave=self.config.SLAVE_ID
-            )
+        policy = policy or self.retry_policy
+        max_retries = max_retries or policy.max_attempts
+        breaker = self.breakers[side]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + policy.deadline
+
+        for attempt in range(1, max_retries + 1):
+            if not client.connected and policy.wait_for_connection:
+                if not await self._wait_for_connection(side, deadline):
+                    self.logger.error(f"Failed to {description} on {side} motor: not connected "
+                                      f"within the {policy.deadline} s deadline")
+                    return None
+            elif not client.connected:
+                # Connection supervisor reconnects in the background, no point waiting here
+                self.logger.error(f"Failed to {description} on {side} motor: not connected")
+                return None
 
-            if left_response.isError() or right_response.isError():
-                self.logger.error("Error reading fault register")
-                return None, None
-            
-            return left_response.registers[0], right_response.registers[0]
+            # Checked before the breaker so an admitted half open probe is always sent
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
 
-        except Exception as e:
-                self.logger.error(f"Exception reading fault registers: {str(e)}")
-                return None, None
-        
-    async def fault_reset(self, mode = "default"):
-        try:
-            if not (isinstance(mode, str)):
-                raise TypeError(f"Wrong type for the parameter it should be a string")
-            
-            if (mode.upper() not in ("DEFAULT", "ALTERNATIVE")):
-                raise ValueError(f"Invalid mode: {mode}. Expected 'DEFAULT' or 'ALTERNATIVE'.")
-            
-            # Makes sure bits can be only valid bits that we want to control
-            # no matter what you give as a input
-            if mode == "DEFAULT":
-                value = IEG_MODE_bitmask_default(65535)
-            else:
-                value = IEG_MODE_bitmask_alternative(65535)
+            if use_breaker and not breaker.allow():
+                self.logger.error(f"Failed to {description} on {side} motor: circuit breaker is open")
+                return None
 
-            attempt_count = 0
-            max_retries = self.max_retries
-            retry_delay = self.retry_delay
+            if attempt > 1:
+                self.latency.record_retry(side, description)
 
-            while attempt_count < max_retries:
-                responses = await asyncio.gather(
-                    self.client_left.write_register(
-                    address=self.config.IEG_MODE,
-                    value=value,
-                    slave=self.config.SLAVE_ID
-                ),
-                    self.client_right.write_register(
-                    address=self.config.IEG_MODE,
-                    value=value,
-                    slave= self.config.SLAVE_ID
-                ),
-                return_exceptions=True
-                )
+            try:
+                response = await asyncio.wait_for(request(client), timeout=remaining)
+                if not response.isError():
+                    if record_breaker:
+                        breaker.record_success()
+                    if quiet:
+                        self.logger.debug(f"Successfully {description} on {side} motor")
+                    else:
+                        self.logger.info(f"Successfully {description} on {side} motor")
+                    return response
 
-                left_response, right_response = responses
+                self.logger.error(f"Failed to {description} on {side} motor. Attempt {attempt}/{max_retries}")
+            except asyncio.TimeoutError:
+                self.logger.error(f"Deadline of {policy.deadline} s passed while trying to {description} "
+                                  f"on {side} motor. Attempt {attempt}/{max_retries}")
+            except Exception as e:
+                self.logger.error(f"Exception while trying to {description} on {side} motor. "
+                                  f"Attempt {attempt}/{max_retries}: {str(e)}")
+            if record_breaker:
+                breaker.record_failure()
 
-                if isinstance(left_response, Exception) or isinstance(right_response, Exception):
-                    attempt_count += 1
-                    self.logger.error("Exception during trying to do a fault reset")
-                    await asyncio.sleep(retry_delay*3)
-                    continue
+            if attempt < max_retries:
+                await asyncio.sleep(min(policy.delay(attempt), max(0, deadline - loop.time())))
 
-                if left_response.isError() or right_response.isError():
-                    attempt_count += 1
-                    self.logger.error("Error resetting faults")
-                    await asyncio.sleep(retry_delay*3)
-                    continue
+        return None
+
+    async def _request_both(self, request_left, request_right, description, max_retries=None,
+                            policy=None, use_breaker=True):
+        """
+        Sends requests to both motors concurrently, every motor is retried on its own
+        so a failing side does not stall the healthy one.
+        Returns:
+            tuple of (response_left, response_right) where a side is None if it failed
+        """
+        response_left, response_right = await asyncio.gather(
+            self._request_with_retries(self.client_left, "left", request_left, description,
+                                       max_retries, policy=policy, use_breaker=use_breaker),
+            self._request_with_retries(self.client_right, "right", request_right, description,
+                                       max_retries, policy=policy, use_breaker=use_breaker)
+        )
+
+        if response_left is None or response_right is None:
+            self.logger.error(f"Failed to {description} on both motors. "
+                              f"Left: {response_left is not None}, Right: {response_right is not None}")
+        else:
+            self.logger.info(f"Successfully {description} on both motors")
+
+        return response_left, response_right
+
+    async def _write_both(self, address, value_left, value_right, description, max_retries=None,
+                          policy=None, use_breaker=True) -> bool:
+        """
+        Writes value_left to the left motor and value_right to the right motor concurrently.
+        A value can be a single int (write_register) or a list of ints (write_registers).
+        Returns:
+            bool: True if successful for both motors, False otherwise.
+        """
+        def writer(value):
+            if isinstance(value, (list, tuple)):
+                return lambda client: client.write_registers(address=address, values=list(value), slave=self.config.SLAVE_ID)
+            return lambda client: client.write_register(address=address, value=value, slave=self.config.SLAVE_ID)
+
+        response_left, response_right = await self._request_both(
+            writer(value_left), writer(value_right), description, max_retries,
+            policy=policy, use_breaker=use_breaker
+        )
+        return response_left is not None and response_right is not None
+
+    def client_for(self, side):
+        return self.client_left if side == "left" else self.client_right
+
+    async def write_register_on(self, side, address, value, description, max_retries=1) -> bool:
+        """
+        Writes a single register on one motor only, used by the control loop
+        so a slow drive does not hold back the other one.
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        def writer(client):
+            return client.write_register(address=address, value=value, slave=self.config.SLAVE_ID)
+
+        response = await self._request_with_retries(self.client_for(side), side, writer,
+                                                    description, max_retries, quiet=True)
+        return response is not None
+
+    async def ping(self, side) -> bool:
+        """
+        Cheap single register read used as a keepalive of one motor's connection.
+        Ignores the circuit breaker so a recovered drive is noticed, and leaves its
+        state alone, only real requests open it or close it through the half open probe.
+        """
+        def reader(client):
+            return client.read_holding_registers(address=self.config.OEG_STATUS, count=1,
+                                                 slave=self.config.SLAVE_ID)
+
+        response = await self._request_with_retries(self.client_for(side), side, reader, "keepalive read",
+                                                    max_retries=1, quiet=True, use_breaker=False,
+                                                    record_breaker=False)
+        return response is not None
+
+    async def connect_fast_writers(self):
+        """
+        Opens the raw socket ModbusCtrl fast path to both motors,
+        a side that fails to connect falls back to the normal client
+        """
+        for side in ("left", "right"):
+            host, port = self.drive_address(side)
+            writer = ModbusCntrlFastWriter(host, port, self.config, self.logger,
+                                           use_table=self.config.FAST_CNTRL_TABLE)
+            if await writer.connect():
+                self.fast_writers[side] = writer
+            else:
+                self.logger.warning(f"Using normal client for ModbusCtrl writes on {side} motor")
 
+    async def write_modbus_cntrl_on(self, side, value) -> bool:
+        """
+        Writes ANALOG_MODBUS_CNTRL on one motor, through the fast path if it is in use
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        writer = self.fast_writers.get(side)
+        if writer is not None:
+            breaker = self.breakers[side]
+            if not breaker.allow():
+                return False
+            start = time.perf_counter_ns()
+            success = (writer.connected or await writer.connect()) and await writer.write(value)
+            self.latency.record(side, FUNCTION_CODES["write_register"], self.config.ANALOG_MODBUS_CNTRL,
+                                time.perf_counter_ns() - start, error=not success)
+            if success:
+                breaker.record_success()
                 return True
-            
+            breaker.record_failure()
             return False
 
-        except (ConnectionException, asyncio.exceptions.TimeoutError, ModbusIOException) as e:
-            self.logger.error(f"Exception reading fault registers: {str(e)}")
-            return False
-        
+        return await self.write_register_on(side, self.config.ANALOG_MODBUS_CNTRL,
+                                             value, "set analog modbuscntrl value")
+
+    async def _read_both(self, address, count, description, max_retries=None):
+        """
+        Reads count registers starting from address from both motors concurrently.
+        Returns:
+            tuple of (response_left, response_right) where a side is None if it failed
+        """
+        def reader(client):
+            return client.read_holding_registers(address=address, count=count, slave=self.config.SLAVE_ID)
+
+        return await self._request_both(reader, reader, description, max_retries)
+
+    async def get_recent_fault(self) -> tuple[Optional[int], Optional[int]]:
+        """
+        Read fault registers from both clients.
+        Returns tuple of (left_fault, right_fault), None if read fails
+        """
+        left_response, right_response = await self._read_both(
+            self.config.RECENT_FAULT_ADDRESS, 1, "read fault register", max_retries=1
+        )
+
+        if left_response is None or right_response is None:
+            return None, None
+
+        return left_response.registers[0], right_response.registers[0]
+
+    async def fault_reset(self, mode = "default"):
+        if not (isinstance(mode, str)):
+            raise TypeError(f"Wrong type for the parameter it should be a string")
+
+        if (mode.upper() not in ("DEFAULT", "ALTERNATIVE")):
+            raise ValueError(f"Invalid mode: {mode}. Expected 'DEFAULT' or 'ALTERNATIVE'.")
+
+        # Makes sure bits can be only valid bits that we want to control
+        # no matter what you give as a input
+        if mode == "DEFAULT":
+            value = IEG_MODE_bitmask_default(65535)
+        else:
+            value = IEG_MODE_bitmask_alternative(65535)
+
+        return await self._write_both(self.config.IEG_MODE, value, value,
+                                      "reset faults", policy=self.critical_policy)
+
     async def check_fault_stauts(self) -> Optional[bool]:
         """
         Read drive status from both motors.
@@ -175,134 +361,92 @@ class ModbusClients:
         otherwise false
         or None if it fails
         """
-        try:
-            result = False
-            
-            left_response = await self.client_left.read_holding_registers(
-                address=self.config.OEG_STATUS,
-                count=1,
-                slave=self.config.SLAVE_ID
-            )
-            right_response = await self.client_right.read_holding_registers(
-                address=self.config.OEG_STATUS,
-                count=1,
-                slave=self.config.SLAVE_ID
-            )
+        left_response, right_response = await self._read_both(
+            self.config.OEG_STATUS, 1, "read driver status register", max_retries=1
+        )
 
-            if left_response.isError() or right_response.isError():
-                self.logger.error("Error reading driver status register")
-                return None
+        if left_response is None or right_response is None:
+            return None
 
-            # 4th bit 2^4 indicates if motor is in the fault state
-            if(is_nth_bit_on(3, left_response.registers[0]) or is_nth_bit_on(3, right_response.registers[0])):
-                 result = True
-            
-            return result
+        # 4th bit 2^4 indicates if motor is in the fault state
+        return is_nth_bit_on(3, left_response.registers[0]) or is_nth_bit_on(3, right_response.registers[0])
 
-        except Exception as e:
-                self.logger.error(f"Exception checking fault status: {str(e)}")
-                return None
-    
     async def get_vel(self):
         """
         Gets velocity from both registers returns None if error
         """
-        try:
-            left_response = await  self.client_left.read_holding_registers(
-                address=self.config.VFEEDBACK_VELOCITY,
-                count=1,
-                slave=self.config.SLAVE_ID
-            )
-            right_response = await self.client_right.read_holding_registers(
-                address=self.config.VFEEDBACK_VELOCITY,
-                count=1,
-                slave=self.config.SLAVE_ID
-            )
+        left_response, right_response = await self._read_both(
+            self.config.VFEEDBACK_VELOCITY, 1, "read velocity register", max_retries=1
+        )
 
-            if left_response.isError() or right_response.isError():
-                self.logger.error("Error reading velocity register")
-                return None, None
-            
-            return left_response.registers[0], right_response.registers[0]
+        if left_response is None or right_response is None:
+            return None, None
 
-        except Exception as e:
-                self.logger.error(f"Exception reading fault registers: {str(e)}")
-                return None, None
+        return left_response.registers[0], right_response.registers[0]
 
 
-    async def stop(self):
+    def plan_snapshot(self, names=None):
         """
-        Attempts to stop both motors by writing to the IEG_MOTION register.
-        Returns True if successful, False if failed after retries.
+        Returns the cached read spans for the given telemetry register names
+        (all registers in the register map if None)
         """
-        attempt_count = 0
-        max_retries = self.max_retries
-        retry_delay = self.retry_delay
+        key = tuple(sorted(names)) if names else tuple(sorted(self.register_map))
+        if key not in self.span_plans:
+            registers = [self.register_map[name] for name in key]
+            self.span_plans[key] = plan_spans(registers, max_gap=self.config.READ_SPAN_MAX_GAP)
+        return self.span_plans[key]
 
-        while attempt_count < max_retries:
-            try:
-                # Attempt to stop both motors in parallel
-                responses = await asyncio.gather(
-                    self.client_left.write_register(
-                        address=self.config.IEG_MOTION,
-                        value=4,
-                        slave=self.config.SLAVE_ID
-                    ),
-                    self.client_right.write_register(
-                        address=self.config.IEG_MOTION,
-                        value=4,
-                        slave=self.config.SLAVE_ID
-                    ),
-                    return_exceptions=True
+    def _snapshot_reader(self, names):
+        """
+        Request function reading the given telemetry registers from one client
+        """
+        spans = self.plan_snapshot(names)
+
+        async def read_spans(client):
+            span_values = []
+            for span in spans:
+                response = await client.read_holding_registers(
+                    address=span.address,
+                    count=span.count,
+                    slave=self.config.SLAVE_ID
                 )
+                if response.isError():
+                    return response
+                span_values.append(response.registers)
+            return decode_spans(spans, span_values)
 
-                left_response, right_response = responses
-
-                # Check for exceptions in the responses
-                if isinstance(left_response, Exception) or isinstance(right_response, Exception):
-                    attempt_count += 1
-                    self.logger.error(
-                        f"Exception during parallel write (attempt {attempt_count}/{max_retries}): "
-                        f"Left: {left_response}, Right: {right_response}"
-                    )
-                    await asyncio.sleep(retry_delay)
-                    continue
+        return read_spans
 
-                # Check for Modbus errors in the responses
-                if left_response.isError() or right_response.isError():
-                    attempt_count += 1
-                    self.logger.error(
-                        f"Modbus error stopping motors (attempt {attempt_count}/{max_retries}): "
-                        f"Left: {left_response}, Right: {right_response}"
-                    )
-                    await asyncio.sleep(retry_delay)
-                    continue
-
-                # Success
-                self.logger.info("Successfully stopped both motors")
-                return True
-
-            except (ConnectionException, asyncio.exceptions.TimeoutError, ModbusIOException) as e:
-                attempt_count += 1
-                self.logger.error(f"Connection error (attempt {attempt_count}/{max_retries}): {e}")
-
-                # Check if either client is disconnected
-                if not self.client_left.connected or not self.client_right.connected:
-                    self.logger.info("One or both clients disconnected. Attempting to reconnect...")
-                    await self.connect()
+    async def read_snapshot(self, names=None, max_retries=1):
+        """
+        Reads the requested telemetry registers (status, velocity, position, fault)
+        from both motors with as few read requests as possible.
+        Returns:
+            tuple of (left_snapshot, right_snapshot) DriveSnapshot objects,
+            a side is None if reading it failed
+        """
+        read_spans = self._snapshot_reader(names)
+        return await self._request_both(read_spans, read_spans, "read telemetry snapshot", max_retries)
 
-                if attempt_count < max_retries:
-                    self.logger.info(f"Retrying in {retry_delay} seconds...")
-                    await asyncio.sleep(retry_delay)
-                    continue
-                else:
-                    self.logger.error("Max retries reached. Failed to stop motors.")
-                    return False
+    async def read_snapshot_on(self, side, names=None, max_retries=1):
+        """
+        Reads the requested telemetry registers from one motor only, used by the
+        control loop so a slow drive does not hold back the other one.
+        Returns a DriveSnapshot or None if reading failed
+        """
+        return await self._request_with_retries(self.client_for(side), side, self._snapshot_reader(names),
+                                                "read telemetry snapshot", max_retries, quiet=True)
 
-            except Exception as e:
-                # Log unexpected errors and fail immediately
-                self.logger.error(f"Unexpected error while stopping motors: {e}")
-                return False
+    async def stop(self):
+        """
+        Attempts to stop both motors by writing to the IEG_MOTION register.
+        Stop is tried on both motors even if their circuit breaker is open,
+        but never for longer than the critical retry deadline.
+        Returns True if successful, False if failed after retries.
+        """
+        if await self._write_both(self.config.IEG_MOTION, 4, 4, "stop motors",
+                                  policy=self.critical_policy, use_breaker=False):
+            return True
 
         self.logger.error("Failed to stop motors after maximum retries. Critical failure!")
         return False
@@ -312,49 +456,18 @@ class ModbusClients:
         if self.client_left is not None and self.client_right is not None:
             self.client_left.close()
             self.client_right.close()    
+        for writer in self.fast_writers.values():
+            writer.close()
 
     async def home(self):
         try:
-            attempt_left = 0
-            attempt_right = 0
-            success_right = False
-            success_left = False
-            max_retries = self.max_retries
-            
-            response_left = await self.client_right.write_register(address=self.config.IEG_MOTION,
-                                value=0,
-                                slave=self.config.SLAVE_ID)
-            response_right = await self.client_left.write_register(address=self.config.IEG_MOTION,
-                                    value=0,
-                                    slave=self.config.SLAVE_ID)
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                if not success_left:
-                    response_left = await self.client_right.write_register(address=self.config.IEG_MOTION,
-                                            value=256,
-                                            slave=self.config.SLAVE_ID)
-                if not success_right:
-                    response_right = await self.client_left.write_register(address=self.config.IEG_MOTION,
-                                            value=256,
-                                            slave=self.config.SLAVE_ID)
-            
-                if response_left.isError():
-                    attempt_left += 1
-                    self.logger.error(f"Failed to initiate homing command on left. Attempt {attempt_left}")
-                else:
-                    success_left = True
-
-                if response_right.isError():
-                    attempt_right += 1
-                    self.logger.error(f"Failed to initiate homing command on right motor. Attempt {attempt_right}")
-                else:
-                    success_right = True
-                
-                if success_left and success_right:
-                    break
-            
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to initiate homing command on both motors. Left: {success_left} | right: Left: {success_right}")
+            # Clear motion bits first, homing starts on the rising edge
+            if not await self._write_both(self.config.IEG_MOTION, 0, 0, "clear motion command",
+                                          max_retries=1):
+                self.logger.warning("Clearing motion command before homing failed")
+
+            if not await self._write_both(self.config.IEG_MOTION, 256, 256, "initiate homing command",
+                                          policy=self.critical_policy):
                 return False
 
             ### homing order was success for both motos make a poller coroutine to poll when the homing is done.
@@ -363,17 +476,13 @@ class ModbusClients:
             start_time = time.time()
             elapsed_time = 0
             while elapsed_time <= homing_max_duration:
-                OEG_STATUS_right = await self.client_right.read_holding_registers(address=self.config.OEG_STATUS,
-                                    count=1,
-                                    slave=self.config.SLAVE_ID)
+                OEG_STATUS_left, OEG_STATUS_right = await self._read_both(
+                    self.config.OEG_STATUS, 1, "read OEG_STATUS register", max_retries=1
+                )
 
-                OEG_STATUS_left = await self.client_left.read_holding_registers(address=self.config.OEG_STATUS,
-                                        count=1,
-                                        slave=self.config.SLAVE_ID)
-                
-                if OEG_STATUS_right.isError() or OEG_STATUS_left.isError():
-                    self.logger.error(f"Unexpected error while reading OEG_STATUS registers: ")
+                if OEG_STATUS_right is None or OEG_STATUS_left is None:
                     await asyncio.sleep(0.2)
+                    elapsed_time = time.time() - start_time
                     continue
                 
                 ishomed_right = is_nth_bit_on(1, OEG_STATUS_right.registers[0])
@@ -404,61 +513,9 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            values = [decimal, whole]
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_registers(
-                        address=self.config.ANALOG_POSITION_MAXIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set analog position max on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set analog position max on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_registers(
-                        address=self.config.ANALOG_POSITION_MAXIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set analog position max on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set analog position max on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set analog position max on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set analog position max on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting analog position max: {str(e)}")
-            return False
+        values = [decimal, whole]
+        return await self._write_both(self.config.ANALOG_POSITION_MAXIMUM, values, values,
+                                      "set analog position max")
     
     async def set_analog_pos_min(self, decimal: int, whole: int) -> bool:
         """
@@ -469,61 +526,9 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            values = [decimal, whole]
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_registers(
-                        address=self.config.ANALOG_POSITION_MINIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set analog position min on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set analog position min on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_registers(
-                        address=self.config.ANALOG_POSITION_MINIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set analog position min on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set analog position min on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set analog position min on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set analog position min on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting analog position min: {str(e)}")
-            return False
+        values = [decimal, whole]
+        return await self._write_both(self.config.ANALOG_POSITION_MINIMUM, values, values,
+                                      "set analog position min")
     
     async def set_analog_vel_max(self, decimal: int, whole: int) -> bool:
         """
@@ -534,61 +539,9 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            values = [decimal, whole]
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_registers(
-                        address=self.config.ANALOG_VEL_MAXIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set analog velocity max on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set analog velocity max on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_registers(
-                        address=self.config.ANALOG_VEL_MAXIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set analog velocity max on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set analog velocity max on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set analog velocity max on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set analog velocity max on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting analog velocity max: {str(e)}")
-            return False
+        values = [decimal, whole]
+        return await self._write_both(self.config.ANALOG_VEL_MAXIMUM, values, values,
+                                      "set analog velocity max")
     
     async def set_analog_acc_max(self, decimal: int, whole: int) -> bool:
         """
@@ -599,61 +552,9 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            values = [decimal, whole]
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_registers(
-                        address=self.config.ANALOG_ACCELERATION_MAXIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set analog acceleration max on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set analog acceleration max on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_registers(
-                        address=self.config.ANALOG_ACCELERATION_MAXIMUM,
-                        values=values,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set analog acceleration max on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set analog acceleration max on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set analog acceleration max on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set analog acceleration max on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting analog acceleration max: {str(e)}")
-            return False
+        values = [decimal, whole]
+        return await self._write_both(self.config.ANALOG_ACCELERATION_MAXIMUM, values, values,
+                                      "set analog acceleration max")
     
     async def set_analog_input_channel(self, value: int) -> bool:
         """
@@ -663,60 +564,67 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_register(
-                        address=self.config.ANALOG_INPUT_CHANNEL,
-                        value=value,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set analog input channel on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set analog input channel on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_register(
-                        address=self.config.ANALOG_INPUT_CHANNEL,
-                        value=value,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set analog input channel on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set analog input channel on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set analog input channel on both motors. Left: {success_left}, Right: {success_right}")
-                return False
+        return await self._write_both(self.config.ANALOG_INPUT_CHANNEL, value, value,
+                                      "set analog input channel")
+        
+    def analog_parameter_registers(self, input_channel: int, pos_min: List[int], pos_max: List[int],
+                                   vel_max: List[int], acc_max: List[int]) -> Dict[int, List[int]]:
+        """
+        Register address -> values of the analog input channel and the position,
+        velocity and acceleration limits, limits are [decimal, whole] register pairs
+        """
+        return {
+            self.config.ANALOG_INPUT_CHANNEL: [input_channel],
+            self.config.ANALOG_POSITION_MINIMUM: list(pos_min),
+            self.config.ANALOG_POSITION_MAXIMUM: list(pos_max),
+            self.config.ANALOG_VEL_MAXIMUM: list(vel_max),
+            self.config.ANALOG_ACCELERATION_MAXIMUM: list(acc_max),
+        }
+
+    def analog_parameter_block(self, **parameters) -> Optional[Tuple[int, List[int]]]:
+        """
+        Start address and values of the analog parameter registers as one contiguous
+        block, None if they are not contiguous in this register map
+        """
+        registers = self.analog_parameter_registers(**parameters)
+        address = min(registers)
+        values = []
+        for register_address in sorted(registers):
+            if register_address != address + len(values):
+                return None
+            values += registers[register_address]
+        return address, values
 
-            self.logger.info("Successfully set analog input channel on both motors")
-            return True
+    async def set_analog_parameters(self, **parameters) -> bool:
+        """
+        Sets the analog input channel and the position, velocity and acceleration
+        limits for both motors. The registers are contiguous (7101 - 7109) so they
+        go out as one write_registers request per motor.
+        Args:
+            see analog_parameter_registers
+        Returns:
+            bool: True if successful for both motors, False otherwise.
+        """
+        block = self.analog_parameter_block(**parameters)
+        if block is None:
+            results = await asyncio.gather(*(
+                self._write_both(address, values, values, f"set analog parameter {address}")
+                for address, values in self.analog_parameter_registers(**parameters).items()
+            ))
+            return all(results)
+
+        address, values = block
+        return await self._write_both(address, values, values, "set analog parameters")
+
+    async def read_registers_both(self, address: int, count: int, description: str) -> Tuple[Optional[List[int]], Optional[List[int]]]:
+        """
+        Reads a block of registers from both motors with one request each.
+        Returns tuple of (left_values, right_values), a side is None if reading it failed
+        """
+        left_response, right_response = await self._read_both(address, count, description, max_retries=1)
+        return (left_response.registers if left_response is not None else None,
+                right_response.registers if right_response is not None else None)
 
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting analog input channel: {str(e)}")
-            return False
-        
     async def get_current_revs(self) ->  Union[Tuple[List[int], List[int]], bool]:
         """
         Gets the current REVS for both motors
@@ -726,59 +634,14 @@ class ModbusClients:
             - response_right: [decimal_part, whole_part] for the right motor
             Returns False if the operation is not successful.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.read_holding_registers(
-                        address=self.config.PFEEDBACK_POSITION,
-                        count=2,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to read current REVS on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully read current REVS on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.read_holding_registers(
-                        address=self.config.PFEEDBACK_POSITION,
-                        count=2,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to read current REVS on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully read current REVS on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to read current REVS on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully read current REVS on both motors")
-            return (response_left, response_right)
+        response_left, response_right = await self._read_both(
+            self.config.PFEEDBACK_POSITION, 2, "read current REVS"
+        )
 
-        except Exception as e:
-            self.logger.error(f"Unexpected error while reading motor REVS: {str(e)}")
+        if response_left is None or response_right is None:
             return False
+
+        return (response_left, response_right)
     
     async def set_analog_modbus_cntrl(self, values: Tuple[int, int]) -> bool:
         """
@@ -791,60 +654,9 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-            value_left, value_right = values
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_register(
-                        address=self.config.ANALOG_MODBUS_CNTRL,
-                        value=value_left,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set analog modbuscntrl value on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set analog modbuscntrl value on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_register(
-                        address=self.config.ANALOG_MODBUS_CNTRL,
-                        value=value_right,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set analog modbuscntrl value on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set analog modbuscntrl value on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set analog modbuscntrl value on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set analog modbuscntrl value on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting analog modbuscntrl value: {str(e)}")
-            return False
+        value_left, value_right = values
+        return await self._write_both(self.config.ANALOG_MODBUS_CNTRL, value_left, value_right,
+                                      "set analog modbuscntrl value")
     
     async def set_host_command_mode(self, value: int) -> bool:
         """
@@ -858,59 +670,8 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_register(
-                        address=self.config.COMMAND_MODE,
-                        value=value,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set host command mode value on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set host command mode value on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_register(
-                        address=self.config.COMMAND_MODE,
-                        value=value,
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set host command mode value on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set host command mode value on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set host command mode value on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set host command mode value on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting host command mode value: {str(e)}")
-            return False
+        return await self._write_both(self.config.COMMAND_MODE, value, value,
+                                      "set host command mode value")
         
     async def set_ieg_mode(self, value: int) -> bool:
         """
@@ -930,59 +691,5 @@ class ModbusClients:
         Returns:
             bool: True if successful for both motors, False otherwise.
         """
-        try:
-            attempt_left = 0
-            attempt_right = 0
-            success_left = False
-            success_right = False
-            max_retries = 3  # 3 retries for each motor
-
-            while max_retries > attempt_left and max_retries > attempt_right:
-                # Write to left motor if not yet successful
-                if not success_left:
-                    response_left = await self.client_left.write_register(
-                        address=self.config.IEG_MODE,
-                        value=IEG_MODE_bitmask_default(value),
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_left.isError():
-                        attempt_left += 1
-                        self.logger.error(f"Failed to set ieg mode value on left motor. Attempt {attempt_left}/{max_retries}")
-                    else:
-                        success_left = True
-                        self.logger.info("Successfully set ieg mode value on left motor")
-
-                # Write to right motor if not yet successful
-                if not success_right:
-                    response_right = await self.client_right.write_register(
-                        address=self.config.IEG_MODE,
-                        value=IEG_MODE_bitmask_default(value),
-                        slave=self.config.SLAVE_ID
-                    )
-                    if response_right.isError():
-                        attempt_right += 1
-                        self.logger.error(f"Failed to set ieg mode value on right motor. Attempt {attempt_right}/{max_retries}")
-                    else:
-                        success_right = True
-                        self.logger.info("Successfully set ieg mode value on right motor")
-
-                # Break if both are successful
-                if success_left and success_right:
-                    break
-
-                # Delay between retries
-                await asyncio.sleep(self.retry_delay)
-
-            if not success_left or not success_right:
-                self.logger.error(f"Failed to set ieg mode mode value on both motors. Left: {success_left}, Right: {success_right}")
-                return False
-
-            self.logger.info("Successfully set ieg mode mode value on both motors")
-            return True
-
-        except Exception as e:
-            self.logger.error(f"Unexpected error while setting ieg mode value: {str(e)}")
-            return False
-
-
-                    
\ No newline at end of file
+        value = IEG_MODE_bitmask_default(value)
+        return await self._write_both(self.config.IEG_MODE, value, value, "set ieg mode value")
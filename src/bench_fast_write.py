@@ -0,0 +1,108 @@
+"""
+Micro-benchmark of the ANALOG_MODBUS_CNTRL write: pymodbus write_register
+against the raw socket fast path (frame template and frame table).
+Runs against a local echo drive unless --host/--port are given.
+
+    python bench_fast_write.py --count 5000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import threading
+import time
+from pymodbus.client import AsyncModbusTcpClient
+from config import Config
+from fast_writer import ModbusCntrlFastWriter
+from pipelined_client import MBAP_HEADER
+
+async def echo_drive(reader, writer):
+    """
+    Answers every write single register request with its echo like a drive does
+    """
+    try:
+        while True:
+            header = await reader.readexactly(MBAP_HEADER.size)
+            _, _, length, _ = MBAP_HEADER.unpack(header)
+            pdu = await reader.readexactly(length - 1)
+            writer.write(header + pdu)
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        writer.close()
+
+def start_echo_drive_thread():
+    """
+    Runs the echo drive on its own event loop so it does not share the benchmark loop.
+    Returns the port it listens on
+    """
+    started = threading.Event()
+    ports = []
+
+    def run():
+        loop = asyncio.new_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(echo_drive, "127.0.0.1", 0))
+        ports.append(server.sockets[0].getsockname()[1])
+        started.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    started.wait()
+    return ports[0]
+
+def summarize(name, durations):
+    durations = sorted(durations)
+    count = len(durations)
+    return {
+        "path": name,
+        "writes": count,
+        "mean_us": round(sum(durations) / count / 1000, 2),
+        "p50_us": round(durations[count // 2] / 1000, 2),
+        "p99_us": round(durations[min(count - 1, int(count * 0.99))] / 1000, 2),
+    }
+
+async def bench_pymodbus(config, host, port, count):
+    client = AsyncModbusTcpClient(host=host, port=port)
+    await client.connect()
+    durations = []
+    for i in range(count):
+        start = time.perf_counter_ns()
+        response = await client.write_register(address=config.ANALOG_MODBUS_CNTRL,
+                                               value=i % (config.MODBUSCTRL_MAX + 1), slave=config.SLAVE_ID)
+        durations.append(time.perf_counter_ns() - start)
+        assert not response.isError()
+    client.close()
+    return summarize("pymodbus", durations)
+
+async def bench_fast(config, host, port, count, use_table, logger):
+    writer = ModbusCntrlFastWriter(host, port, config, logger, use_table=use_table)
+    await writer.connect()
+    durations = []
+    for i in range(count):
+        start = time.perf_counter_ns()
+        success = await writer.write(i % (config.MODBUSCTRL_MAX + 1))
+        durations.append(time.perf_counter_ns() - start)
+        assert success
+    writer.close()
+    return summarize("fast_table" if use_table else "fast_template", durations)
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=2000, help="writes per path")
+    parser.add_argument("--host", type=str, help="drive ip, local echo drive if not given")
+    parser.add_argument("--port", type=int, default=502, help="drive port")
+    args = parser.parse_args()
+
+    logger = logging.getLogger("bench")
+    config = Config()
+    host, port = args.host, args.port
+    if host is None:
+        host, port = "127.0.0.1", start_echo_drive_thread()
+
+    results = [
+        await bench_pymodbus(config, host, port, args.count),
+        await bench_fast(config, host, port, args.count, False, logger),
+        await bench_fast(config, host, port, args.count, True, logger),
+    ]
+    print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,232 @@
+"""
+End-to-end /write benchmark. Starts the Quart app from create_app() against
+two local simulated drives and sends /write commands over HTTP at stepped rates
+from several concurrent clients. With --transport ws the clients stream binary
+setpoints over /ws/setpoints instead and wait for each ack. Reports per step throughput, request round-trip
+latency percentiles (HTTP request or WebSocket setpoint to ack), setpoint-to-drive-ack latency, dropped (coalesced) commands,
+ANALOG_MODBUS_CNTRL writes per command and the background Modbus traffic
+(fault monitoring, keepalives) per second as JSON, tagged with the git commit.
+
+    python bench_write.py --rates 10 50 100 200 --clients 4 --duration 3 --output results.json
+    python bench_write.py --transport ws --rates 10 50 100 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import quote
+from wsproto import WSConnection, ConnectionType
+from wsproto.events import AcceptConnection, BytesMessage, RejectConnection, Request
+from config import Config
+from drive_simulator import start_drives
+from latency_stats import LatencyHistogram, FUNCTION_CODES
+from setpoint_stream import ACK, Setpoint, encode_setpoint
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def http_get(reader, writer, path):
+    """
+    One keep-alive HTTP/1.1 GET, returns the status code
+    """
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+    header = await reader.readuntil(b"\r\n\r\n")
+    status = int(header.split(b" ", 2)[1])
+    length = 0
+    for line in header.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    await reader.readexactly(length)
+    return status
+
+async def ws_connect(reader, writer, path):
+    connection = WSConnection(ConnectionType.CLIENT)
+    writer.write(connection.send(Request(host="localhost", target=path)))
+    while True:
+        connection.receive_data(await reader.read(4096))
+        for event in connection.events():
+            if isinstance(event, AcceptConnection):
+                return connection
+            if isinstance(event, RejectConnection):
+                raise ConnectionError(f"WebSocket rejected with {event.status_code}")
+
+async def ws_request(reader, writer, connection, payload):
+    """
+    Sends one binary message and returns the binary reply
+    """
+    writer.write(connection.send(BytesMessage(data=payload)))
+    while True:
+        for event in connection.events():
+            if isinstance(event, BytesMessage):
+                return event.data
+        connection.receive_data(await reader.read(4096))
+
+async def run_client(port, rate, duration, histogram, results, transport):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    if transport == "ws":
+        connection = await ws_connect(reader, writer, "/ws/setpoints?ack=1")
+    loop = asyncio.get_running_loop()
+    period = 1.0 / rate
+    next_send = loop.time()
+    end = next_send + duration
+    direction = "+"
+    while loop.time() < end:
+        start = time.perf_counter_ns()
+        if transport == "ws":
+            setpoint = Setpoint(results["sent"], time.time(), 2.0 if direction == "+" else -2.0, 0.0)
+            reply = await ws_request(reader, writer, connection, encode_setpoint(setpoint))
+            error = len(reply) != ACK.size
+        else:
+            error = await http_get(reader, writer, f"/write?pitch={quote(direction)}") != 200
+        histogram.record(time.perf_counter_ns() - start, error=error)
+        results["sent"] += 1
+        # Alternate so every command changes the target
+        direction = "-" if direction == "+" else "+"
+        next_send += period
+        delay = next_send - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            results["late"] += 1
+    writer.close()
+
+def totals(app):
+    stats = app.control_loop.stats()
+    setpoint_writes = background = 0
+    for register in app.clients.latency.summary()["registers"]:
+        # Setpoint writes of the control loop, everything else is fault monitoring, keepalives etc.
+        if (register["function_code"], register["register"]) == (FUNCTION_CODES["write_register"],
+                                                                  app.app_config.ANALOG_MODBUS_CNTRL):
+            setpoint_writes += register["count"]
+        else:
+            background += register["count"]
+    return {
+        "posted": sum(stats[side]["posted"] for side in ("left", "right")),
+        "coalesced": sum(stats[side]["coalesced"] for side in ("left", "right")),
+        "dispatched": sum(stats[side]["dispatched"] for side in ("left", "right")),
+        "setpoint_writes": setpoint_writes,
+        "background": background,
+    }
+
+async def run_step(app, port, rate, clients, duration, transport):
+    for mailbox in app.control_loop.mailboxes.values():
+        mailbox.ack_latency = LatencyHistogram()
+    before = totals(app)
+    histogram = LatencyHistogram()
+    results = {"sent": 0, "late": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(port, rate / clients, duration, histogram, results, transport)
+                           for _ in range(clients)))
+    elapsed = time.perf_counter() - start
+    # Let the last setpoints reach the drives
+    await asyncio.sleep(0.2)
+    after = totals(app)
+    delta = {key: after[key] - before[key] for key in after}
+
+    return {
+        "rate_hz": rate,
+        "transport": transport,
+        "clients": clients,
+        "sent": results["sent"],
+        "late": results["late"],
+        "throughput_hz": round(results["sent"] / elapsed, 1),
+        # Round trip of one /write request or one WebSocket setpoint and its ack
+        "request": histogram.summary(),
+        "ack": {side: mailbox.ack_latency.summary() for side, mailbox in app.control_loop.mailboxes.items()},
+        "dropped": delta["coalesced"],
+        "setpoint_writes": delta["setpoint_writes"],
+        "setpoint_writes_per_command": round(delta["setpoint_writes"] / max(1, results["sent"]), 3),
+        "background_transactions_per_s": round(delta["background"] / elapsed, 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rates", type=int, nargs="+", default=[10, 25, 50, 100, 200], help="command rates in Hz")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent http clients")
+    parser.add_argument("--transport", choices=["http", "ws"], default="http", help="/write requests or /ws/setpoints stream")
+    parser.add_argument("--duration", type=float, default=3.0, help="seconds per rate step")
+    parser.add_argument("--latency_ms", type=float, default=1.0, help="simulated drive latency")
+    parser.add_argument("--freq", type=int, default=Config.POS_UPDATE_HZ, help="control loop rate")
+    parser.add_argument("--server_args", type=str, default="", help="extra palvelin.py launch params")
+    parser.add_argument("--output", type=str, help="append results as a JSON line to this file")
+    args = parser.parse_args()
+
+    drives = await start_drives(Config(), logger_stub(), (0, 0), latency=args.latency_ms / 1000, homing_time=0.2)
+    drive_ports = [server.sockets[0].getsockname()[1] for _, server, _ in drives]
+    web_port = free_port()
+
+    # create_app reads its config from the launch params
+    sys.argv = ["palvelin.py", "--server_left", "127.0.0.1", "--server_right", "127.0.0.1",
+                "--port_left", str(drive_ports[0]), "--port_right", str(drive_ports[1]),
+                "--freq", str(args.freq), "--web_server_port", str(web_port)] + args.server_args.split()
+    if args.transport == "ws":
+        # Simulated drives, the placeholder geometry does not matter
+        sys.argv.append("--geometry_verified")
+    from palvelin import create_app
+    app = await create_app()
+    app.logger.setLevel("WARNING")
+    shutdown = asyncio.Event()
+    server = asyncio.create_task(app.run_task(host="127.0.0.1", port=web_port, shutdown_trigger=shutdown.wait))
+    await asyncio.sleep(0.5)
+
+    steps = []
+    for rate in args.rates:
+        step = await run_step(app, web_port, rate, args.clients, args.duration, args.transport)
+        steps.append(step)
+        print(f"{rate:>4} Hz: {step['throughput_hz']} cmd/s, {args.transport} p50 {step['request']['p50_us']} us "
+              f"p99 {step['request']['p99_us']} us, dropped {step['dropped']}, "
+              f"{step['setpoint_writes_per_command']} setpoint writes/cmd, "
+              f"{step['background_transactions_per_s']} background modbus/s", file=sys.stderr)
+
+    result = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "freq": args.freq,
+        "drive_latency_ms": args.latency_ms,
+        "transport": args.transport,
+        "server_args": args.server_args,
+        "steps": steps,
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(result) + "\n")
+
+    await app.control_loop.stop()
+    await app.fault_monitor.stop()
+    await app.connection_supervisor.stop()
+    app.clients.cleanup()
+    if app.telemetry is not None:
+        app.telemetry.close()
+    shutdown.set()
+    await server
+    for _, drive_server, physics in drives:
+        physics.cancel()
+        drive_server.close()
+    await asyncio.sleep(0.1)
+    app.module_manager.cleanup_all()
+
+def logger_stub():
+    import logging
+    logger = logging.getLogger("bench_drives")
+    logger.disabled = True
+    return logger
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    # Skip the app's atexit cleanup, everything is already stopped
+    sys.stdout.flush()
+    os._exit(0)
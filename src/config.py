@@ -1,4 +1,6 @@
+import os
 from dataclasses import dataclass
+from typing import Optional
 
 @dataclass
 class Config:
@@ -6,9 +8,17 @@ class Config:
     SERVER_IP_LEFT: str = '192.168.0.211'  
     SERVER_IP_RIGHT: str = '192.168.0.212'
     SERVER_PORT: int = 502  
+    SERVER_PORT_LEFT: Optional[int] = None # overrides SERVER_PORT for one drive
+    SERVER_PORT_RIGHT: Optional[int] = None
     SLAVE_ID: int = 1
     WEB_SERVER_PORT: int = 5001
 
+    ### LOCAL DRIVE GATEWAY
+    USE_GATEWAY: bool = False # connect to the drives through gateway.py
+    GATEWAY_HOST: str = '127.0.0.1'
+    GATEWAY_PORT_LEFT: int = 5021
+    GATEWAY_PORT_RIGHT: int = 5022
+
     ### INPUT EVENTS
     IEG_MODE: int = 4316
     IEG_MOTION: int = 4317 # stop 2^2
@@ -35,16 +45,71 @@ class Config:
     DIGITAL_INPUT = 1
     ANALOG_POSITION_MODE = 2
 
+    ### ANALOG POSITION RANGE IN REVS | 2 mm - 147 mm
+    POS_MIN_REVS: float = 0.393698024
+    POS_MAX_REVS: float = 28.937007874015748031496062992126
+
+    ### PLATFORM GEOMETRY IN MM | pivot at the rear center, actuators at the front corners
+    ### UNVERIFIED PLACEHOLDERS, not measured from the platform. Absolute setpoints
+    ### (/setpoint, /ws/setpoints, UDP, trajectories) stay off until GEOMETRY_VERIFIED
+    PLATFORM_ATTACH_FORWARD: float = 600.0 # pivot to the actuator joints along the platform
+    PLATFORM_ATTACH_HALF_WIDTH: float = 300.0 # center line to each actuator joint
+    ACTUATOR_RETRACTED_LENGTH: float = 400.0 # joint to joint at 0 mm stroke
+    ACTUATOR_NEUTRAL_STROKE: float = 74.5 # stroke of both actuators when the platform is level
+    ACTUATOR_LEAD_MM: float = 5.08 # mm per rev, 147 mm = POS_MAX_REVS
+    GEOMETRY_VERIFIED: bool = False # set once the values above are checked against the platform
+    PITCH_MAX_DEG: float = 4.0
+    ROLL_MAX_DEG: float = 6.0
+    TILT_COORDINATION_GAIN: float = 0.5 # share of an acceleration cue rendered as tilt
+    KINEMATICS_LUT: bool = True # interpolate setpoints from a precomputed pitch x roll table
+    KINEMATICS_LUT_STEP: float = 0.1 # grid spacing in degrees
+    KINEMATICS_LUT_MAX_ERROR: float = 0.5 # allowed interpolation error in ModbusCtrl units
+    KINEMATICS_LUT_FILE: str = "kinematics_lut.npz" # table cache, in the state dir
+
     ### USEFUL MAX VALUES
     MODBUSCTRL_MAX = 10000
     UINT32_MAX = 65535
 
     ### 
     MODULE_NAME = None
-    POLLING_TIME_INTERVAL: float = 5.0
-    POS_UPDATE_HZ: int = 1
+    POLLING_TIME_INTERVAL: float = 0.5 # seconds between polls of fault_poller.py
+    FAULT_MONITOR: str = "task" # task: in the server, by the control loop every period | process: fault_poller.py | off
+    POS_UPDATE_HZ: int = 30 # setpoint write rate of the control loop
+    POSITION_MAX_AGE: float = 0.5 # seconds a sampled PFEEDBACK position is trusted
+    READ_SPAN_MAX_GAP: int = 20 # unused registers allowed between merged telemetry reads
     START_TID: int = 10001 # first TID will be startTID + 1
     LAST_TID: int = 20000
+    PIPELINED: bool = False # keep several transactions outstanding per drive connection
+    PIPELINE_DEPTH: int = 4 # max outstanding transactions per drive in pipelined mode
+    FAST_CNTRL_WRITE: bool = False # raw socket fast path for ANALOG_MODBUS_CNTRL writes
+    FAST_CNTRL_TABLE: bool = False # prebuild one frame per ModbusCtrl value for the fast path
+    RETRY_MAX_ATTEMPTS: int = 3 # attempts per motor for one operation
+    RETRY_DEADLINE: float = 1.0 # seconds one operation may take in total
+    CRITICAL_RETRY_DEADLINE: float = 2.0 # same for stop, fault reset and homing command
+    RETRY_BASE_DELAY: float = 0.05 # first backoff, doubled after every failed attempt
+    RETRY_MAX_DELAY: float = 0.5
+    BREAKER_FAILURE_THRESHOLD: int = 5 # failed attempts in a row that open the circuit breaker
+    BREAKER_RESET_TIMEOUT: float = 2.0 # seconds before an open breaker lets a request through
+    KEEPALIVE_INTERVAL: float = 1.0 # seconds between link health reads
+    KEEPALIVE_FAILURE_LIMIT: int = 2 # failed keepalive reads in a row before reconnecting
+    RECONNECT_MIN_DELAY: float = 0.2
+    RECONNECT_MAX_DELAY: float = 5.0
+    HEARTBEAT_INTERVAL: float = 0.1 # seconds between heartbeats of supervised modules
+    HEARTBEAT_TIMEOUT: float = 0.5 # silence after which a supervised module is restarted
+    MODULE_STANDBY: bool = os.name != 'nt' # keep a started standby instance of supervised modules for failover, needs a control pipe so not on Windows
+    WARM_RESTART: bool = True # skip homing and parameter writes the drives still have from the last run
+    DRIVE_STATE_FILE: str = "drive_state.json" # snapshot of the applied drive state, in the state dir
+    TELEMETRY_SHM: bool = True # publish drive telemetry to shared memory for local processes, only with FAULT_MONITOR "task"
+    TELEMETRY_SHM_NAME: str = "liikealusta_telemetry"
+    UDP_SETPOINTS: bool = False # accept setpoint datagrams next to the web server
+    UDP_SETPOINT_HOST: str = '0.0.0.0'
+    UDP_SETPOINT_PORT: int = 5005
+    UDP_STALE_AFTER: float = 0.05 # seconds a datagram may be slower than the fastest one before it is dropped
+    UDP_SENDER_TIMEOUT: float = 1.0 # silence after which another sender is accepted and sequence numbers start over
+    TRAJECTORY_MAX_SAMPLES: int = 200000 # largest trajectory accepted for playback
+    TRAJECTORY_START_TOLERANCE: int = 20 # ModbusCtrl distance from the first sample before playback starts
+    TRAJECTORY_APPROACH_TIMEOUT: float = 30.0 # seconds to reach the first sample
+    LATENCY_STATS: bool = True # time every modbus request into per register histograms
     CONNECTION_TRY_COUNT = 5
     ACC = 60
     VEL = 60
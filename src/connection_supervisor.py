@@ -0,0 +1,76 @@
+import asyncio
+from utils import cancel_and_wait
+from typing import Dict, Optional
+
+class ConnectionSupervisor:
+    """
+    Keeps both drive connections alive in the background. Watches link health with
+    a cheap OEG_STATUS read every KEEPALIVE_INTERVAL seconds and reconnects a lost
+    drive with exponential backoff, both drives independently and in parallel.
+    Callers never wait for a reconnect, they check state to fail fast, except
+    critical requests (stop, fault reset, homing) which wait for it up to their deadline.
+    """
+    CONNECTED = "connected"
+    CONNECTING = "connecting"
+    DISCONNECTED = "disconnected"
+
+    def __init__(self, clients, config, logger):
+        self.clients = clients
+        self.config = config
+        self.logger = logger
+        self.state: Dict[str, str] = {"left": self.DISCONNECTED, "right": self.DISCONNECTED}
+        self.reconnects = {"left": 0, "right": 0}
+        self.task: Optional[asyncio.Task] = None
+
+    def is_connected(self, side) -> bool:
+        return self.state[side] == self.CONNECTED
+
+    async def reconnect(self, side):
+        delay = self.config.RECONNECT_MIN_DELAY
+        self.state[side] = self.CONNECTING
+        self.clients.client_for(side).close()
+
+        while not await self.clients.connect_side(side):
+            self.logger.warning(f"Reconnecting to {side} motor failed, retrying in {delay:.1f} s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.config.RECONNECT_MAX_DELAY)
+
+        self.reconnects[side] += 1
+        self.state[side] = self.CONNECTED
+        self.logger.info(f"Reconnected to {side} motor")
+
+    async def supervise(self, side):
+        failures = 0
+        while True:
+            client = self.clients.client_for(side)
+            if not client.connected:
+                self.logger.warning(f"Connection to {side} motor lost")
+                await self.reconnect(side)
+                failures = 0
+            elif await self.clients.ping(side):
+                self.state[side] = self.CONNECTED
+                failures = 0
+            else:
+                failures += 1
+                if failures >= self.config.KEEPALIVE_FAILURE_LIMIT:
+                    self.logger.warning(f"{side.capitalize()} motor did not answer {failures} keepalive reads")
+                    await self.reconnect(side)
+                    failures = 0
+
+            await asyncio.sleep(self.config.KEEPALIVE_INTERVAL)
+
+    async def run(self):
+        await asyncio.gather(self.supervise("left"), self.supervise("right"))
+
+    def start(self):
+        for side in self.state:
+            if self.clients.client_for(side) is not None and self.clients.client_for(side).connected:
+                self.state[side] = self.CONNECTED
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            await cancel_and_wait(self.task)
+            self.task = None
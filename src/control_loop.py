@@ -0,0 +1,185 @@
+import asyncio
+import time
+from utils import cancel_and_wait
+from latency_stats import LatencyHistogram
+from typing import Optional, Tuple
+
+class SetpointMailbox:
+    """
+    Latest-wins setpoint slot of one drive. A new value replaces the pending one
+    instead of queuing behind it, so at most one write per drive is in flight and
+    stale setpoints are never sent after newer ones.
+    """
+    def __init__(self):
+        self.pending: Optional[int] = None
+        self.in_flight: Optional[int] = None
+        self.written: Optional[int] = None
+        self.event = asyncio.Event()
+        self.posted = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.pending_since = 0
+        self.in_flight_since = 0
+        # Set by invalidate() while a write is in flight, its value must not count as written
+        self.forget_in_flight = False
+        # Time from posting a setpoint to the drive acknowledging it
+        self.ack_latency = LatencyHistogram()
+
+    def latest(self) -> Optional[int]:
+        """
+        Newest value that is pending, being written or written
+        """
+        in_flight = None if self.forget_in_flight else self.in_flight
+        for value in (self.pending, in_flight, self.written):
+            if value is not None:
+                return value
+        return None
+
+    def post(self, value: int):
+        if value == self.latest():
+            return
+        if self.pending is not None:
+            self.coalesced += 1
+        self.pending = value
+        self.pending_since = time.perf_counter_ns()
+        self.posted += 1
+        self.event.set()
+
+    def invalidate(self):
+        """
+        Forgets the written value, so posting the same value again is sent to the drive
+        """
+        self.written = None
+        self.forget_in_flight = self.in_flight is not None
+
+    def take(self) -> int:
+        value = self.pending
+        self.pending = None
+        self.in_flight = value
+        self.in_flight_since = self.pending_since
+        self.event.clear()
+        return value
+
+    def complete(self, success: bool):
+        if success:
+            if not self.forget_in_flight:
+                self.written = self.in_flight
+            self.dispatched += 1
+            self.ack_latency.record(time.perf_counter_ns() - self.in_flight_since)
+        else:
+            self.failed += 1
+            # Try again on the next dispatch unless a newer value already replaced it
+            if self.pending is None:
+                self.pending = self.in_flight
+                self.pending_since = self.in_flight_since
+                self.event.set()
+        self.in_flight = None
+        self.forget_in_flight = False
+
+    def stats(self):
+        return {
+            "posted": self.posted,
+            "coalesced": self.coalesced,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "written": self.written,
+            "ack_latency": self.ack_latency.summary(),
+        }
+
+class ControlLoop:
+    """
+    Setpoint dispatcher. Writes the latest ModbusCtrl target to each motor through its own
+    SetpointMailbox, at most config.POS_UPDATE_HZ times per second per drive.
+    HTTP handlers only update the target with set_target() so request bursts
+    do not turn into extra Modbus round-trips.
+    With a fault monitor each drive is also checked every period, right after its
+    write, so faults are seen within one period from the reads the loop already does.
+    """
+    def __init__(self, clients, config, logger):
+        self.clients = clients
+        self.config = config
+        self.logger = logger
+        self.period = 1.0 / max(1, int(config.POS_UPDATE_HZ))
+        self.target: Optional[Tuple[int, int]] = None
+        self.mailboxes = {"left": SetpointMailbox(), "right": SetpointMailbox()}
+        self.overruns = 0
+        self.task: Optional[asyncio.Task] = None
+        # FaultMonitor whose check() runs for each drive every period, set by the server
+        self.monitor = None
+
+    def set_target(self, values: Tuple[int, int]):
+        """
+        Sets the next (left, right) ModbusCtrl values, clamped to 0 - MODBUSCTRL_MAX.
+        Replaces any value that has not been sent yet.
+        """
+        value_left, value_right = values
+        self.target = (self.clamp(value_left), self.clamp(value_right))
+        self.mailboxes["left"].post(self.target[0])
+        self.mailboxes["right"].post(self.target[1])
+
+    def invalidate(self, side=None):
+        """
+        Forgets what was written to one or both drives, eg. after a stop or fault when
+        the drive no longer holds that target. Without this, resending the same target
+        would be dropped as a duplicate and the motors would not move back.
+        """
+        for mailbox_side, mailbox in self.mailboxes.items():
+            if side is None or side == mailbox_side:
+                mailbox.invalidate()
+
+    def clamp(self, value):
+        return max(0, min(int(value), self.config.MODBUSCTRL_MAX))
+
+    @property
+    def written(self) -> Tuple[Optional[int], Optional[int]]:
+        return self.mailboxes["left"].written, self.mailboxes["right"].written
+
+    async def run_drive(self, side, mailbox):
+        loop = asyncio.get_running_loop()
+        checked = None
+        while True:
+            if self.monitor is None:
+                await mailbox.event.wait()
+            start = loop.time()
+            wrote = mailbox.pending is not None
+            if wrote:
+                value = mailbox.take()
+                success = await self.clients.write_modbus_cntrl_on(side, value)
+                mailbox.complete(success)
+            # A write right after an idle period's check does not read again
+            if self.monitor is not None and (checked is None or start - checked >= self.period / 2):
+                checked = start
+                await self.monitor.check(side)
+
+            elapsed = loop.time() - start
+            if elapsed > self.period:
+                self.overruns += 1
+            elif wrote:
+                # Keep the write rate of one drive at most POS_UPDATE_HZ
+                await asyncio.sleep(self.period - elapsed)
+            else:
+                # Nothing to write, a new setpoint goes out right away, the next check in one period
+                try:
+                    await asyncio.wait_for(mailbox.event.wait(), self.period - elapsed)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run(self):
+        self.logger.info(f"Control loop started at {self.config.POS_UPDATE_HZ} Hz")
+        await asyncio.gather(*(self.run_drive(side, mailbox) for side, mailbox in self.mailboxes.items()))
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            await cancel_and_wait(self.task)
+            self.task = None
+
+    def stats(self):
+        stats = {side: mailbox.stats() for side, mailbox in self.mailboxes.items()}
+        stats["overruns"] = self.overruns
+        return stats
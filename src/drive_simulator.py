@@ -0,0 +1,267 @@
+"""
+Local Tritex drive emulator for benchmarking and load testing without hardware.
+Serves the register map in Config over Modbus TCP and models homing, fault bits
+and PFEEDBACK following ANALOG_MODBUS_CNTRL within the analog vel/acc limits.
+
+    python drive_simulator.py --port_left 5502 --port_right 5503 --latency_ms 2
+    python palvelin.py --server_left 127.0.0.1 --server_right 127.0.0.1 --port_left 5502 --port_right 5503
+"""
+import argparse
+import asyncio
+import random
+import struct
+from config import Config
+from setup_logging import setup_logging
+from pipelined_client import MBAP_HEADER, READ_HOLDING_REGISTERS, WRITE_SINGLE_REGISTER, WRITE_MULTIPLE_REGISTERS
+
+ILLEGAL_FUNCTION = 0x01
+HOMED_BIT = 1
+FAULT_BIT = 3
+HOMING_BIT = 8 # IEG_MOTION bit that starts homing
+STOP_BIT = 2 # IEG_MOTION bit that stops motion
+ENABLE_MAINTAINED_BIT = 1
+FAULT_RESET_BIT = 15
+RESET_SETTINGS_ADDRESS = 4001
+
+class DriveSimulator:
+    """
+    One emulated drive. Registers are plain 16 bit values in a dict,
+    physics runs in step() and writes its results back to the feedback registers.
+    """
+    def __init__(self, name, config, logger, latency=0.0, jitter=0.0, homing_time=1.0):
+        self.name = name
+        self.config = config
+        self.logger = logger
+        self.latency = latency
+        self.jitter = jitter
+        self.homing_time = homing_time
+        self.registers = {}
+        self.position = 0.0 # revs
+        self.velocity = 0.0 # revs/s
+        self.target = 0.0
+        self.homing_left = None
+        self.requests = 0
+        self.reset_settings()
+
+    def reset_settings(self):
+        config = self.config
+        # Default analog range is the one the server configures
+        self.write_registers(config.ANALOG_POSITION_MINIMUM, [25801, 0])
+        self.write_registers(config.ANALOG_POSITION_MAXIMUM, [61406, 28])
+        self.write_registers(config.ANALOG_VEL_MAXIMUM, [0, 1 << 8]) # 1 rev/s
+        self.write_registers(config.ANALOG_ACCELERATION_MAXIMUM, [0, 1 << 4]) # 1 rev/s^2
+        self.registers[config.COMMAND_MODE] = config.DISABLED
+
+    def get(self, address):
+        return self.registers.get(address, 0)
+
+    def revs_register(self, address):
+        """
+        Position limit registers are [decimal, whole] where decimal is 1/65536 rev
+        """
+        return self.get(address + 1) + self.get(address) / 65536
+
+    def vel_limit(self):
+        # 8.24: low register holds the low 16 bits of the fraction, high register 8.8
+        high, low = self.get(self.config.ANALOG_VEL_MAXIMUM + 1), self.get(self.config.ANALOG_VEL_MAXIMUM)
+        return (high >> 8) + (((high & 0xFF) << 16) | low) / (1 << 24)
+
+    def acc_limit(self):
+        # 12.20: high register is 12.4
+        high, low = self.get(self.config.ANALOG_ACCELERATION_MAXIMUM + 1), self.get(self.config.ANALOG_ACCELERATION_MAXIMUM)
+        return (high >> 4) + (((high & 0xF) << 16) | low) / (1 << 20)
+
+    def set_status_bit(self, bit, on):
+        status = self.get(self.config.OEG_STATUS)
+        self.registers[self.config.OEG_STATUS] = status | (1 << bit) if on else status & ~(1 << bit)
+
+    def is_status_bit_on(self, bit):
+        return (self.get(self.config.OEG_STATUS) >> bit) & 1 == 1
+
+    def inject_fault(self, fault_bits):
+        """
+        Puts the drive into fault state with the given RECENT_FAULT bits, motion stops
+        """
+        self.registers[self.config.RECENT_FAULT_ADDRESS] = fault_bits & 0xFFFF
+        self.set_status_bit(FAULT_BIT, True)
+        self.target = self.position
+        self.logger.info(f"{self.name}: fault injected {fault_bits:#06x}")
+
+    def write_registers(self, address, values):
+        for offset, value in enumerate(values):
+            self.registers[address + offset] = value & 0xFFFF
+        for offset in range(len(values)):
+            self.on_write(address + offset)
+
+    def on_write(self, address):
+        config = self.config
+        value = self.get(address)
+        if address == config.IEG_MOTION:
+            if value & (1 << HOMING_BIT) and self.homing_left is None and not self.is_status_bit_on(HOMED_BIT):
+                self.homing_left = self.homing_time
+            if value & (1 << STOP_BIT):
+                self.target = self.position
+        elif address == config.IEG_MODE:
+            if value & (1 << FAULT_RESET_BIT):
+                self.registers[config.RECENT_FAULT_ADDRESS] = 0
+                self.set_status_bit(FAULT_BIT, False)
+        elif address == config.ANALOG_MODBUS_CNTRL:
+            self.update_target()
+        elif address == RESET_SETTINGS_ADDRESS and value == 1:
+            self.reset_settings()
+
+    def is_enabled(self):
+        return (self.get(self.config.COMMAND_MODE) == self.config.ANALOG_POSITION_MODE
+                and self.get(self.config.IEG_MODE) & (1 << ENABLE_MAINTAINED_BIT)
+                and self.is_status_bit_on(HOMED_BIT)
+                and not self.is_status_bit_on(FAULT_BIT))
+
+    def update_target(self):
+        pos_min = self.revs_register(self.config.ANALOG_POSITION_MINIMUM)
+        pos_max = self.revs_register(self.config.ANALOG_POSITION_MAXIMUM)
+        cntrl = min(self.get(self.config.ANALOG_MODBUS_CNTRL), self.config.MODBUSCTRL_MAX)
+        self.target = pos_min + (pos_max - pos_min) * cntrl / self.config.MODBUSCTRL_MAX
+
+    def step(self, dt):
+        """
+        Advances the drive model by dt seconds
+        """
+        if self.homing_left is not None:
+            self.homing_left -= dt
+            if self.homing_left <= 0:
+                self.homing_left = None
+                self.position = self.velocity = 0.0
+                self.set_status_bit(HOMED_BIT, True)
+                self.update_target()
+
+        if self.is_enabled():
+            self.move_towards_target(dt)
+        else:
+            self.velocity = 0.0
+
+        whole = int(self.position)
+        self.registers[self.config.PFEEDBACK_POSITION] = int((self.position - whole) * 65535)
+        self.registers[self.config.PFEEDBACK_POSITION + 1] = whole
+        # VFEEDBACK in 1/256 rev/s steps, two's complement
+        self.registers[self.config.VFEEDBACK_VELOCITY] = int(self.velocity * 256) & 0xFFFF
+
+    def move_towards_target(self, dt):
+        """
+        Trapezoidal profile: accelerates up to the velocity limit and
+        brakes with the acceleration limit so it stops on the target
+        """
+        vel_max, acc_max = self.vel_limit(), self.acc_limit()
+        error = self.target - self.position
+        if abs(error) < 1e-6 and abs(self.velocity) < 1e-6:
+            self.velocity = 0.0
+            return
+
+        direction = 1 if error > 0 else -1
+        braking_speed = (2 * acc_max * abs(error)) ** 0.5
+        desired = direction * min(vel_max, braking_speed)
+        change = max(-acc_max * dt, min(acc_max * dt, desired - self.velocity))
+        self.velocity += change
+        step = self.velocity * dt
+        if abs(step) >= abs(error) and (step > 0) == (error > 0):
+            self.position = self.target
+            self.velocity = 0.0
+        else:
+            self.position += step
+
+    def handle_pdu(self, pdu):
+        function_code = pdu[0]
+        if function_code == READ_HOLDING_REGISTERS:
+            _, address, count = struct.unpack(">BHH", pdu[:5])
+            values = [self.get(address + offset) for offset in range(count)]
+            return struct.pack(f">BB{count}H", function_code, count * 2, *values)
+        if function_code == WRITE_SINGLE_REGISTER:
+            _, address, value = struct.unpack(">BHH", pdu[:5])
+            self.write_registers(address, [value])
+            return pdu[:5]
+        if function_code == WRITE_MULTIPLE_REGISTERS:
+            _, address, count, _ = struct.unpack(">BHHB", pdu[:6])
+            self.write_registers(address, list(struct.unpack(f">{count}H", pdu[6:6 + count * 2])))
+            return struct.pack(">BHH", function_code, address, count)
+        return struct.pack(">BB", function_code | 0x80, ILLEGAL_FUNCTION)
+
+    async def answer(self, writer, tid, unit, pdu):
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+        reply = self.handle_pdu(pdu)
+        self.requests += 1
+        if not writer.is_closing():
+            writer.write(MBAP_HEADER.pack(tid, 0, len(reply) + 1, unit) + reply)
+
+    async def handle_client(self, reader, writer):
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, unit = MBAP_HEADER.unpack(header)
+                pdu = await reader.readexactly(length - 1)
+                if self.latency or self.jitter:
+                    task = asyncio.create_task(self.answer(writer, tid, unit, pdu))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    await self.answer(writer, tid, unit, pdu)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def run_physics(self, rate_hz=500):
+        loop = asyncio.get_running_loop()
+        period = 1.0 / rate_hz
+        last = loop.time()
+        while True:
+            await asyncio.sleep(period)
+            now = loop.time()
+            self.step(now - last)
+            last = now
+
+async def start_drives(config, logger, ports, latency=0.0, jitter=0.0, homing_time=1.0, host="127.0.0.1"):
+    """
+    Starts one simulated drive per port. Returns list of (drive, server, physics task)
+    """
+    drives = []
+    for name, port in zip(("left", "right"), ports):
+        drive = DriveSimulator(name, config, logger, latency=latency, jitter=jitter, homing_time=homing_time)
+        server = await asyncio.start_server(drive.handle_client, host, port)
+        physics = asyncio.create_task(drive.run_physics())
+        drives.append((drive, server, physics))
+    return drives
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port_left", type=int, default=5502, help="left drive port")
+    parser.add_argument("--port_right", type=int, default=5503, help="right drive port")
+    parser.add_argument("--latency_ms", type=float, default=0.0, help="response latency")
+    parser.add_argument("--jitter_ms", type=float, default=0.0, help="random extra response latency")
+    parser.add_argument("--homing_time", type=float, default=1.0, help="seconds homing takes")
+    parser.add_argument("--fault_interval", type=float, help="inject a non critical fault every n seconds")
+    args = parser.parse_args()
+
+    logger = setup_logging("drive_simulator", "drive_simulator.log")
+    drives = await start_drives(Config(), logger, (args.port_left, args.port_right),
+                                latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                homing_time=args.homing_time)
+    logger.info(f"Simulated drives listening on ports {args.port_left} and {args.port_right}")
+
+    try:
+        while True:
+            if args.fault_interval:
+                await asyncio.sleep(args.fault_interval)
+                drive = random.choice(drives)[0]
+                drive.inject_fault(1 << 10) # coms fault, not critical
+            else:
+                await asyncio.sleep(3600)
+    finally:
+        for _, server, physics in drives:
+            physics.cancel()
+            server.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+class DriveStateStore:
+    """
+    Configuration the server applied to the drives and whether they were homed, persisted
+    after a successful init so a restarted server can tell which startup work is already done.
+    The snapshot is only a hint, startup still reads the drives back and compares.
+    """
+    def __init__(self, config, logger, path=None):
+        self.config = config
+        self.logger = logger
+        if path is None:
+            state_dir = os.path.join(os.path.dirname(__file__), '..', 'state')
+            path = os.path.join(state_dir, config.DRIVE_STATE_FILE)
+        self.path = path
+
+    def drive_identity(self) -> Dict[str, List]:
+        """
+        Drives the snapshot belongs to, the real drive addresses even when using the gateway
+        """
+        return {
+            "left": [self.config.SERVER_IP_LEFT, self.config.SERVER_PORT_LEFT or self.config.SERVER_PORT],
+            "right": [self.config.SERVER_IP_RIGHT, self.config.SERVER_PORT_RIGHT or self.config.SERVER_PORT],
+        }
+
+    def load(self) -> Optional[dict]:
+        """
+        Returns the snapshot if there is one for these drives, otherwise None
+        """
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable drive state snapshot {self.path}: {e}")
+            return None
+
+        if state.get("drives") != self.drive_identity():
+            self.logger.info("Drive state snapshot is for other drives, ignoring it")
+            return None
+        return state
+
+    def save(self, analog_parameters: List[int], homed: bool):
+        state = {
+            "saved_at": time.time(),
+            "drives": self.drive_identity(),
+            "analog_parameters": list(analog_parameters),
+            "homed": homed,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Write and rename so a crash never leaves half a snapshot behind
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self.logger.error(f"Failed to save drive state snapshot: {e}")
+
+    def clear(self):
+        """
+        Forgets the snapshot, eg. when the drive settings are reset on shutdown
+        """
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            self.logger.error(f"Failed to remove drive state snapshot: {e}")
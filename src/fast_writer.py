@@ -0,0 +1,162 @@
+import asyncio
+import socket
+import struct
+from typing import Optional
+
+WRITE_SINGLE_REGISTER = 0x06
+# MBAP (tid, protocol, length, unit) + function code + address + value
+FRAME = struct.Struct(">HHHBBHH")
+FRAME_SIZE = FRAME.size
+TID_OFFSET = 0
+VALUE_OFFSET = FRAME_SIZE - 2
+FUNCTION_OFFSET = 7
+# MBAP + function code | 0x80 + exception code
+EXCEPTION_SIZE = 9
+
+class EchoReplyProtocol(asyncio.Protocol):
+    """
+    Copies the fixed size reply straight into a preallocated buffer
+    and wakes up the waiting write when it is complete. An exception reply
+    is shorter, it is recognised from the function code byte.
+    The reply timeout is one timer per connection: it only moves on to the
+    deadline of the latest write when it fires, not once per write
+    """
+    def __init__(self, reply: bytearray):
+        self.reply = reply
+        self.received = 0
+        self.expected = FRAME_SIZE
+        self.waiter: Optional[asyncio.Future] = None
+        self.deadline = 0.0
+        self.watchdog: Optional[asyncio.TimerHandle] = None
+        self.transport = None
+
+    def arm(self, loop, timeout):
+        self.deadline = loop.time() + timeout
+        if self.watchdog is None:
+            self.watchdog = loop.call_at(self.deadline, self.check_deadline, loop)
+
+    def check_deadline(self, loop):
+        self.watchdog = None
+        if self.waiter is None or self.waiter.done():
+            return
+        if loop.time() >= self.deadline:
+            self.waiter.set_exception(TimeoutError("No reply from drive"))
+        else:
+            self.watchdog = loop.call_at(self.deadline, self.check_deadline, loop)
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        count = min(len(data), self.expected - self.received)
+        self.reply[self.received:self.received + count] = data[:count]
+        self.received += count
+        if self.received > FUNCTION_OFFSET and self.reply[FUNCTION_OFFSET] & 0x80:
+            self.expected = EXCEPTION_SIZE
+        if self.received >= self.expected and self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(True)
+
+    def connection_lost(self, exc):
+        self.transport = None
+        if self.watchdog is not None:
+            self.watchdog.cancel()
+            self.watchdog = None
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_exception(ConnectionResetError("Connection closed by drive"))
+
+class ModbusCntrlFastWriter:
+    """
+    Raw socket fast path for the hottest request, the single register write of
+    a 0 - MODBUSCTRL_MAX value to ANALOG_MODBUS_CNTRL. Keeps a prebuilt request frame
+    (or a table of one frame per value) and only patches the changing fields,
+    the fixed size echo reply is read into a preallocated buffer and checked in place.
+    One write is outstanding at a time. Per write only the future the write waits on
+    is created, the frame, reply buffer and timeout timer are reused.
+    """
+    def __init__(self, host, port, config, logger, use_table=False):
+        self.host = host
+        self.port = port
+        self.config = config
+        self.logger = logger
+        self.use_table = use_table
+        self.protocol: Optional[EchoReplyProtocol] = None
+        self.tid = config.START_TID
+        self.frame = bytearray(FRAME_SIZE)
+        FRAME.pack_into(self.frame, 0, 0, 0, 6, config.SLAVE_ID,
+                        WRITE_SINGLE_REGISTER, config.ANALOG_MODBUS_CNTRL, 0)
+        self.reply = bytearray(FRAME_SIZE)
+        self.table = None
+        if use_table:
+            # TID is kept fixed in table mode, only one write is ever outstanding
+            self.table = [FRAME.pack(config.START_TID, 0, 6, config.SLAVE_ID, WRITE_SINGLE_REGISTER,
+                                     config.ANALOG_MODBUS_CNTRL, value)
+                          for value in range(config.MODBUSCTRL_MAX + 1)]
+
+    @property
+    def connected(self):
+        return self.protocol is not None and self.protocol.transport is not None
+
+    async def connect(self) -> bool:
+        loop = asyncio.get_running_loop()
+        try:
+            transport, self.protocol = await asyncio.wait_for(
+                loop.create_connection(lambda: EchoReplyProtocol(self.reply), self.host, self.port),
+                timeout=1.0
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.logger.error(f"Fast writer failed to connect to {self.host}:{self.port}: {e}")
+            return False
+
+        sock = transport.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return True
+
+    def close(self):
+        if self.connected:
+            self.protocol.transport.close()
+        self.protocol = None
+
+    def _next_frame(self, value):
+        if self.table is not None:
+            return self.table[value]
+        self.tid += 1
+        if self.tid > self.config.LAST_TID:
+            self.tid = self.config.START_TID + 1
+        struct.pack_into(">H", self.frame, TID_OFFSET, self.tid)
+        struct.pack_into(">H", self.frame, VALUE_OFFSET, value)
+        return self.frame
+
+    async def write(self, value: int, timeout=1.0) -> bool:
+        """
+        Writes value to ANALOG_MODBUS_CNTRL and waits for the echo reply.
+        Returns True if the drive echoed the request back, False otherwise
+        """
+        if not self.connected:
+            return False
+
+        loop = asyncio.get_running_loop()
+        protocol = self.protocol
+        frame = self._next_frame(value)
+        protocol.received = 0
+        protocol.expected = FRAME_SIZE
+        protocol.waiter = loop.create_future()
+        protocol.arm(loop, timeout)
+        try:
+            protocol.transport.write(frame)
+            await protocol.waiter
+        except (OSError, TimeoutError) as e:
+            # Stream is out of sync after a lost reply, start from a fresh connection
+            self.logger.error(f"Fast ModbusCtrl write to {self.host} failed: {e}")
+            self.close()
+            return False
+        finally:
+            protocol.waiter = None
+
+        if protocol.expected == EXCEPTION_SIZE:
+            # Complete reply, the stream is still in sync
+            self.logger.error(f"Fast ModbusCtrl write to {self.host} got exception code {self.reply[EXCEPTION_SIZE - 1]}")
+            return False
+
+        # Successful write reply is an exact echo of the request
+        return self.reply == frame
@@ -0,0 +1,265 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+from latency_stats import LatencyHistogram
+from utils import (cancel_and_wait, convert_to_revs, revs_to_modbuscntrl, is_fault_critical,
+                   IEG_MODE_bitmask_default, CONTINIOUS_CURRENT_BIT, BOARD_TEMPERATURE_BIT,
+                   ACTUATOR_TEMPERATURE)
+
+# RECENT_FAULT bits with a known meaning, the rest are reported by their number
+FAULT_BIT_NAMES = {
+    CONTINIOUS_CURRENT_BIT: "continuous_current",
+    BOARD_TEMPERATURE_BIT: "board_temperature",
+    ACTUATOR_TEMPERATURE: "actuator_temperature",
+    10: "communication",
+}
+
+# Fault state reported by OEG_STATUS without any RECENT_FAULT bit set
+UNKNOWN_FAULT = "unknown"
+
+@dataclass
+class FaultEvent:
+    """
+    One fault bit seen on one drive, from detection until the drive left fault state
+    """
+    side: str
+    bit: Optional[int]
+    name: str
+    critical: bool
+    fault_register: int
+    detected_at: float # wall clock time
+    detected_ns: int # perf_counter_ns, durations are measured from this
+    reset_us: Optional[float] = None # detection to acknowledged reset write
+    recovered_us: Optional[float] = None # detection to first sample without fault
+
+def fault_bit_name(bit: Optional[int]) -> str:
+    if bit is None:
+        return UNKNOWN_FAULT
+    return FAULT_BIT_NAMES.get(bit, f"bit_{bit}")
+
+def decode_fault(side: str, fault_register: int, detected_ns: int) -> List[FaultEvent]:
+    """
+    Splits a RECENT_FAULT value into one event per set bit
+    """
+    critical = is_fault_critical(fault_register)
+    detected_at = time.time()
+    bits = [bit for bit in range(16) if (fault_register >> bit) & 1] or [None]
+    return [FaultEvent(side, bit, fault_bit_name(bit), critical, fault_register, detected_at, detected_ns)
+            for bit in bits]
+
+class FaultMonitor:
+    """
+    Watches both drives for faults from telemetry snapshots (status, velocity, position
+    and fault). In the server the control loop calls check() for each drive right after
+    its setpoint write, every control period, so a fault is seen within one period and
+    no separate polling runs next to it. check() reads status, velocity and position
+    (2 requests) and the fault register only while the status shows a fault.
+    fault_poller.py runs it on its own instead, poll() every interval reads both drives.
+    The sampled position is handed to PositionState, so the same reads also keep the
+    feedback used for relative moves fresh, and the snapshot is published to the
+    shared memory telemetry block when one is given.
+
+    A detected fault is decoded into one FaultEvent per fault bit. Non-critical faults are
+    reset right away on the faulted drive only, critical ones are logged and left alone.
+    Fault counts, reset and recovery times are kept per fault bit, and the motion
+    interruption (last sample without fault to the first one after it) per drive.
+    """
+    # Seconds between reset attempts while a drive stays faulted
+    RESET_RETRY_INTERVAL = 0.5
+    # Recovered events kept for /stats
+    EVENT_HISTORY = 100
+
+    def __init__(self, clients, config, logger, position_state=None, interval: Optional[float] = None,
+                 telemetry=None, control_loop=None):
+        self.clients = clients
+        self.config = config
+        self.logger = logger
+        self.position_state = position_state
+        self.telemetry = telemetry
+        self.control_loop = control_loop
+        self.interval = interval if interval is not None else config.POLLING_TIME_INTERVAL
+        self.positions: Dict[str, Optional[int]] = {"left": None, "right": None}
+        self.faulted: Dict[str, bool] = {"left": False, "right": False}
+        self.last_fault: Dict[str, Optional[int]] = {"left": None, "right": None}
+        self.active: Dict[str, List[FaultEvent]] = {"left": [], "right": []}
+        self.events = deque(maxlen=self.EVENT_HISTORY)
+        self.last_clean_ns: Dict[str, Optional[int]] = {"left": None, "right": None}
+        self.last_reset: Dict[str, float] = {"left": 0.0, "right": 0.0}
+        self.faults = {"left": 0, "right": 0}
+        self.bit_counts: Dict[str, int] = {}
+        self.reset_latency: Dict[str, LatencyHistogram] = {}
+        self.recovery_latency: Dict[str, LatencyHistogram] = {}
+        self.interruption = {"left": LatencyHistogram(), "right": LatencyHistogram()}
+        self.resets = 0
+        self.critical = 0
+        self.failed_reads = 0
+        self.task: Optional[asyncio.Task] = None
+
+    async def poll(self):
+        """
+        One monitoring cycle: read status, velocity, position and fault from both drives,
+        publish them and handle fault state changes.
+        Returns True if a drive was in fault state, False if not, None if the read failed
+        """
+        left_snapshot, right_snapshot = await self.clients.read_snapshot(("status", "velocity", "position", "fault"))
+        await asyncio.gather(*(self.observe(side, snapshot)
+                               for side, snapshot in (("left", left_snapshot), ("right", right_snapshot))
+                               if snapshot is not None))
+
+        if left_snapshot is None or right_snapshot is None:
+            self.failed_reads += 1
+            return None
+        return any(self.faulted.values())
+
+    async def check(self, side):
+        """
+        Reads and handles one drive, called by the control loop after each period's write.
+        Returns True if the drive is in fault state, False if not, None if the read failed
+        """
+        snapshot = await self.clients.read_snapshot_on(side, ("status", "velocity", "position"))
+        if snapshot is not None and snapshot.is_faulted():
+            fault_snapshot = await self.clients.read_snapshot_on(side, ("fault",))
+            if fault_snapshot is not None:
+                snapshot.fault = fault_snapshot.fault
+        if snapshot is None:
+            self.failed_reads += 1
+            return None
+        await self.observe(side, snapshot)
+        return self.faulted[side]
+
+    async def observe(self, side, snapshot):
+        """
+        Publishes one drive's snapshot and handles its fault state changes
+        """
+        now_ns = time.perf_counter_ns()
+        position = revs_to_modbuscntrl(convert_to_revs(snapshot.position), self.config)
+        if self.telemetry is not None:
+            self.telemetry.publish({side: snapshot}, {side: position})
+
+        if snapshot.is_faulted():
+            if not self.faulted[side]:
+                self.on_fault(side, snapshot.fault, now_ns)
+            if self.should_reset(side):
+                await self.reset(side)
+        else:
+            if self.faulted[side]:
+                self.on_recovered(side, now_ns)
+            self.last_clean_ns[side] = now_ns
+
+        self.positions[side] = position
+        if (self.position_state is not None and not any(self.faulted.values())
+                and None not in self.positions.values()):
+            self.position_state.update_feedback((self.positions["left"], self.positions["right"]))
+
+    def on_fault(self, side, fault_register, now_ns):
+        fault_register = fault_register or 0
+        events = decode_fault(side, fault_register, now_ns)
+        self.faulted[side] = True
+        self.active[side] = events
+        self.last_fault[side] = fault_register
+        self.faults[side] += 1
+        for event in events:
+            self.bit_counts[event.name] = self.bit_counts.get(event.name, 0) + 1
+
+        names = ", ".join(event.name for event in events)
+        if events[0].critical:
+            self.critical += 1
+            self.logger.error(f"CRITICAL FAULT DETECTED on {side} motor: {fault_register:#06x} ({names})")
+        else:
+            self.logger.warning(f"Fault detected on {side} motor: {fault_register:#06x} ({names})")
+
+        # Motors stop on fault, the commanded position is no longer where they are
+        if self.position_state is not None:
+            self.position_state.invalidate()
+        if self.control_loop is not None:
+            self.control_loop.invalidate(side)
+
+    def on_recovered(self, side, now_ns):
+        for event in self.active[side]:
+            event.recovered_us = (now_ns - event.detected_ns) / 1000
+            self.recovery_latency.setdefault(event.name, LatencyHistogram()).record(now_ns - event.detected_ns)
+            self.events.append(event)
+
+        if self.last_clean_ns[side] is not None:
+            self.interruption[side].record(now_ns - self.last_clean_ns[side])
+
+        self.faulted[side] = False
+        self.active[side] = []
+        self.logger.info(f"{side.capitalize()} motor fault cleared")
+
+    def should_reset(self, side) -> bool:
+        events = self.active[side]
+        if not events or events[0].critical:
+            return False
+        return time.monotonic() - self.last_reset[side] >= self.RESET_RETRY_INTERVAL
+
+    async def reset(self, side):
+        """
+        Resets the fault of one drive and keeps it enabled
+        """
+        self.last_reset[side] = time.monotonic()
+        if not await self.clients.write_register_on(side, self.config.IEG_MODE,
+                                                    IEG_MODE_bitmask_default(65535), "reset fault"):
+            self.logger.error(f"Failed to reset fault on {side} motor")
+            return False
+
+        now_ns = time.perf_counter_ns()
+        for event in self.active[side]:
+            if event.reset_us is None:
+                event.reset_us = (now_ns - event.detected_ns) / 1000
+                self.reset_latency.setdefault(event.name, LatencyHistogram()).record(now_ns - event.detected_ns)
+        self.resets += 1
+        return True
+
+    async def run(self):
+        self.logger.info(f"Starting fault monitor with interval: {self.interval:.3f} s")
+        loop = asyncio.get_running_loop()
+        next_poll = loop.time()
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Unexpected error in fault monitor: {str(e)}")
+
+            next_poll += self.interval
+            delay = next_poll - loop.time()
+            if delay < 0:
+                # Fell behind, do not try to catch up with a burst of reads
+                next_poll = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return self.task
+
+    async def stop(self):
+        if self.task is not None:
+            await cancel_and_wait(self.task)
+            self.task = None
+
+    def stats(self):
+        return {
+            "faulted": self.faulted,
+            "faults": self.faults,
+            "last_fault": self.last_fault,
+            "resets": self.resets,
+            "critical": self.critical,
+            "failed_reads": self.failed_reads,
+            "bits": {
+                name: {
+                    "count": count,
+                    "reset": self.reset_latency[name].summary() if name in self.reset_latency else None,
+                    "recovery": self.recovery_latency[name].summary() if name in self.recovery_latency else None,
+                }
+                for name, count in self.bit_counts.items()
+            },
+            "interruption": {side: histogram.summary() for side, histogram in self.interruption.items()},
+            "active": {side: [asdict(event) for event in events] for side, events in self.active.items()},
+            "recent": [asdict(event) for event in self.events],
+        }
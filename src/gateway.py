@@ -0,0 +1,104 @@
+import asyncio
+import struct
+from setup_logging import setup_logging
+from ModbusClients import ModbusClients
+from launch_params import handle_launch_params
+from heartbeat import start_heartbeat, wait_until_active
+from pipelined_client import MBAP_HEADER
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+# Modbus exception codes for gateways
+GATEWAY_PATH_UNAVAILABLE = 0x0A
+GATEWAY_TARGET_FAILED = 0x0B
+
+class DriveGateway:
+    """
+    Owns the only Modbus TCP connection to one drive and serves it to local
+    clients (server, fault poller, tools) on a local port. Requests of every local
+    client are forwarded over the shared pipelined connection and the replies
+    are sent back with the client's own transaction ID.
+    """
+    def __init__(self, side, clients, logger):
+        self.side = side
+        self.clients = clients
+        self.logger = logger
+        self.forwarded = 0
+        self.failed = 0
+
+    async def forward(self, pdu, unit):
+        upstream = self.clients.client_for(self.side)
+        try:
+            if not upstream.connected and not await upstream.connect():
+                return struct.pack(">BB", pdu[0] | 0x80, GATEWAY_PATH_UNAVAILABLE)
+            reply = await upstream.execute(pdu, unit)
+            self.forwarded += 1
+            return reply
+        except (ConnectionException, ModbusIOException) as e:
+            self.failed += 1
+            self.logger.error(f"Gateway failed to forward request to {self.side} motor: {e}")
+            return struct.pack(">BB", pdu[0] | 0x80, GATEWAY_TARGET_FAILED)
+
+    async def handle_client(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        self.logger.info(f"Local client {peer} connected to {self.side} motor gateway")
+
+        async def answer(tid, unit, pdu):
+            reply = await self.forward(pdu, unit)
+            writer.write(MBAP_HEADER.pack(tid, 0, len(reply) + 1, unit) + reply)
+
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, unit = MBAP_HEADER.unpack(header)
+                pdu = await reader.readexactly(length - 1)
+                # Every request gets its own task so one client can pipeline too
+                task = asyncio.create_task(answer(tid, unit, pdu))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            self.logger.info(f"Local client {peer} disconnected from {self.side} motor gateway")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+async def main():
+    logger = setup_logging("gateway", "gateway.log")
+    config = handle_launch_params()
+    heartbeat = start_heartbeat(config.HEARTBEAT_INTERVAL)
+    # Gateway is the one talking to the drives directly
+    config.USE_GATEWAY = False
+    config.PIPELINED = True
+    clients = ModbusClients(config=config, logger=logger)
+
+    # A standby instance stops here until the active one dies
+    await wait_until_active()
+
+    connected = await clients.connect()
+    if (not connected):
+        return
+
+    servers = []
+    try:
+        for side, port in (("left", config.GATEWAY_PORT_LEFT), ("right", config.GATEWAY_PORT_RIGHT)):
+            gateway = DriveGateway(side, clients, logger)
+            servers.append(await asyncio.start_server(gateway.handle_client, config.GATEWAY_HOST, port))
+            logger.info(f"Gateway for {side} motor listening on {config.GATEWAY_HOST}:{port}")
+
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    except KeyboardInterrupt:
+        logger.info("Gateway stopped by user")
+    except Exception as e:
+        logger.error(f"Unexpected error in gateway: {str(e)}")
+    finally:
+        for server in servers:
+            server.close()
+        if config.LATENCY_STATS:
+            logger.info(f"Gateway upstream latency: {clients.latency.summary()['drives']}")
+        clients.cleanup()
+        if heartbeat is not None:
+            heartbeat.cancel()
+
+if __name__ == "__main__":
+    asyncio.run(main())
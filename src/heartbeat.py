@@ -0,0 +1,64 @@
+import asyncio
+import os
+import sys
+from typing import Optional
+
+# Set by ModuleManager for a module it supervises, write end of the heartbeat pipe
+HEARTBEAT_FD_ENV = "LIIKEALUSTA_HEARTBEAT_FD"
+# Set for a standby instance, read end of the pipe the supervisor promotes it through
+STANDBY_FD_ENV = "LIIKEALUSTA_STANDBY_FD"
+ACTIVE_BEAT = b"."
+STANDBY_BEAT = b"s"
+
+_state = {"active": STANDBY_FD_ENV not in os.environ}
+
+def start_heartbeat(interval: float) -> Optional[asyncio.Task]:
+    """
+    Starts writing a heartbeat byte to the supervisor every interval seconds.
+    The beats come from the event loop, so a module that hangs stops beating
+    and gets restarted. Does nothing if the module was not started by a supervisor.
+    """
+    fd = os.environ.get(HEARTBEAT_FD_ENV)
+    if fd is None:
+        return None
+    fd = int(fd)
+    os.set_blocking(fd, False)
+
+    async def beat():
+        while True:
+            try:
+                os.write(fd, ACTIVE_BEAT if _state["active"] else STANDBY_BEAT)
+            except BlockingIOError:
+                # Supervisor is behind reading, a full pipe still means alive
+                pass
+            except OSError:
+                # Supervisor is gone
+                return
+            await asyncio.sleep(interval)
+
+    return asyncio.create_task(beat())
+
+async def wait_until_active():
+    """
+    Returns right away for a normally started module. A standby instance waits here,
+    already imported and set up, until the supervisor promotes it, and exits if the
+    supervisor goes away first. Call it before connecting to the drives or binding ports.
+    """
+    fd = os.environ.get(STANDBY_FD_ENV)
+    if fd is None or _state["active"]:
+        return
+    fd = int(fd)
+    os.set_blocking(fd, False)
+    loop = asyncio.get_running_loop()
+    readable = loop.create_future()
+    loop.add_reader(fd, lambda: readable.done() or readable.set_result(None))
+    try:
+        await readable
+    finally:
+        loop.remove_reader(fd)
+
+    promoted = os.read(fd, 64)
+    os.close(fd)
+    if not promoted:
+        sys.exit(0)
+    _state["active"] = True
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable
+
+class InitPipeline:
+    """
+    Startup steps as a dependency graph. Every step starts as soon as the steps it
+    depends on have succeeded, so independent steps run concurrently. A step fails
+    if it returns a falsy value or raises, and every step depending on it is skipped.
+    Start offset and duration of each step are recorded to see where startup time goes.
+    """
+    def __init__(self, logger):
+        self.logger = logger
+        self.steps: Dict[str, tuple] = {}
+        self.timings: Dict[str, dict] = {}
+        self.total_ms = None
+
+    def add(self, name: str, action: Callable[[], Awaitable], depends: Iterable[str] = ()):
+        depends = tuple(depends)
+        for dependency in depends:
+            if dependency not in self.steps:
+                raise ValueError(f"Init step {name} depends on unknown step {dependency}")
+        self.steps[name] = (action, depends)
+
+    async def run(self) -> bool:
+        """
+        Runs every step. Returns True if all of them succeeded
+        """
+        started = time.perf_counter()
+        tasks = {}
+
+        async def run_step(name):
+            action, depends = self.steps[name]
+            if depends and not all(await asyncio.gather(*(tasks[dependency] for dependency in depends))):
+                self.timings[name] = {"status": "skipped"}
+                return False
+
+            step_started = time.perf_counter()
+            try:
+                ok = bool(await action())
+            except Exception as e:
+                self.logger.error(f"Init step {name} raised: {e}")
+                ok = False
+            self.timings[name] = {
+                "status": "ok" if ok else "failed",
+                "start_ms": round((step_started - started) * 1000, 1),
+                "duration_ms": round((time.perf_counter() - step_started) * 1000, 1),
+            }
+            if not ok:
+                self.logger.error(f"Init step {name} failed")
+            return ok
+
+        for name in self.steps:
+            tasks[name] = asyncio.create_task(run_step(name))
+        results = await asyncio.gather(*tasks.values())
+        self.total_ms = round((time.perf_counter() - started) * 1000, 1)
+
+        phases = ", ".join(f"{name} {timing['duration_ms']} ms" for name, timing in self.timings.items()
+                           if "duration_ms" in timing)
+        self.logger.info(f"Init {'ready' if all(results) else 'failed'} in {self.total_ms} ms: {phases}")
+        return all(results)
+
+    def failed(self):
+        return [name for name, timing in self.timings.items() if timing["status"] == "failed"]
+
+    def summary(self):
+        return {"total_ms": self.total_ms, "steps": self.timings}
@@ -0,0 +1,284 @@
+import math
+import os
+import numpy as np
+from typing import Optional, Tuple
+
+GRAVITY = 9.81
+
+class PlatformKinematics:
+    """
+    Platform pitch/roll in degrees to (left, right) ModbusCtrl values.
+
+    The platform pivots on a joint at the rear center line, the two actuators hold up its
+    front corners. Positive pitch raises the front, positive roll raises the left side.
+    An actuator joint at (forward, lateral) on the platform moves with the rotation and the
+    actuator length is the distance from its base joint, which sits right below the platform
+    joint when the platform is level at ACTUATOR_NEUTRAL_STROKE.
+
+    With a KinematicsTable in use setpoints are interpolated from it instead of
+    evaluating the exact model for every request.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.forward = config.PLATFORM_ATTACH_FORWARD
+        self.half_width = config.PLATFORM_ATTACH_HALF_WIDTH
+        self.retracted = config.ACTUATOR_RETRACTED_LENGTH
+        self.base_depth = config.ACTUATOR_RETRACTED_LENGTH + config.ACTUATOR_NEUTRAL_STROKE
+        self.table: Optional["KinematicsTable"] = None
+
+    def geometry(self):
+        """
+        Everything the mapping depends on, a cached table is only valid for the same values
+        """
+        config = self.config
+        return np.array([self.forward, self.half_width, self.retracted, config.ACTUATOR_NEUTRAL_STROKE,
+                         config.ACTUATOR_LEAD_MM, config.POS_MIN_REVS, config.POS_MAX_REVS,
+                         config.MODBUSCTRL_MAX, config.PITCH_MAX_DEG, config.ROLL_MAX_DEG], dtype=np.float64)
+
+    def use_table(self, table: Optional["KinematicsTable"]):
+        self.table = table
+
+    def clamp_angles(self, pitch: float, roll: float) -> Tuple[float, float, bool]:
+        """
+        Limits the angles to PITCH_MAX_DEG and ROLL_MAX_DEG.
+        Returns (pitch, roll, clamped)
+        """
+        limited_pitch = max(-self.config.PITCH_MAX_DEG, min(pitch, self.config.PITCH_MAX_DEG))
+        limited_roll = max(-self.config.ROLL_MAX_DEG, min(roll, self.config.ROLL_MAX_DEG))
+        return limited_pitch, limited_roll, (limited_pitch, limited_roll) != (pitch, roll)
+
+    def tilt_coordination(self, acc_x, acc_y):
+        """
+        Sustained acceleration cues (m/s^2, positive forward and to the left) as the platform
+        tilt that lets gravity give the same push, scaled by TILT_COORDINATION_GAIN.
+        Returns (pitch, roll) in degrees to add to the commanded angles, works on arrays too
+        """
+        gain = self.config.TILT_COORDINATION_GAIN
+        return (gain * np.degrees(np.arctan2(acc_x, GRAVITY)),
+                gain * np.degrees(np.arctan2(acc_y, GRAVITY)))
+
+    def actuator_strokes(self, pitch, roll):
+        """
+        Exact model. Returns (left, right) actuator stroke in mm, for floats or arrays of angles
+        """
+        sin_pitch, cos_pitch = np.sin(np.radians(pitch)), np.cos(np.radians(pitch))
+        sin_roll, cos_roll = np.sin(np.radians(roll)), np.cos(np.radians(roll))
+        strokes = []
+        for lateral in (self.half_width, -self.half_width):
+            # Roll about the forward axis, then pitch about the lateral axis
+            y = lateral * cos_roll
+            z_rolled = lateral * sin_roll
+            x = self.forward * cos_pitch - z_rolled * sin_pitch
+            z = self.forward * sin_pitch + z_rolled * cos_pitch
+            length = np.sqrt((x - self.forward) ** 2 + (y - lateral) ** 2 + (z + self.base_depth) ** 2)
+            strokes.append(length - self.retracted)
+        return strokes[0], strokes[1]
+
+    def stroke_to_modbuscntrl(self, stroke):
+        """
+        Stroke in mm to ModbusCtrl without rounding or limiting, so values
+        outside 0 - MODBUSCTRL_MAX show how far the stroke is out of range
+        """
+        revs = stroke / self.config.ACTUATOR_LEAD_MM
+        percentile = (revs - self.config.POS_MIN_REVS) / (self.config.POS_MAX_REVS - self.config.POS_MIN_REVS)
+        return percentile * self.config.MODBUSCTRL_MAX
+
+    def exact_modbuscntrl(self, pitch, roll):
+        """
+        Unrounded (left, right) ModbusCtrl of the exact model
+        """
+        stroke_left, stroke_right = self.actuator_strokes(pitch, roll)
+        return self.stroke_to_modbuscntrl(stroke_left), self.stroke_to_modbuscntrl(stroke_right)
+
+    def setpoint(self, pitch: float, roll: float, acc_x: float = 0.0, acc_y: float = 0.0) -> Tuple[Tuple[int, int], bool]:
+        """
+        Both ModbusCtrl values of one platform orientation, with optional acceleration cues.
+        Returns ((left, right), clamped), clamped is True if the angles or the strokes
+        had to be limited to what the platform can do
+        """
+        if acc_x or acc_y:
+            cue_pitch, cue_roll = self.tilt_coordination(acc_x, acc_y)
+            pitch, roll = pitch + float(cue_pitch), roll + float(cue_roll)
+        pitch, roll, clamped = self.clamp_angles(pitch, roll)
+        if self.table is not None:
+            left, right = self.table.lookup(pitch, roll)
+        else:
+            left, right = (float(value) for value in self.exact_modbuscntrl(pitch, roll))
+
+        maximum = self.config.MODBUSCTRL_MAX
+        clamped = clamped or not (0 <= left <= maximum and 0 <= right <= maximum)
+        return (max(0, min(math.floor(left), maximum)), max(0, min(math.floor(right), maximum))), clamped
+
+    def setpoints(self, pitch, roll, acc_x=0.0, acc_y=0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Batch version of setpoint for whole trajectories.
+        Returns (values, clamped): an (n, 2) int array of (left, right) ModbusCtrl
+        and a bool array telling which samples had to be limited
+        """
+        values, clamped = self.modbuscntrl_batch(pitch, roll, acc_x, acc_y)
+        return np.clip(np.floor(values), 0, self.config.MODBUSCTRL_MAX).astype(np.int64), clamped
+
+    def modbuscntrl_batch(self, pitch, roll, acc_x=0.0, acc_y=0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Like setpoints but the (n, 2) values are not rounded or limited to
+        0 - MODBUSCTRL_MAX, eg. for velocities that quantization would distort
+        """
+        cue_pitch, cue_roll = self.tilt_coordination(acc_x, acc_y)
+        pitch = np.asarray(pitch, dtype=np.float64) + cue_pitch
+        roll = np.asarray(roll, dtype=np.float64) + cue_roll
+        limited_pitch = np.clip(pitch, -self.config.PITCH_MAX_DEG, self.config.PITCH_MAX_DEG)
+        limited_roll = np.clip(roll, -self.config.ROLL_MAX_DEG, self.config.ROLL_MAX_DEG)
+        if self.table is not None:
+            values = self.table.lookup_batch(limited_pitch, limited_roll)
+        else:
+            values = np.stack(self.exact_modbuscntrl(limited_pitch, limited_roll), axis=-1)
+
+        clamped = ((limited_pitch != pitch) | (limited_roll != roll)
+                   | np.any((values < 0) | (values > self.config.MODBUSCTRL_MAX), axis=-1))
+        return values, clamped
+
+class KinematicsTable:
+    """
+    Unrounded (left, right) ModbusCtrl of the exact model on an evenly spaced
+    pitch x roll grid covering the angle limits. Lookups interpolate bilinearly
+    between the four surrounding grid points, so a setpoint costs the same
+    few multiplications however complex the geometry is.
+    """
+    def __init__(self, geometry: np.ndarray, pitch_max: float, roll_max: float, grid: np.ndarray):
+        self.geometry = geometry
+        self.pitch_max = pitch_max
+        self.roll_max = roll_max
+        # grid[side, pitch index, roll index]
+        self.grid = grid
+        self.pitch_count, self.roll_count = grid.shape[1:]
+        self.pitch_step = 2 * pitch_max / (self.pitch_count - 1)
+        self.roll_step = 2 * roll_max / (self.roll_count - 1)
+        # Plain lists are faster than numpy indexing for single lookups
+        self.left_rows = grid[0].tolist()
+        self.right_rows = grid[1].tolist()
+        self.max_error: Optional[float] = None
+
+    @classmethod
+    def build(cls, kinematics: PlatformKinematics, step: float) -> "KinematicsTable":
+        config = kinematics.config
+        pitch = np.linspace(-config.PITCH_MAX_DEG, config.PITCH_MAX_DEG, max(2, round(2 * config.PITCH_MAX_DEG / step) + 1))
+        roll = np.linspace(-config.ROLL_MAX_DEG, config.ROLL_MAX_DEG, max(2, round(2 * config.ROLL_MAX_DEG / step) + 1))
+        pitch_grid, roll_grid = np.meshgrid(pitch, roll, indexing="ij")
+        grid = np.stack(kinematics.exact_modbuscntrl(pitch_grid, roll_grid))
+        return cls(kinematics.geometry(), config.PITCH_MAX_DEG, config.ROLL_MAX_DEG, grid)
+
+    @classmethod
+    def load(cls, path) -> "KinematicsTable":
+        with np.load(path) as data:
+            geometry, limits, grid = data["geometry"], data["limits"], data["grid"]
+        return cls(geometry, float(limits[0]), float(limits[1]), grid)
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write and rename so a crash never leaves half a table behind
+        temp_path = f"{path}.tmp.npz"
+        np.savez(temp_path, geometry=self.geometry, limits=np.array([self.pitch_max, self.roll_max]), grid=self.grid)
+        os.replace(temp_path, path)
+
+    def matches(self, kinematics: PlatformKinematics, step: float) -> bool:
+        return (np.array_equal(self.geometry, kinematics.geometry())
+                and math.isclose(self.pitch_step, 2 * self.pitch_max / max(1, round(2 * self.pitch_max / step)))
+                and math.isclose(self.roll_step, 2 * self.roll_max / max(1, round(2 * self.roll_max / step))))
+
+    def lookup(self, pitch: float, roll: float) -> Tuple[float, float]:
+        """
+        Interpolated (left, right) ModbusCtrl, the angles have to be within the limits
+        """
+        x = (pitch + self.pitch_max) / self.pitch_step
+        y = (roll + self.roll_max) / self.roll_step
+        i = min(int(x), self.pitch_count - 2)
+        j = min(int(y), self.roll_count - 2)
+        fx = x - i
+        fy = y - j
+        values = []
+        for rows in (self.left_rows, self.right_rows):
+            row, next_row = rows[i], rows[i + 1]
+            values.append((row[j] + (next_row[j] - row[j]) * fx) * (1 - fy)
+                          + (row[j + 1] + (next_row[j + 1] - row[j + 1]) * fx) * fy)
+        return values[0], values[1]
+
+    def lookup_batch(self, pitch: np.ndarray, roll: np.ndarray) -> np.ndarray:
+        """
+        lookup for arrays of angles, returns an (n, 2) array of (left, right)
+        """
+        x = (np.asarray(pitch, dtype=np.float64) + self.pitch_max) / self.pitch_step
+        y = (np.asarray(roll, dtype=np.float64) + self.roll_max) / self.roll_step
+        i = np.clip(x.astype(np.int64), 0, self.pitch_count - 2)
+        j = np.clip(y.astype(np.int64), 0, self.roll_count - 2)
+        fx = (x - i)[np.newaxis]
+        fy = (y - j)[np.newaxis]
+        grid = self.grid
+        values = ((grid[:, i, j] * (1 - fx) + grid[:, i + 1, j] * fx) * (1 - fy)
+                  + (grid[:, i, j + 1] * (1 - fx) + grid[:, i + 1, j + 1] * fx) * fy)
+        return np.moveaxis(values, 0, -1)
+
+    def validate(self, kinematics: PlatformKinematics, samples: int = 10000, seed: int = 0) -> float:
+        """
+        Compares the table against the exact model at random angles and at the centers
+        of the grid cells, where interpolation is the furthest from the grid points.
+        Returns the largest difference in ModbusCtrl units
+        """
+        rng = np.random.default_rng(seed)
+        pitch = rng.uniform(-self.pitch_max, self.pitch_max, samples)
+        roll = rng.uniform(-self.roll_max, self.roll_max, samples)
+        center_pitch, center_roll = np.meshgrid(
+            np.arange(self.pitch_count - 1) * self.pitch_step - self.pitch_max + self.pitch_step / 2,
+            np.arange(self.roll_count - 1) * self.roll_step - self.roll_max + self.roll_step / 2,
+            indexing="ij")
+        pitch = np.concatenate([pitch, center_pitch.ravel()])
+        roll = np.concatenate([roll, center_roll.ravel()])
+
+        exact = np.stack(kinematics.exact_modbuscntrl(pitch, roll), axis=-1)
+        self.max_error = float(np.max(np.abs(self.lookup_batch(pitch, roll) - exact)))
+        return self.max_error
+
+    def stats(self):
+        return {
+            "shape": [self.pitch_count, self.roll_count],
+            "pitch_step": self.pitch_step,
+            "roll_step": self.roll_step,
+            "max_error": self.max_error,
+        }
+
+def prepare_table(kinematics: PlatformKinematics, config, logger, path=None) -> Optional[KinematicsTable]:
+    """
+    Loads the table from the cache file if it was built for this geometry,
+    otherwise builds it and saves it there. The table is validated against the
+    exact model either way and taken into use only if its error is at most
+    KINEMATICS_LUT_MAX_ERROR, otherwise setpoints keep using the exact model.
+    """
+    if path is None:
+        path = os.path.join(os.path.dirname(__file__), '..', 'state', config.KINEMATICS_LUT_FILE)
+    step = config.KINEMATICS_LUT_STEP
+
+    table = None
+    try:
+        table = KinematicsTable.load(path)
+        if not table.matches(kinematics, step):
+            logger.info("Kinematics table cache is for another geometry, rebuilding it")
+            table = None
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable kinematics table cache {path}: {e}")
+
+    if table is None:
+        table = KinematicsTable.build(kinematics, step)
+        try:
+            table.save(path)
+        except OSError as e:
+            logger.error(f"Failed to save kinematics table cache: {e}")
+
+    error = table.validate(kinematics)
+    if error > config.KINEMATICS_LUT_MAX_ERROR:
+        logger.error(f"Kinematics table error {error:.3f} is over {config.KINEMATICS_LUT_MAX_ERROR}, using the exact model")
+        return None
+
+    logger.info(f"Kinematics table {table.pitch_count}x{table.roll_count} ready, max error {error:.4f} ModbusCtrl")
+    kinematics.use_table(table)
+    return table
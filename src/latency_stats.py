@@ -0,0 +1,156 @@
+import time
+from bisect import bisect_left
+from typing import Dict, Tuple
+
+# Bucket upper bounds in nanoseconds from 16 us to ~16.8 s, 8 buckets per doubling
+# so a percentile is placed within ~9 %
+BUCKETS_PER_OCTAVE = 8
+BUCKET_BOUNDS_NS = [round(16_000 * 2 ** (i / BUCKETS_PER_OCTAVE)) for i in range(20 * BUCKETS_PER_OCTAVE + 1)]
+
+FUNCTION_CODES = {
+    "read_holding_registers": 3,
+    "write_register": 6,
+    "write_registers": 16,
+}
+
+class LatencyHistogram:
+    """
+    Fixed bucket latency histogram, recording is one bisect and two additions
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_NS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns: int, error=False):
+        self.counts[bisect_left(BUCKET_BOUNDS_NS, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        if duration_ns > self.max_ns:
+            self.max_ns = duration_ns
+        if error:
+            self.errors += 1
+
+    def percentile(self, fraction: float) -> int:
+        """
+        Upper bound (ns) of the bucket the given fraction of samples falls in,
+        at most the largest recorded sample
+        """
+        if self.count == 0:
+            return 0
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(BUCKET_BOUNDS_NS[index], self.max_ns) if index < len(BUCKET_BOUNDS_NS) else self.max_ns
+        return self.max_ns
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_us": round(self.total_ns / self.count / 1000, 1) if self.count else 0,
+            "p50_us": self.percentile(0.5) / 1000,
+            "p99_us": self.percentile(0.99) / 1000,
+            "max_us": self.max_ns / 1000,
+        }
+
+class LatencyStats:
+    """
+    Modbus round-trip histograms keyed by (motor, function code, register)
+    and retry counters keyed by (motor, operation)
+    """
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, int, int], LatencyHistogram] = {}
+        self.retries: Dict[Tuple[str, str], int] = {}
+
+    def record(self, side, function_code, address, duration_ns, error=False):
+        key = (side, function_code, address)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = LatencyHistogram()
+        histogram.record(duration_ns, error)
+
+    def record_retry(self, side, description):
+        key = (side, description)
+        self.retries[key] = self.retries.get(key, 0) + 1
+
+    def summary(self):
+        """
+        JSON friendly summary, per register and totals per motor
+        """
+        registers = []
+        per_side: Dict[str, LatencyHistogram] = {}
+        for (side, function_code, address), histogram in sorted(self.histograms.items()):
+            registers.append({"side": side, "function_code": function_code, "register": address,
+                              **histogram.summary()})
+            total = per_side.setdefault(side, LatencyHistogram())
+            for index, count in enumerate(histogram.counts):
+                total.counts[index] += count
+            total.count += histogram.count
+            total.errors += histogram.errors
+            total.total_ns += histogram.total_ns
+            total.max_ns = max(total.max_ns, histogram.max_ns)
+
+        return {
+            "drives": {side: histogram.summary() for side, histogram in per_side.items()},
+            "registers": registers,
+            "retries": [{"side": side, "operation": description, "count": count}
+                        for (side, description), count in sorted(self.retries.items())],
+        }
+
+class TimedClient:
+    """
+    Wraps a Modbus client and times every request with perf_counter_ns into LatencyStats.
+    Everything else is passed through to the wrapped client.
+    """
+    def __init__(self, client, side, stats: LatencyStats):
+        self.client = client
+        self.side = side
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    async def _timed(self, function_code, address, request):
+        start = time.perf_counter_ns()
+        try:
+            response = await request
+        except BaseException:
+            self.stats.record(self.side, function_code, address, time.perf_counter_ns() - start, error=True)
+            raise
+        self.stats.record(self.side, function_code, address, time.perf_counter_ns() - start,
+                          error=response.isError())
+        return response
+
+    async def read_holding_registers(self, address, count=1, slave=1):
+        return await self._timed(FUNCTION_CODES["read_holding_registers"], address,
+                                 self.client.read_holding_registers(address=address, count=count, slave=slave))
+
+    async def write_register(self, address, value, slave=1):
+        return await self._timed(FUNCTION_CODES["write_register"], address,
+                                 self.client.write_register(address=address, value=value, slave=slave))
+
+    async def write_registers(self, address, values, slave=1):
+        return await self._timed(FUNCTION_CODES["write_registers"], address,
+                                 self.client.write_registers(address=address, values=values, slave=slave))
+
+    async def execute(self, pdu: bytes, slave: int) -> bytes:
+        """
+        Raw request PDU of the pipelined client, as forwarded by the gateway,
+        timed under its function code and start register
+        """
+        function_code = pdu[0]
+        address = int.from_bytes(pdu[1:3], "big")
+        start = time.perf_counter_ns()
+        try:
+            reply = await self.client.execute(pdu, slave)
+        except BaseException:
+            self.stats.record(self.side, function_code, address, time.perf_counter_ns() - start, error=True)
+            raise
+        self.stats.record(self.side, function_code, address, time.perf_counter_ns() - start,
+                          error=bool(reply[0] & 0x80))
+        return reply
@@ -11,12 +11,21 @@ def handle_launch_params():
     parser.add_argument("--server_right", type=str, help="right side motor ip")
     parser.add_argument("--vel", type=int, help="max rpm velocity")
     parser.add_argument("--acc", type=int, help="max rpm acceleration")
-    parser.add_argument("--freq", type=str, help="Expected motor command frequency")
+    parser.add_argument("--freq", type=int, help="Expected motor command frequency")
     parser.add_argument("--slaveid", type=int, help="drivers slave id")
-    parser.add_argument("--polling_time_interval", type=int, help="polling time interval")
+    parser.add_argument("--polling_time_interval", type=float, help="polling time interval")
     parser.add_argument("--start_tid", type=int, help="start tid")
     parser.add_argument("--end_tid", type=int, help="end tid")
     parser.add_argument("--web_server_port", type=int, help="end tid")
+    parser.add_argument("--pipelined", action="store_true", help="use pipelined modbus client")
+    parser.add_argument("--port_left", type=int, help="left side motor port")
+    parser.add_argument("--port_right", type=int, help="right side motor port")
+    parser.add_argument("--gateway", action="store_true", help="connect to the motors through the local gateway")
+    parser.add_argument("--fast_write", action="store_true", help="raw socket fast path for modbuscntrl writes")
+    parser.add_argument("--cold_start", action="store_true", help="always home and write every drive parameter")
+    parser.add_argument("--geometry_verified", action="store_true", help="enable absolute setpoints, the platform geometry in Config is checked")
+    parser.add_argument("--udp_port", type=int, help="listen for UDP setpoints on this port")
+    parser.add_argument("--fault_monitor", type=str, choices=["task", "process", "off"], help="where faults are monitored")
 
     config = Config()
     config.MODULE_NAME = module_name
@@ -24,6 +33,9 @@ def handle_launch_params():
     if ("fault_poller.py" in module_name):
         config.START_TID = 30000
         config.LAST_TID = 40000
+    elif ("gateway.py" in module_name):
+        config.START_TID = 40000
+        config.LAST_TID = 50000
     elif (module_name in "palvelin.py"):
         config.START_TID = 1
         config.LAST_TID = 10000
@@ -44,12 +56,46 @@ def handle_launch_params():
     if (args.slaveid):
         config.SLAVE_ID = args.slaveid
     if (args.polling_time_interval):
-        config.POLLING_TIME_INTERVAL = args.time_interval
+        config.POLLING_TIME_INTERVAL = args.polling_time_interval
     if (args.start_tid):
         config.START_TID = args.start_tid
     if (args.end_tid):
         config.LAST_TID = args.end_tid
     if (args.web_server_port):
         config.WEB_SERVER_PORT = args.web_server_port
+    if (args.pipelined):
+        config.PIPELINED = True
+    if (args.port_left):
+        config.SERVER_PORT_LEFT = args.port_left
+    if (args.port_right):
+        config.SERVER_PORT_RIGHT = args.port_right
+    if (args.gateway):
+        config.USE_GATEWAY = True
+    if (args.fast_write):
+        config.FAST_CNTRL_WRITE = True
+    if (args.fault_monitor):
+        config.FAULT_MONITOR = args.fault_monitor
+    if (args.cold_start):
+        config.WARM_RESTART = False
+    if (args.geometry_verified):
+        config.GEOMETRY_VERIFIED = True
+    if (args.udp_port):
+        config.UDP_SETPOINTS = True
+        config.UDP_SETPOINT_PORT = args.udp_port
 
-    return config
\ No newline at end of file
+    return config
+
+def drive_launch_args(config):
+    """
+    Builds the command line arguments that give a launched module
+    the same drive connection settings as this one
+    """
+    args = ["--server_left", config.SERVER_IP_LEFT, "--server_right", config.SERVER_IP_RIGHT,
+            "--port", str(config.SERVER_PORT), "--slaveid", str(config.SLAVE_ID)]
+    if config.SERVER_PORT_LEFT:
+        args += ["--port_left", str(config.SERVER_PORT_LEFT)]
+    if config.SERVER_PORT_RIGHT:
+        args += ["--port_right", str(config.SERVER_PORT_RIGHT)]
+    if config.USE_GATEWAY:
+        args.append("--gateway")
+    return args
@@ -1,43 +1,90 @@
+import asyncio
 import subprocess
 import os
 import sys
 import signal
 import time
 import psutil
+from heartbeat import HEARTBEAT_FD_ENV, STANDBY_FD_ENV, ACTIVE_BEAT
+from latency_stats import LatencyHistogram
 
 class ModuleManager:
+    # A supervised module that exits sooner than this after becoming active is crash looping
+    MIN_UPTIME = 5.0
+    # Delay before relaunching a crash looping module, doubled for every quick exit in a row
+    BACKOFF_INITIAL = 0.5
+    BACKOFF_MAX = 10.0
+
     def __init__(self, logger):
         self.processes = {}
         self.logger = logger
+        self.src_dir = os.path.dirname(os.path.abspath(__file__))
+        self.supervisors = {}
+        self.supervised = {}
+        self.stopping = False
 
-    def launch_module(self, module_path, args=None):
-        """Launch a Python module and return PID or none if error"""
+    def launch_module(self, module_path, args=None, heartbeat=False, standby=False):
+        """
+        Launch a Python module and return PID or none if error.
+        With heartbeat the module gets the write end of a pipe to heartbeat on,
+        the read end is stored in processes[pid]['heartbeat-fd'].
+        With standby the module gets the read end of a control pipe and waits
+        until promote is called before it starts working (see heartbeat.py)
+        """
+        pipes = []
         try:
-            if args:
-                cmd.extend(args)
-                
-            base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-            src_dir = os.path.join(base_dir, 'src')
-            file_path = os.path.join(src_dir, f"{module_path}.py")
+            file_path = os.path.join(self.src_dir, f"{module_path}.py")
 
             cmd =  ['python', file_path]
+            if args:
+                cmd.extend(args)
             
+            popen_args = {}
+            heartbeat_read = control_write = None
+            if (heartbeat or standby) and os.name != 'nt':
+                env = dict(os.environ)
+                child_fds = []
+                if heartbeat:
+                    heartbeat_read, heartbeat_write = os.pipe()
+                    pipes += [heartbeat_read, heartbeat_write]
+                    os.set_blocking(heartbeat_read, False)
+                    env[HEARTBEAT_FD_ENV] = str(heartbeat_write)
+                    child_fds.append(heartbeat_write)
+                if standby:
+                    control_read, control_write = os.pipe()
+                    pipes += [control_read, control_write]
+                    env[STANDBY_FD_ENV] = str(control_read)
+                    child_fds.append(control_read)
+                popen_args = {"pass_fds": tuple(child_fds), "env": env}
+
             process = subprocess.Popen(
                 cmd,
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0,
+                **popen_args
             )
+            # Child ends of the pipes belong to the child now
+            for fd in popen_args.get("pass_fds", ()):
+                os.close(fd)
 
             pid = process.pid
             self.processes[pid] = {
                 'process': process,
                 'module': module_path,
-                'launch-time': time.time()
+                'launch-time': time.time(),
+                'heartbeat-fd': heartbeat_read,
+                'control-fd': control_write,
+                'standby': standby and control_write is not None,
             }
-            self.logger.info(f"Launched {module_path} with PID: {process.pid}")
+            self.logger.info(f"Launched {module_path}{' standby' if self.processes[pid]['standby'] else ''} with PID: {process.pid}")
             return pid
             
         except Exception as e:
             self.logger.error(f"Failed to launch process {module_path}: {e}")
+            for fd in pipes:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
             return None
 
     def cleanup_module(self, pid):
@@ -85,8 +132,224 @@ class ModuleManager:
             self.logger.error(f"Cleaned up module with PID {pid}")
             return True
 
+    def start_supervised(self, module_path, args=None, heartbeat_timeout=None, startup_timeout=10.0, standby=False):
+        """
+        Launches a module and keeps it running in the background, see supervise.
+        Returns the supervising task
+        """
+        task = asyncio.create_task(self.supervise(module_path, args, heartbeat_timeout, startup_timeout, standby))
+        self.supervisors[module_path] = task
+        return task
+
+    async def supervise(self, module_path, args=None, heartbeat_timeout=None, startup_timeout=10.0, standby=False):
+        """
+        Keeps a module running. The exit of the module is noticed as it happens and
+        the module is replaced right away. With heartbeat_timeout the module has to
+        heartbeat over a pipe (heartbeat.py), if it stays silent longer than that,
+        or does not beat within startup_timeout of starting, it is killed and replaced.
+        With standby a second, already started instance waits next to the active one
+        and is promoted when the active one dies, so failover skips the cold start.
+        A module that exits within MIN_UPTIME of becoming active, or never becomes active,
+        is replaced only after a backoff that doubles up to BACKOFF_MAX while it keeps doing
+        so. Those replacements count as crash_restarts and stay out of restart_latency.
+        The backoff only delays launching a new instance, a healthy standby is promoted at once.
+        Runs until cancelled or cleanup_all is called.
+        """
+        stats = self.supervised.setdefault(module_path, {
+            "pid": None,
+            "standby_pid": None,
+            "restarts": 0,
+            "failovers": 0,
+            "crash_restarts": 0,
+            "backoff": 0.0,
+            "last_exit": None,
+            "last_reason": None,
+            "restart_latency": LatencyHistogram(),
+        })
+        down_since = None
+        spare = None
+        backoff = 0.0
+        if standby and os.name == 'nt':
+            # No control pipe to hold a standby back, it would run live next to the active one
+            self.logger.warning(f"Standby instances are not supported on Windows, supervising {module_path} without one")
+            standby = False
+
+        try:
+            while not self.stopping:
+                if spare is not None and self._is_healthy(spare, heartbeat_timeout) and self._promote(spare):
+                    info = spare
+                    stats["failovers"] += 1
+                else:
+                    if spare is not None:
+                        self._discard(spare)
+                    info = self._launch_supervised(module_path, args, heartbeat_timeout)
+                    if info is None:
+                        await asyncio.sleep(1)
+                        continue
+                spare = None
+
+                stats["pid"] = info['process'].pid
+                info['on-active'] = lambda since=down_since: self._record_restart(stats, since)
+                if info['heartbeat-fd'] is None:
+                    # No heartbeat, the module counts as up once started
+                    info.pop('on-active')()
+
+                if standby:
+                    spare = self._launch_supervised(module_path, args, heartbeat_timeout, standby=True)
+                    stats["standby_pid"] = spare['process'].pid if spare is not None else None
+
+                started = time.monotonic()
+                try:
+                    reason = await self._watch(info, heartbeat_timeout, startup_timeout)
+                finally:
+                    self._close_pipes(info)
+
+                down_since = time.perf_counter_ns()
+                process = info['process']
+                self.processes.pop(process.pid, None)
+                stats["last_exit"] = process.returncode
+                stats["last_reason"] = reason
+                if 'on-active' in info or time.monotonic() - started < self.MIN_UPTIME:
+                    backoff = min(backoff * 2, self.BACKOFF_MAX) if backoff else self.BACKOFF_INITIAL
+                    stats["crash_restarts"] += 1
+                    down_since = None
+                else:
+                    backoff = 0.0
+                stats["backoff"] = backoff
+                # A healthy standby is already running, only launching a new instance waits out the backoff
+                takeover = spare is not None and self._is_healthy(spare, heartbeat_timeout)
+                if not self.stopping:
+                    self.logger.warning(f"{module_path} (PID: {process.pid}) {reason} with code {process.returncode}, "
+                                        f"{'promoting standby' if takeover else 'restarting'}"
+                                        f"{f' in {backoff:.1f} s' if backoff and not takeover else ''}...")
+                if backoff and not takeover:
+                    await asyncio.sleep(backoff)
+        finally:
+            if spare is not None:
+                self._discard(spare)
+
+    def _launch_supervised(self, module_path, args, heartbeat_timeout, standby=False):
+        """
+        Launches a module and starts reading its heartbeats.
+        Returns its processes entry or None if launching failed
+        """
+        pid = self.launch_module(module_path, args, heartbeat=heartbeat_timeout is not None, standby=standby)
+        if pid is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        info = self.processes[pid]
+        info['last-heartbeat'] = None
+        info['active'] = not info['standby']
+        fd = info['heartbeat-fd']
+        if fd is None:
+            return info
+
+        def on_heartbeat():
+            try:
+                data = os.read(fd, 4096)
+            except BlockingIOError:
+                return
+            if not data:
+                # Module closed its end, the exit notification follows
+                loop.remove_reader(fd)
+                return
+            info['last-heartbeat'] = loop.time()
+            # Standby beats with "s", active with "."
+            if ACTIVE_BEAT in data and 'on-active' in info:
+                info.pop('on-active')()
+
+        loop.add_reader(fd, on_heartbeat)
+        return info
+
+    def _is_healthy(self, info, heartbeat_timeout) -> bool:
+        if info['process'].poll() is not None:
+            return False
+        if info['heartbeat-fd'] is None or info['last-heartbeat'] is None:
+            return info['heartbeat-fd'] is None
+        return asyncio.get_running_loop().time() - info['last-heartbeat'] < heartbeat_timeout
+
+    def _promote(self, info) -> bool:
+        """
+        Tells a standby instance to start working
+        """
+        try:
+            os.write(info['control-fd'], b"!")
+        except OSError as e:
+            self.logger.error(f"Failed to promote standby {info['module']} (PID: {info['process'].pid}): {e}")
+            return False
+        info['active'] = True
+        self.logger.info(f"Promoted standby {info['module']} (PID: {info['process'].pid})")
+        return True
+
+    def _discard(self, info):
+        process = info['process']
+        process.kill()
+        self._close_pipes(info)
+        self.processes.pop(process.pid, None)
+        # Reap it without blocking the event loop
+        asyncio.get_running_loop().run_in_executor(None, process.wait)
+
+    async def _watch(self, info, heartbeat_timeout, startup_timeout):
+        """
+        Waits until the module exits or misses its heartbeat.
+        Returns the reason it stopped
+        """
+        loop = asyncio.get_running_loop()
+        process = info['process']
+        started = loop.time()
+        # A thread blocks in wait() so the exit is noticed without polling
+        exited = loop.run_in_executor(None, process.wait)
+
+        while True:
+            timeout = None
+            if info['heartbeat-fd'] is not None and 'on-active' in info:
+                # Check again every heartbeat_timeout until the first active beat arrives
+                timeout = max(0, min(started + startup_timeout - loop.time(), heartbeat_timeout))
+            elif info['heartbeat-fd'] is not None:
+                timeout = max(0, info['last-heartbeat'] + heartbeat_timeout - loop.time())
+            done, _ = await asyncio.wait({exited}, timeout=timeout)
+            if done:
+                return "exited"
+            if 'on-active' in info and loop.time() - started >= startup_timeout:
+                reason = "did not start heartbeating"
+                break
+            if 'on-active' not in info and loop.time() - info['last-heartbeat'] >= heartbeat_timeout:
+                reason = "missed heartbeat"
+                break
+
+        process.kill()
+        await exited
+        return reason
+
+    def _record_restart(self, stats, down_since):
+        if down_since is None:
+            return
+        stats["restarts"] += 1
+        stats["restart_latency"].record(time.perf_counter_ns() - down_since)
+
+    def _close_pipes(self, info):
+        fd = info['heartbeat-fd']
+        if fd is not None:
+            asyncio.get_running_loop().remove_reader(fd)
+            os.close(fd)
+            info['heartbeat-fd'] = None
+        if info.get('control-fd') is not None:
+            os.close(info['control-fd'])
+            info['control-fd'] = None
+
+    def stats(self):
+        return {
+            module: {**stats, "restart_latency": stats["restart_latency"].summary()}
+            for module, stats in self.supervised.items()
+        }
+
     def cleanup_all(self):
         """Cleanup all running modules"""
+        # Stop supervision first so killed modules are not relaunched
+        self.stopping = True
+        for task in self.supervisors.values():
+            task.cancel()
         for pid in list(self.processes.keys()):
             self.cleanup_module(pid)
 
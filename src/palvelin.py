@@ -1,14 +1,25 @@
-import psutil
 import asyncio
-from quart import Quart, request, make_response, jsonify
+from quart import Quart, request, websocket, make_response, jsonify
 from ModbusClients import ModbusClients
 import atexit
 from setup_logging import setup_logging
-from launch_params import handle_launch_params
+from launch_params import handle_launch_params, drive_launch_args
 from module_manager import ModuleManager
+from control_loop import ControlLoop
+from position_state import PositionState
+from connection_supervisor import ConnectionSupervisor
+from fault_monitor import FaultMonitor
+from telemetry_shm import TelemetryWriter
+from init_pipeline import InitPipeline
+from drive_state import DriveStateStore
+from kinematics import PlatformKinematics, prepare_table
+from setpoint_stream import StreamStats, decode_setpoint, encode_ack
+from udp_setpoints import UdpSetpointListener
+from trajectory import TrajectoryPlayer, parse_trajectory, validate_trajectory
 import subprocess
 from time import sleep 
-from utils import is_nth_bit_on, IEG_MODE_bitmask_enable, convert_acc_rpm_revs, convert_vel_rpm_revs
+from utils import is_nth_bit_on, IEG_MODE_bitmask_enable, convert_acc_rpm_revs, convert_vel_rpm_revs, cancel_and_wait
+import json
 import math
 import sys
 import os
@@ -18,17 +29,33 @@ async def shutdown_test(app):
     """Gracefully shuts down the server."""
     app.logger.info("Shutdown request received. Cleaning up...")
     
+    # No new setpoints while shutting down
+    if hasattr(app, 'udp_setpoints') and app.udp_setpoints:
+        app.udp_setpoints.stop()
+
+    if hasattr(app, 'trajectory_player') and app.trajectory_player:
+        await app.trajectory_player.stop()
+
+    # Stop control loop before resetting so it does not write after reset,
+    # nor reset faults during shutdown as it also runs the fault checks
+    if hasattr(app, 'control_loop') and app.control_loop:
+        await app.control_loop.stop()
+
     await app.clients.reset_motors()
+    # Settings are back to defaults, next start has to do a full init
+    if hasattr(app, 'drive_state') and app.drive_state:
+        app.drive_state.clear()
 
-    # Stop fault poller task if running
-    if hasattr(app, 'monitor_task') and app.monitor_task:
-        app.monitor_task.cancel()
-        await asyncio.sleep(1)  # Allow task to cancel properly
+    if hasattr(app, 'connection_supervisor') and app.connection_supervisor:
+        await app.connection_supervisor.stop()
 
     # Cleanup Modbus clients
     if hasattr(app, 'clients') and app.clients:
         app.clients.cleanup()
 
+    if hasattr(app, 'telemetry') and app.telemetry:
+        app.telemetry.close()
+
     # Cleanup modules
     if hasattr(app, 'module_manager') and app.module_manager:
         app.module_manager.cleanup_all()
@@ -42,58 +69,49 @@ def cleanup(app):
     app.module_manager.cleanup_all()
     if app.clients is not None:
         app.clients.cleanup()
+    if getattr(app, 'telemetry', None) is not None:
+        app.telemetry.close()
 
     sys.exit(1)
 
-async def monitor_fault_poller(app):
+def geometry_unverified(app):
     """
-    Heathbeat monitor that makes sure fault poller
-    stays alive and if it dies it restarts it
+    Error response for the absolute setpoint inputs while the platform geometry
+    in Config is an unverified placeholder, None once it is verified
     """
-    while True:
-        if hasattr(app, 'fault_poller_pid'):
-            pid = app.fault_poller_pid
-            if pid and not psutil.pid_exists(pid):
-                app.logger.warning(f"fault_poller (PID: {pid}) is not running, restarting...")
-                new_pid = app.module_manager.launch_module("fault_poller")
-                app.fault_poller_pid = new_pid
-                app.logger.info(f"Restarted fault_poller with PID: {new_pid}")
-                del app.module_manager.processes[pid]
-        await asyncio.sleep(10)  # Check every 10 seconds
-
-async def get_modbuscntrl_val(clients, config):
-        """
-        Gets the current revolutions of both motors and calculates with linear interpolation
-        the percentile where they are in the current max_rev - min_rev range.
-        After that we multiply it with the maxium modbuscntrl val (10k)
-        """
-        result = await clients.get_current_revs()
-        if result is False:
-            cleanup()
-
-        pfeedback_client_left, pfeedback_client_right = result
-
-        revs_left = convert_to_revs(pfeedback_client_left)
-        revs_right = convert_to_revs(pfeedback_client_right)
-
-        ## Percentile = x - pos_min / (pos_max - pos_min)
-        POS_MIN_REVS = 0.393698024
-        POS_MAX_REVS = 28.937007874015748031496062992126
-        modbus_percentile_left = (revs_left - POS_MIN_REVS) / (POS_MAX_REVS - POS_MIN_REVS)
-        modbus_percentile_right = (revs_right - POS_MIN_REVS) / (POS_MAX_REVS - POS_MIN_REVS)
-        modbus_percentile_left = max(0, min(modbus_percentile_left, 1))
-        modbus_percentile_right = max(0, min(modbus_percentile_right, 1))
-
-        position_client_left = math.floor(modbus_percentile_left * config.MODBUSCTRL_MAX)
-        position_client_right = math.floor(modbus_percentile_right * config.MODBUSCTRL_MAX)
-
-        return position_client_left, position_client_right
+    if app.app_config.GEOMETRY_VERIFIED:
+        return None
+    return jsonify({"error": "platform geometry is not verified, absolute setpoints are disabled "
+                             "(start with --geometry_verified once it is checked)"}), 403
 
+def apply_setpoint(app, pitch, roll, acc_x=0.0, acc_y=0.0):
+    """
+    Maps an absolute platform orientation to both motor targets in one computation
+    and hands them to the control loop as one pair. Returns True if it had to be clamped
+    """
+    values, clamped = app.kinematics.setpoint(pitch, roll, acc_x, acc_y)
+    app.control_loop.set_target(values)
+    app.position_state.set_commanded(app.control_loop.target)
+    return clamped
 
-def convert_to_revs(pfeedback):
-    decimal = pfeedback.registers[0] / 65535
-    num = pfeedback.registers[1]
-    return num + decimal
+async def wait_for_gateway(config, logger, timeout=15):
+    """
+    Waits until the local drive gateway accepts connections on both ports
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    for port in (config.GATEWAY_PORT_LEFT, config.GATEWAY_PORT_RIGHT):
+        while True:
+            try:
+                _, writer = await asyncio.open_connection(config.GATEWAY_HOST, port)
+                writer.close()
+                break
+            except OSError:
+                if loop.time() > deadline:
+                    logger.error(f"Drive gateway did not start listening on port {port}")
+                    return False
+                await asyncio.sleep(0.2)
+    return True
 
 async def init(app):
     try:
@@ -102,74 +120,173 @@ async def init(app):
         config = handle_launch_params()
         clients = ModbusClients(config=config, logger=logger)
 
-        # fault_poller_pid = module_manager.launch_module("fault_poller")
-        # app.monitor_task = asyncio.create_task(monitor_fault_poller(app))
-
-        # Connect to both drivers
-        connected = await clients.connect() 
-
-        if not connected:  
-            sys.exit(1)
+        # Fault poller as its own process, by default faults are monitored in-process
+        if config.FAULT_MONITOR == "process":
+            poller_args = drive_launch_args(config) + ["--polling_time_interval", str(config.POLLING_TIME_INTERVAL)]
+            module_manager.start_supervised("fault_poller", poller_args,
+                                            heartbeat_timeout=config.HEARTBEAT_TIMEOUT, standby=config.MODULE_STANDBY)
 
         app.app_config = config
         app.logger = logger
         
         app.module_manager = module_manager
         app.is_process_done = True
-        # app.fault_poller_pid = fault_poller_pid
         app.clients = clients
+        app.control_loop = ControlLoop(clients=clients, config=config, logger=logger)
+        app.position_state = PositionState(config=config, logger=logger)
+        app.kinematics = PlatformKinematics(config)
+        app.setpoint_stream = StreamStats()
+        app.trajectory_player = TrajectoryPlayer(app.control_loop, app.position_state, clients, config, logger)
+        app.udp_setpoints = UdpSetpointListener(config, logger, lambda setpoint: apply_setpoint(
+            app, setpoint.pitch, setpoint.roll, setpoint.acc_x, setpoint.acc_y))
+        app.connection_supervisor = ConnectionSupervisor(clients=clients, config=config, logger=logger)
+        # The block is written by the in-server fault monitor, with process or off it would never change
+        publishes_telemetry = config.TELEMETRY_SHM and config.FAULT_MONITOR == "task"
+        app.telemetry = TelemetryWriter(config.TELEMETRY_SHM_NAME, logger) if publishes_telemetry else None
+        app.fault_monitor = FaultMonitor(clients=clients, config=config, logger=logger,
+                                         position_state=app.position_state, telemetry=app.telemetry,
+                                         control_loop=app.control_loop)
+        app.drive_state = DriveStateStore(config, logger)
+        app.warm_restart = {"snapshot": False, "parameters_skipped": False, "homing_skipped": False}
 
         atexit.register(lambda: cleanup(app))
-        
-        await clients.set_host_command_mode(0)
-        ### TODO - posita myöhemmin kun fault pollerin toimimaan
-        await clients.set_ieg_mode(65535)
-        homed = await clients.home()
-        if homed: 
-            ## Prepare motor parameters for operation
-            ### If any of them are unsuccesful -> cleanup and shutdown
-
-            ### MAX POSITION LIMITS FOR BOTH MOTORS | 147 mm
-            if not await clients.set_analog_pos_max(61406, 28):
-                cleanup()
-
-            ### MIN POSITION LIMITS FOR BOTH MOTORS || 2 mm
-            if not await clients.set_analog_pos_min(25801, 0):
-                cleanup()
-
-            ### Velocity whole number is in 8.8 where decimal is in little endian format,
-            ### meaning smaller bits come first, so 1 rev would be 2^8
-            (velocity_whole, velocity_decimal) = convert_vel_rpm_revs(config.VEL)
-            if not await clients.set_analog_vel_max(velocity_decimal, velocity_whole):
-                cleanup()
-
-            ### UACC32 whole number split in 12.4 format
-            (acc_whole, acc_decimal) =convert_acc_rpm_revs(config.ACC)
-            if not await clients.set_analog_acc_max(acc_decimal, acc_whole):
-                cleanup()
-
-            ## Analog input channel set to use modbusctrl (2)
-            if not await clients.set_analog_input_channel(2):
-                cleanup()
-
-            (position_client_left, position_client_right) = await get_modbuscntrl_val(clients, config)
-
-            # modbus cntrl 0-10k
-            if not await clients.set_analog_modbus_cntrl((position_client_left, position_client_right)):
-                cleanup()
-
-            # TODO Ipeak pitää varmistaa vielä onhan 128 arvo = 1 Ampeeri 
-            # await clients.client_right.write_register(address=config.IPEAK,value=640,slave=config.SLAVE_ID)
-            # await clients.client_left.write_register(address=config.IPEAK,value=640,slave=config.SLAVE_ID)
-
-            # # Finally - Ready for operation
-            if not await clients.set_host_command_mode(config.ANALOG_POSITION_MODE):
-                cleanup()
-
-            # Enable motors
-            if not await clients.set_ieg_mode(2):
-                cleanup()
-        
+
+        # Startup as a dependency graph, independent steps run concurrently:
+        #
+        #   gateway -> connect -> host_mode_off -> fault_reset -> home -> read_position ---------\
+        #                                                               \-> analog_parameters ---+-> modbus_cntrl
+        #   modbus_cntrl -> command_mode -> enable -> start_control
+        #   connect -> warm_check -> home and analog_parameters, which it can let skip their writes,
+        #   only with WARM_RESTART
+        #   kinematics table on its own
+        pipeline = InitPipeline(logger)
+        app.init_pipeline = pipeline
+        positions = {}
+
+        async def start_gateway():
+            # Gateway owns the drive connections, server and fault poller share them through it
+            gateway_args = drive_launch_args(config)
+            gateway_args.remove("--gateway")
+            module_manager.start_supervised("gateway", gateway_args, heartbeat_timeout=config.HEARTBEAT_TIMEOUT,
+                                            standby=config.MODULE_STANDBY)
+            return await wait_for_gateway(config, logger)
+
+        async def connect():
+            # Connect to both drivers
+            if not await clients.connect():
+                return False
+            app.connection_supervisor.start()
+            return True
+
+        ### Velocity whole number is in 8.8 where decimal is in little endian format,
+        ### meaning smaller bits come first, so 1 rev would be 2^8
+        (velocity_whole, velocity_decimal) = convert_vel_rpm_revs(config.VEL)
+        ### UACC32 whole number split in 12.4 format
+        (acc_whole, acc_decimal) = convert_acc_rpm_revs(config.ACC)
+        ## Analog input channel set to use modbusctrl (2)
+        ### MIN POSITION LIMITS 2 mm | MAX POSITION LIMITS 147 mm
+        analog_parameters = dict(
+            input_channel=2,
+            pos_min=[25801, 0],
+            pos_max=[61406, 28],
+            vel_max=[velocity_decimal, velocity_whole],
+            acc_max=[acc_decimal, acc_whole],
+        )
+        analog_values = [value for values in clients.analog_parameter_registers(**analog_parameters).values()
+                         for value in values]
+
+        async def check_warm_restart():
+            # Never fails init, anything not verified is just done the cold way
+            snapshot = app.drive_state.load()
+            app.warm_restart["snapshot"] = snapshot is not None
+            if snapshot is None:
+                return True
+            (left_values, right_values), (left_status, right_status) = await asyncio.gather(
+                clients.read_registers_both(config.ANALOG_INPUT_CHANNEL, len(analog_values), "read analog parameters"),
+                clients.read_snapshot(("status",)),
+            )
+            # Trust the drives only if they still hold what this server applied before,
+            # a settings reset or power cycle in between means writing and homing again
+            parameters_kept = (left_values == snapshot["analog_parameters"]
+                               and right_values == snapshot["analog_parameters"])
+            app.warm_restart["parameters_skipped"] = parameters_kept and left_values == analog_values
+            app.warm_restart["homing_skipped"] = (
+                parameters_kept and snapshot["homed"]
+                and left_status is not None and right_status is not None
+                and bool(left_status.is_homed()) and bool(right_status.is_homed())
+            )
+            return True
+
+        async def set_analog_parameters():
+            if app.warm_restart["parameters_skipped"]:
+                logger.info("Analog parameters already set on both motors, skipping")
+                return True
+            return await clients.set_analog_parameters(**analog_parameters)
+
+        async def home():
+            if app.warm_restart["homing_skipped"]:
+                logger.info("Motors still homed since the last run, skipping homing")
+                return True
+            return await clients.home()
+
+        async def prepare_kinematics():
+            # CPU work in a thread so it overlaps with the drive round-trips,
+            # without the table setpoints are computed with the exact model
+            if config.KINEMATICS_LUT:
+                await asyncio.to_thread(prepare_table, app.kinematics, config, logger)
+            return True
+
+        async def read_position():
+            positions["start"] = await app.position_state.sample_feedback(clients)
+            return positions["start"] is not None
+
+        async def start_control():
+            # Start writing setpoints at the configured rate
+            app.control_loop.set_target(positions["start"])
+            app.position_state.set_commanded(app.control_loop.target)
+            if config.FAULT_MONITOR == "task":
+                # Checked by the control loop right after its writes
+                app.control_loop.monitor = app.fault_monitor
+            app.control_loop.start()
+            if config.UDP_SETPOINTS and config.GEOMETRY_VERIFIED:
+                await app.udp_setpoints.start()
+            elif config.UDP_SETPOINTS:
+                logger.warning("Not listening for UDP setpoints, the platform geometry is not verified (--geometry_verified)")
+            app.drive_state.save(analog_values, homed=True)
+            return True
+
+        if config.USE_GATEWAY:
+            pipeline.add("gateway", start_gateway)
+        pipeline.add("kinematics", prepare_kinematics)
+        pipeline.add("connect", connect, ["gateway"] if config.USE_GATEWAY else [])
+        pipeline.add("host_mode_off", lambda: clients.set_host_command_mode(0), ["connect"])
+        warm_check = []
+        if config.WARM_RESTART:
+            pipeline.add("warm_check", check_warm_restart, ["connect"])
+            warm_check = ["warm_check"]
+        pipeline.add("fault_reset", lambda: clients.set_ieg_mode(65535), ["host_mode_off"])
+        pipeline.add("home", home, ["fault_reset"] + warm_check)
+        # As before the graph, the analog limits are only written once the drive is homed
+        pipeline.add("analog_parameters", set_analog_parameters, ["home"])
+        pipeline.add("read_position", read_position, ["home"])
+        # modbus cntrl 0-10k
+        pipeline.add("modbus_cntrl", lambda: clients.set_analog_modbus_cntrl(positions["start"]),
+                     ["read_position", "analog_parameters"])
+        # TODO Ipeak pitää varmistaa vielä onhan 128 arvo = 1 Ampeeri 
+        # await clients.client_right.write_register(address=config.IPEAK,value=640,slave=config.SLAVE_ID)
+        # await clients.client_left.write_register(address=config.IPEAK,value=640,slave=config.SLAVE_ID)
+
+        # # Finally - Ready for operation
+        pipeline.add("command_mode", lambda: clients.set_host_command_mode(config.ANALOG_POSITION_MODE),
+                     ["modbus_cntrl"])
+        # Enable motors
+        pipeline.add("enable", lambda: clients.set_ieg_mode(2), ["command_mode"])
+        pipeline.add("start_control", start_control, ["enable"])
+
+        ### If any of them are unsuccesful -> cleanup and shutdown
+        if not await pipeline.run():
+            logger.error(f"Initialization failed at: {', '.join(pipeline.failed())}")
+            cleanup(app)
 
     except Exception as e:
         logger.error(f"Initialization failed: {e}")
@@ -187,14 +304,13 @@ async def create_app():
         MODBUSCTRL_MAX = app.app_config.MODBUSCTRL_MAX
 
         if (asd == "q"):
-            a = 10
-            await app.clients.client_right.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=MODBUSCTRL_MAX, slave=app.app_config.SLAVE_ID)
-            await app.clients.client_left.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=MODBUSCTRL_MAX, slave=app.app_config.SLAVE_ID)
+            app.control_loop.set_target((MODBUSCTRL_MAX, MODBUSCTRL_MAX))
+            app.position_state.set_commanded(app.control_loop.target)
 
 
 
         if (pitch == "+"): # forward
-            (position_client_left, position_client_right) = await get_modbuscntrl_val(app.clients, app.app_config)
+            (position_client_left, position_client_right) = await app.position_state.get_position(app.clients)
 
             position_client_left = math.floor(position_client_left + (MODBUSCTRL_MAX * 0.15)) 
             position_client_right = math.floor(position_client_right + (MODBUSCTRL_MAX* 0.15)) 
@@ -202,11 +318,11 @@ async def create_app():
             position_client_right = min(MODBUSCTRL_MAX, position_client_right)
             position_client_left = min(MODBUSCTRL_MAX, position_client_left)
 
-            await app.clients.client_right.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_right, slave=app.app_config.SLAVE_ID)
-            await app.clients.client_left.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_left, slave=app.app_config.SLAVE_ID)
+            app.control_loop.set_target((position_client_left, position_client_right))
+            app.position_state.set_commanded(app.control_loop.target)
 
         elif (pitch == "-"): #backward
-            (position_client_left, position_client_right) = await get_modbuscntrl_val(app.clients, app.app_config)
+            (position_client_left, position_client_right) = await app.position_state.get_position(app.clients)
 
             position_client_left = math.floor(position_client_left - (MODBUSCTRL_MAX* 0.15)) 
             position_client_right = math.floor(position_client_right - (MODBUSCTRL_MAX* 0.15)) 
@@ -214,31 +330,151 @@ async def create_app():
             position_client_right = max(0, position_client_right)
             position_client_left = max(0, position_client_left)
 
-            await app.clients.client_right.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_right, slave=app.app_config.SLAVE_ID)
-            await app.clients.client_left.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_left, slave=app.app_config.SLAVE_ID)
+            app.control_loop.set_target((position_client_left, position_client_right))
+            app.position_state.set_commanded(app.control_loop.target)
         elif (roll == "-"):# left
-            (position_client_left, position_client_right) = await get_modbuscntrl_val(app.clients, app.app_config)
+            (position_client_left, position_client_right) = await app.position_state.get_position(app.clients)
             position_client_left = math.floor(position_client_left - (MODBUSCTRL_MAX* 0.08)) 
             position_client_right = math.floor(position_client_right + (MODBUSCTRL_MAX* 0.08)) 
 
             position_client_right = min(MODBUSCTRL_MAX, position_client_right)
             position_client_left = max(0, position_client_left)
 
-            await app.clients.client_right.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_right, slave=app.app_config.SLAVE_ID)
-            await app.clients.client_left.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_left, slave=app.app_config.SLAVE_ID)
+            app.control_loop.set_target((position_client_left, position_client_right))
+            app.position_state.set_commanded(app.control_loop.target)
         elif (roll == "+"):
-            (position_client_left, position_client_right) = await get_modbuscntrl_val(app.clients, app.app_config)
+            (position_client_left, position_client_right) = await app.position_state.get_position(app.clients)
             position_client_left = math.floor(position_client_left + (MODBUSCTRL_MAX* 0.10)) 
             position_client_right = math.floor(position_client_right - (MODBUSCTRL_MAX* 0.10)) 
 
             position_client_left = min(MODBUSCTRL_MAX, position_client_left)
             position_client_right = max(0, position_client_right)
 
-            await app.clients.client_right.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_right, slave=app.app_config.SLAVE_ID)
-            await app.clients.client_left.write_register(address=app.app_config.ANALOG_MODBUS_CNTRL, value=position_client_left, slave=app.app_config.SLAVE_ID)
-        else:
+            app.control_loop.set_target((position_client_left, position_client_right))
+            app.position_state.set_commanded(app.control_loop.target)
+        elif asd != "q":
             app.logger.error("Wrong parameter use direction (l | r)")
+            return jsonify({"error": "use pitch=+|- or roll=+|-"}), 400
+
+        return jsonify({"target": app.control_loop.target})
     
+    @app.route("/setpoint", methods=['get'])
+    async def setpoint():
+        """
+        Absolute platform orientation: pitch and roll in degrees, optionally acc_x and acc_y
+        acceleration cues in m/s^2. Missing values are 0. Both motor targets come from
+        one computation and are handed to the control loop as one pair, no position read
+        """
+        error = geometry_unverified(app)
+        if error:
+            return error
+        try:
+            pitch, roll, acc_x, acc_y = (float(request.args.get(name, 0.0)) for name in ("pitch", "roll", "acc_x", "acc_y"))
+        except ValueError:
+            return jsonify({"error": "pitch, roll, acc_x and acc_y have to be numbers"}), 400
+        if not all(math.isfinite(value) for value in (pitch, roll, acc_x, acc_y)):
+            return jsonify({"error": "pitch, roll, acc_x and acc_y have to be finite"}), 400
+
+        clamped = apply_setpoint(app, pitch, roll, acc_x, acc_y)
+        return jsonify({"target": app.control_loop.target, "clamped": clamped})
+
+    @app.websocket("/ws/setpoints")
+    async def ws_setpoints():
+        """
+        Setpoint stream over one WebSocket, messages as in setpoint_stream.py.
+        ?ack=1 answers every setpoint with the resulting target, ?telemetry=<Hz>
+        sends the targets and the latest position feedback at that rate
+        """
+        send_acks = websocket.args.get("ack") == "1"
+        try:
+            telemetry_hz = float(websocket.args.get("telemetry", 0))
+        except ValueError:
+            telemetry_hz = 0
+        # Refused before the handshake is accepted
+        error = geometry_unverified(app)
+        if error:
+            return error
+
+        async def send_telemetry():
+            while True:
+                await websocket.send(json.dumps({
+                    "target": app.control_loop.target,
+                    "written": app.control_loop.written,
+                    "feedback": app.position_state.feedback,
+                }))
+                await asyncio.sleep(1 / telemetry_hz)
+
+        stream = app.setpoint_stream
+        stream.connections += 1
+        stream.active += 1
+        telemetry_task = asyncio.create_task(send_telemetry()) if telemetry_hz > 0 else None
+        try:
+            while True:
+                message = await websocket.receive()
+                received = time.perf_counter_ns()
+                try:
+                    setpoint = decode_setpoint(message)
+                except ValueError as e:
+                    stream.rejected += 1
+                    if send_acks:
+                        await websocket.send(json.dumps({"error": str(e)}))
+                    continue
+
+                clamped = apply_setpoint(app, setpoint.pitch, setpoint.roll, setpoint.acc_x, setpoint.acc_y)
+                stream.record(received)
+                if send_acks:
+                    await websocket.send(encode_ack(setpoint, app.control_loop.target, clamped,
+                                                    binary=isinstance(message, bytes)))
+        finally:
+            stream.active -= 1
+            if telemetry_task is not None:
+                await cancel_and_wait(telemetry_task)
+
+    @app.route("/trajectory", methods=['post'])
+    async def upload_trajectory():
+        """
+        Takes a trajectory (trajectory.py) as the request body, validates it and
+        loads it for playback, replacing the previous one. ?play=1 starts playing right away
+        """
+        error = geometry_unverified(app)
+        if error:
+            return error
+        data = await request.get_data()
+        try:
+            samples = parse_trajectory(data, app.app_config.TRAJECTORY_MAX_SAMPLES)
+        except ValueError as e:
+            return jsonify({"errors": [{"error": str(e)}]}), 400
+
+        trajectory, errors = validate_trajectory(samples, app.kinematics, app.app_config)
+        if errors:
+            return jsonify({"errors": errors}), 400
+
+        await app.trajectory_player.load(trajectory)
+        if request.args.get("play") == "1":
+            app.trajectory_player.start()
+        return jsonify(trajectory.summary())
+
+    @app.route("/trajectory", methods=['get'])
+    async def trajectory_report():
+        """
+        Playback state, actual vs planned timing and tracking error of the last playback
+        """
+        return jsonify(app.trajectory_player.stats())
+
+    @app.route("/trajectory/play", methods=['get'])
+    async def play_trajectory():
+        error = geometry_unverified(app)
+        if error:
+            return error
+        if not app.trajectory_player.start():
+            return jsonify({"error": "no trajectory loaded"}), 409
+        return jsonify(app.trajectory_player.stats())
+
+    @app.route("/trajectory/stop", methods=['get'])
+    async def stop_trajectory():
+        await app.trajectory_player.stop()
+        return jsonify(app.trajectory_player.stats())
+
     @app.route('/shutdown', methods=['get'])
     async def shutdown():
         """Shuts down the server when called."""
@@ -248,12 +484,39 @@ async def create_app():
     @app.route('/stop', methods=['get'])
     async def stop_motors():
         try:
+            await app.trajectory_player.stop()
             success = await app.clients.stop()
+            # Motors stop wherever they are, next relative move has to start from feedback
+            # and the same target has to be sent again to move back
+            app.position_state.invalidate()
+            app.control_loop.invalidate()
             if not success:
                 pass # do something crazy :O
         except Exception as e:
             app.logger.error("Failed to stop motors?") # Mitäs sitten :D
 
+    @app.route('/stats', methods=['get'])
+    async def stats():
+        """
+        Modbus latency histograms per drive and register, retry counters
+        setpoint dispatch counters of the control loop, fault monitor counters,
+        restarts of supervised modules, startup phase timings, setpoint stream and UDP counters,
+        trajectory playback and the kinematics table
+        """
+        return jsonify({
+            "latency": app.clients.latency.summary(),
+            "control_loop": app.control_loop.stats(),
+            "connections": app.connection_supervisor.state,
+            "breakers": {side: breaker.state for side, breaker in app.clients.breakers.items()},
+            "faults": app.fault_monitor.stats(),
+            "modules": app.module_manager.stats(),
+            "init": {**app.init_pipeline.summary(), "warm_restart": app.warm_restart},
+            "setpoint_stream": app.setpoint_stream.summary(),
+            "udp_setpoints": app.udp_setpoints.stats(),
+            "trajectory": app.trajectory_player.stats(),
+            "kinematics_table": app.kinematics.table.stats() if app.kinematics.table is not None else None,
+        })
+
     @app.route('/asd')
     async def asd():
         print("terve")
@@ -0,0 +1,156 @@
+import asyncio
+import struct
+from typing import Dict, List, Optional
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+MBAP_HEADER = struct.Struct(">HHHB")
+READ_HOLDING_REGISTERS = 0x03
+WRITE_SINGLE_REGISTER = 0x06
+WRITE_MULTIPLE_REGISTERS = 0x10
+
+class PipelinedResponse:
+    """
+    Minimal response object with the same interface ModbusClients uses
+    from pymodbus responses (isError and registers)
+    """
+    def __init__(self, function_code, registers=None, exception_code=None):
+        self.function_code = function_code
+        self.registers = registers if registers is not None else []
+        self.exception_code = exception_code
+
+    def isError(self):
+        return self.exception_code is not None
+
+    def __repr__(self):
+        if self.isError():
+            return f"PipelinedResponse(fc={self.function_code}, exception={self.exception_code})"
+        return f"PipelinedResponse(fc={self.function_code}, registers={self.registers})"
+
+class PipelinedModbusClient:
+    """
+    Modbus TCP client that keeps several transactions outstanding on one connection.
+    Transaction IDs are allocated from config.START_TID + 1 - config.LAST_TID and replies
+    are matched by TID, so telemetry reads and setpoint writes can overlap on one socket.
+    Drop-in for the AsyncModbusTcpClient calls ModbusClients makes.
+    """
+    def __init__(self, host, port, config, logger, timeout=1.0):
+        self.host = host
+        self.port = port
+        self.config = config
+        self.logger = logger
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.reader_task: Optional[asyncio.Task] = None
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.window = asyncio.Semaphore(max(1, config.PIPELINE_DEPTH))
+        self.next_tid = config.START_TID
+        self.timeouts = 0
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self) -> bool:
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout=self.timeout
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.logger.debug(f"Pipelined connection to {self.host}:{self.port} failed: {e}")
+            return False
+
+        self.reader_task = asyncio.create_task(self._read_replies())
+        return True
+
+    def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            self.reader_task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self._fail_pending(ConnectionException(f"Connection to {self.host} closed"))
+
+    def _allocate_tid(self) -> int:
+        """
+        Next free TID inside the configured range, wraps around to START_TID + 1
+        """
+        range_size = self.config.LAST_TID - self.config.START_TID
+        for _ in range(range_size):
+            self.next_tid += 1
+            if self.next_tid > self.config.LAST_TID:
+                self.next_tid = self.config.START_TID + 1
+            if self.next_tid not in self.pending:
+                return self.next_tid
+        raise ModbusIOException("No free transaction IDs")
+
+    def _fail_pending(self, exception):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(exception)
+        self.pending.clear()
+
+    async def _read_replies(self):
+        try:
+            while True:
+                header = await self.reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, _ = MBAP_HEADER.unpack(header)
+                pdu = await self.reader.readexactly(length - 1)
+                future = self.pending.pop(tid, None)
+                # Reply to a transaction that already timed out is dropped
+                if future is not None and not future.done():
+                    future.set_result(pdu)
+        except asyncio.CancelledError:
+            raise
+        except (asyncio.IncompleteReadError, OSError) as e:
+            self.logger.error(f"Pipelined connection to {self.host} lost: {e}")
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            self._fail_pending(ConnectionException(f"Connection to {self.host} lost"))
+
+    async def execute(self, pdu: bytes, slave: int) -> bytes:
+        """
+        Sends one request PDU and returns the reply PDU of the same transaction
+        """
+        if not self.connected:
+            raise ConnectionException(f"Not connected to {self.host}")
+
+        async with self.window:
+            tid = self._allocate_tid()
+            future = asyncio.get_running_loop().create_future()
+            self.pending[tid] = future
+            self.writer.write(MBAP_HEADER.pack(tid, 0, len(pdu) + 1, slave) + pdu)
+            try:
+                return await asyncio.wait_for(future, timeout=self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise ModbusIOException(f"No response to transaction {tid} from {self.host}")
+            finally:
+                self.pending.pop(tid, None)
+
+    @staticmethod
+    def _decode(pdu: bytes) -> PipelinedResponse:
+        function_code = pdu[0]
+        if function_code & 0x80:
+            return PipelinedResponse(function_code & 0x7F, exception_code=pdu[1])
+        if function_code == READ_HOLDING_REGISTERS:
+            byte_count = pdu[1]
+            return PipelinedResponse(function_code, list(struct.unpack(f">{byte_count // 2}H", pdu[2:2 + byte_count])))
+        # Write replies echo address and value / count
+        _, value = struct.unpack(">HH", pdu[1:5])
+        return PipelinedResponse(function_code, [value])
+
+    async def read_holding_registers(self, address: int, count: int = 1, slave: int = 1) -> PipelinedResponse:
+        pdu = struct.pack(">BHH", READ_HOLDING_REGISTERS, address, count)
+        return self._decode(await self.execute(pdu, slave))
+
+    async def write_register(self, address: int, value: int, slave: int = 1) -> PipelinedResponse:
+        pdu = struct.pack(">BHH", WRITE_SINGLE_REGISTER, address, value)
+        return self._decode(await self.execute(pdu, slave))
+
+    async def write_registers(self, address: int, values: List[int], slave: int = 1) -> PipelinedResponse:
+        pdu = struct.pack(f">BHHB{len(values)}H", WRITE_MULTIPLE_REGISTERS, address, len(values),
+                          len(values) * 2, *values)
+        return self._decode(await self.execute(pdu, slave))
@@ -0,0 +1,64 @@
+import time
+from typing import Optional, Tuple
+from utils import convert_to_revs, revs_to_modbuscntrl
+
+class PositionState:
+    """
+    Cached position model of both motors in ModbusCtrl units (0 - MODBUSCTRL_MAX).
+    Holds the last commanded value and the last sampled PFEEDBACK position per motor
+    so relative pitch/roll moves can be calculated without a read before every command.
+    """
+    def __init__(self, config, logger):
+        self.config = config
+        self.logger = logger
+        self.max_age = config.POSITION_MAX_AGE
+        self.commanded: Optional[Tuple[int, int]] = None
+        self.feedback: Optional[Tuple[int, int]] = None
+        self.feedback_time = 0.0
+
+    def set_commanded(self, values: Tuple[int, int]):
+        self.commanded = values
+
+    def update_feedback(self, values: Tuple[int, int]):
+        self.feedback = values
+        self.feedback_time = time.monotonic()
+
+    def invalidate(self):
+        """
+        Forgets the commanded position, eg. after a stop or fault
+        when the motors are not where they were commanded to go
+        """
+        self.commanded = None
+
+    def is_feedback_fresh(self) -> bool:
+        return self.feedback is not None and time.monotonic() - self.feedback_time <= self.max_age
+
+    async def sample_feedback(self, clients) -> Optional[Tuple[int, int]]:
+        """
+        Reads PFEEDBACK_POSITION from both motors and stores it.
+        Returns (left, right) ModbusCtrl values or None if the read fails
+        """
+        result = await clients.get_current_revs()
+        if result is False:
+            self.logger.error("Failed to sample position feedback")
+            return None
+
+        response_left, response_right = result
+        values = (revs_to_modbuscntrl(convert_to_revs(response_left), self.config),
+                  revs_to_modbuscntrl(convert_to_revs(response_right), self.config))
+        self.update_feedback(values)
+        return values
+
+    async def get_position(self, clients) -> Optional[Tuple[int, int]]:
+        """
+        Returns the position relative moves are based on: the last commanded value,
+        or fresh feedback if nothing has been commanded. Reads the motors only when
+        neither is available.
+        """
+        if self.commanded is not None:
+            return self.commanded
+
+        if self.is_feedback_fresh():
+            return self.feedback
+
+        return await self.sample_feedback(clients)
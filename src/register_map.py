@@ -0,0 +1,99 @@
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils import is_nth_bit_on
+
+# Modbus spec limit for one read_holding_registers request
+MAX_READ_COUNT = 125
+
+@dataclass(frozen=True)
+class Register:
+    name: str
+    address: int
+    count: int = 1
+
+@dataclass(frozen=True)
+class Span:
+    """
+    One contiguous read_holding_registers request covering one or more registers
+    """
+    address: int
+    count: int
+    registers: Tuple[Register, ...]
+
+@dataclass
+class DriveSnapshot:
+    """
+    Decoded telemetry of one drive, fields that were not read are None
+    """
+    status: Optional[int] = None
+    velocity: Optional[int] = None
+    position: Optional[List[int]] = None # [decimal, whole] like PFEEDBACK_POSITION
+    fault: Optional[int] = None
+    raw: Dict[str, List[int]] = field(default_factory=dict)
+
+    def isError(self):
+        # Lets a snapshot go through the dual-drive engine like a pymodbus response
+        return False
+
+    def is_faulted(self) -> Optional[bool]:
+        if self.status is None:
+            return None
+        return is_nth_bit_on(3, self.status)
+
+    def is_homed(self) -> Optional[bool]:
+        if self.status is None:
+            return None
+        return is_nth_bit_on(1, self.status)
+
+def build_register_map(config) -> Dict[str, Register]:
+    """
+    Telemetry registers of a Tritex drive, addresses come from the config
+    """
+    registers = [
+        Register("status", config.OEG_STATUS, 1),
+        Register("velocity", config.VFEEDBACK_VELOCITY, 1),
+        Register("position", config.PFEEDBACK_POSITION, 2),
+        Register("fault", config.RECENT_FAULT_ADDRESS, 1),
+    ]
+    return {register.name: register for register in registers}
+
+def plan_spans(registers: Iterable[Register], max_gap: int = 0, max_count: int = MAX_READ_COUNT) -> List[Span]:
+    """
+    Merges registers into the fewest contiguous read spans.
+    Registers are merged when the unused gap between them is at most max_gap
+    and the merged span stays within max_count registers.
+    """
+    spans = []
+    current = []
+    start = end = 0
+
+    for register in sorted(registers, key=lambda r: r.address):
+        register_end = register.address + register.count
+        if current and register.address - end <= max_gap and max(end, register_end) - start <= max_count:
+            current.append(register)
+            end = max(end, register_end)
+            continue
+
+        if current:
+            spans.append(Span(start, end - start, tuple(current)))
+        current = [register]
+        start, end = register.address, register_end
+
+    if current:
+        spans.append(Span(start, end - start, tuple(current)))
+
+    return spans
+
+def decode_spans(spans: List[Span], span_values: List[List[int]]) -> DriveSnapshot:
+    """
+    Builds a DriveSnapshot from the register values read for each span
+    """
+    snapshot = DriveSnapshot()
+    for span, values in zip(spans, span_values):
+        for register in span.registers:
+            offset = register.address - span.address
+            raw = list(values[offset:offset + register.count])
+            snapshot.raw[register.name] = raw
+            if hasattr(snapshot, register.name):
+                setattr(snapshot, register.name, raw[0] if register.count == 1 else raw)
+    return snapshot
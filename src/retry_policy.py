@@ -0,0 +1,88 @@
+import random
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class RetryPolicy:
+    """
+    How a single Modbus operation on one motor is retried:
+    at most max_attempts attempts, all of them within deadline seconds,
+    with exponential backoff and jitter between attempts.
+    With wait_for_connection a lost connection is reconnected within the deadline
+    instead of failing the operation right away.
+    """
+    max_attempts: int = 3
+    deadline: float = 1.0
+    base_delay: float = 0.05
+    max_delay: float = 0.5
+    jitter: float = 0.5 # fraction of the delay that is randomized
+    wait_for_connection: bool = False
+
+    @classmethod
+    def from_config(cls, config, max_attempts=None, deadline=None, wait_for_connection=False):
+        return cls(
+            max_attempts=max_attempts or config.RETRY_MAX_ATTEMPTS,
+            deadline=deadline or config.RETRY_DEADLINE,
+            base_delay=config.RETRY_BASE_DELAY,
+            max_delay=config.RETRY_MAX_DELAY,
+            wait_for_connection=wait_for_connection,
+        )
+
+    def delay(self, attempt: int) -> float:
+        """
+        Backoff after the given failed attempt (1 based)
+        """
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay * random.uniform(1 - self.jitter, 1)
+
+class CircuitBreaker:
+    """
+    Per motor circuit breaker. After failure_threshold failed attempts in a row
+    the breaker opens and requests to that motor fail immediately. After
+    reset_timeout seconds one request is let through (half open), its result
+    closes or reopens the breaker. Other requests keep failing while it is
+    outstanding, a probe that never reports back is replaced after reset_timeout.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=2.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == self.CLOSED:
+            return True
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            if now - self.opened_at < self.reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+        elif self.probe_started is not None and now - self.probe_started < self.reset_timeout:
+            return False
+        self.probe_started = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.state = self.CLOSED
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self.probe_started = None
+
+    def is_open(self) -> bool:
+        return self.state == self.OPEN and time.monotonic() - self.opened_at < self.reset_timeout
@@ -0,0 +1,86 @@
+"""
+Setpoint messages of the streaming inputs, the /ws/setpoints WebSocket
+and UDP datagrams (udp_setpoints.py, binary messages only).
+
+Binary message, little endian:
+    sequence I | sender timestamp d | pitch f | roll f | acc_x f | acc_y f
+Text message, JSON with the same names, only pitch and roll are required:
+    {"seq": 1, "pitch": 1.5, "roll": -2.0}
+Angles are in degrees, accelerations in m/s^2 (see kinematics.py).
+
+Acks are sent in the format of the message, binary:
+    sequence I | left ModbusCtrl H | right ModbusCtrl H | clamped B
+"""
+import json
+import math
+import struct
+import time
+from dataclasses import dataclass
+from latency_stats import LatencyHistogram
+
+SETPOINT = struct.Struct("<Id4f")
+ACK = struct.Struct("<IHHB")
+
+@dataclass
+class Setpoint:
+    sequence: int
+    timestamp: float
+    pitch: float
+    roll: float
+    acc_x: float = 0.0
+    acc_y: float = 0.0
+
+def encode_setpoint(setpoint: Setpoint) -> bytes:
+    return SETPOINT.pack(setpoint.sequence, setpoint.timestamp, setpoint.pitch, setpoint.roll,
+                         setpoint.acc_x, setpoint.acc_y)
+
+def decode_setpoint(message) -> Setpoint:
+    """
+    Binary or JSON text message to a Setpoint, raises ValueError if it is malformed
+    """
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        if len(message) != SETPOINT.size:
+            raise ValueError(f"setpoint message has to be {SETPOINT.size} bytes, got {len(message)}")
+        setpoint = Setpoint(*SETPOINT.unpack(message))
+    else:
+        try:
+            fields = json.loads(message)
+            setpoint = Setpoint(int(fields.get("seq", 0)), float(fields.get("time", 0.0)),
+                                float(fields["pitch"]), float(fields["roll"]),
+                                float(fields.get("acc_x", 0.0)), float(fields.get("acc_y", 0.0)))
+        except (TypeError, KeyError, AttributeError) as e:
+            raise ValueError(f"setpoint message needs numeric pitch and roll: {e}")
+
+    if not all(math.isfinite(value) for value in (setpoint.pitch, setpoint.roll, setpoint.acc_x, setpoint.acc_y)):
+        raise ValueError("setpoint values have to be finite")
+    return setpoint
+
+def encode_ack(setpoint: Setpoint, target, clamped: bool, binary: bool):
+    if binary:
+        return ACK.pack(setpoint.sequence & 0xFFFFFFFF, target[0], target[1], clamped)
+    return json.dumps({"seq": setpoint.sequence, "target": target, "clamped": clamped})
+
+class StreamStats:
+    """
+    Counters of one streaming input. handling is the time from receiving
+    a message to its target being handed to the control loop
+    """
+    def __init__(self):
+        self.connections = 0
+        self.active = 0
+        self.messages = 0
+        self.rejected = 0
+        self.handling = LatencyHistogram()
+
+    def record(self, received_ns: int):
+        self.messages += 1
+        self.handling.record(time.perf_counter_ns() - received_ns)
+
+    def summary(self):
+        return {
+            "connections": self.connections,
+            "active": self.active,
+            "messages": self.messages,
+            "rejected": self.rejected,
+            "handling": self.handling.summary(),
+        }
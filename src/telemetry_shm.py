@@ -0,0 +1,180 @@
+"""
+Latest drive telemetry in a fixed layout shared memory block.
+
+The server publishes every telemetry snapshot here, so local helper processes
+(loggers, monitors, the GUI) can follow the drives without their own Modbus
+connections. There is one writer. Readers use a seqlock: the writer makes the
+sequence number odd before it changes the block and even again after. A reader
+retries if it saw an odd sequence number, or if the number changed during its read.
+
+Layout, little endian:
+    header  magic 4s | layout version H | record size H | sequence Q
+    left    DRIVE_RECORD
+    right   DRIVE_RECORD
+
+    python telemetry_shm.py [--interval 0.5]   # print the telemetry of a running server
+"""
+import argparse
+import os
+import struct
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, Optional
+
+MAGIC = b"LATM"
+LAYOUT_VERSION = 1
+HEADER = struct.Struct("<4sHHQ")
+SEQUENCE = struct.Struct("<Q")
+SEQUENCE_OFFSET = HEADER.size - SEQUENCE.size
+# sample time (wall clock) | status | velocity | position decimal | position whole |
+# position ModbusCtrl | fault | faulted | valid
+DRIVE_RECORD = struct.Struct("<dHHHHHHBB")
+SIDES = ("left", "right")
+BLOCK_SIZE = HEADER.size + DRIVE_RECORD.size * len(SIDES)
+
+@dataclass
+class DriveTelemetry:
+    timestamp: float
+    status: int
+    velocity: int
+    position: list # [decimal, whole] like PFEEDBACK_POSITION
+    modbuscntrl: int
+    fault: int
+    faulted: bool
+    valid: bool # False until the first successful read of this drive
+
+    def age(self) -> float:
+        return time.time() - self.timestamp
+
+class TelemetryWriter:
+    """
+    Creates the shared memory block and publishes snapshots into it, server side.
+    Only created when something publishes, readers would otherwise follow a block
+    that never changes.
+    """
+    def __init__(self, name, logger):
+        self.logger = logger
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+        except FileExistsError:
+            # Left behind by a server that did not shut down cleanly
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.size < BLOCK_SIZE or HEADER.unpack_from(self.shm.buf, 0)[:3] != (MAGIC, LAYOUT_VERSION, DRIVE_RECORD.size):
+                # Another layout, readers attached to it would misread the records
+                self.logger.warning(f"Telemetry block {name} already exists with another layout, recreating it")
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=BLOCK_SIZE)
+            else:
+                self.logger.warning(f"Telemetry block {name} already exists, taking it over")
+        self.buf = self.shm.buf
+        self.sequence = 0
+        HEADER.pack_into(self.buf, 0, MAGIC, LAYOUT_VERSION, DRIVE_RECORD.size, self.sequence)
+        for index in range(len(SIDES)):
+            DRIVE_RECORD.pack_into(self.buf, HEADER.size + index * DRIVE_RECORD.size, 0.0, 0, 0, 0, 0, 0, 0, 0, 0)
+        self.publishes = 0
+
+    def publish(self, snapshots: Dict[str, object], modbuscntrl: Dict[str, int], timestamp: Optional[float] = None):
+        """
+        Writes the snapshots of the drives that were read, drives missing
+        from snapshots keep their previous record and timestamp
+        Args:
+            snapshots: side -> DriveSnapshot with status, velocity, position and fault
+            modbuscntrl: side -> position in ModbusCtrl units
+        """
+        timestamp = timestamp if timestamp is not None else time.time()
+        self.sequence += 1
+        SEQUENCE.pack_into(self.buf, SEQUENCE_OFFSET, self.sequence)
+        for index, side in enumerate(SIDES):
+            snapshot = snapshots.get(side)
+            if snapshot is None:
+                continue
+            DRIVE_RECORD.pack_into(
+                self.buf, HEADER.size + index * DRIVE_RECORD.size, timestamp,
+                snapshot.status or 0, snapshot.velocity or 0, snapshot.position[0], snapshot.position[1],
+                modbuscntrl[side], snapshot.fault or 0, bool(snapshot.is_faulted()), True
+            )
+        self.sequence += 1
+        SEQUENCE.pack_into(self.buf, SEQUENCE_OFFSET, self.sequence)
+        self.publishes += 1
+
+    def close(self):
+        if self.buf is None:
+            return
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+class TelemetryReader:
+    """
+    Attaches to the block of a running server, read only
+    """
+    def __init__(self, name):
+        self.shm = shared_memory.SharedMemory(name=name)
+        if os.name != 'nt':
+            # Attaching registers the block with this process' resource tracker,
+            # which would unlink it from under the server when this process exits
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(self.shm._name, "shared_memory")
+        self.buf = self.shm.buf
+        magic, version, record_size, _ = HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or record_size != DRIVE_RECORD.size:
+            self.close()
+            raise ValueError(f"Telemetry block {name} has an unknown layout: {magic} v{version}")
+        self.retries = 0
+
+    def read(self, max_attempts=100):
+        """
+        Returns (sequence, {side: DriveTelemetry}) of one consistent publish,
+        or None if the writer kept the block busy for all attempts
+        """
+        for _ in range(max_attempts):
+            before = SEQUENCE.unpack_from(self.buf, SEQUENCE_OFFSET)[0]
+            if before & 1:
+                self.retries += 1
+                continue
+            records = [DRIVE_RECORD.unpack_from(self.buf, HEADER.size + index * DRIVE_RECORD.size)
+                       for index in range(len(SIDES))]
+            if SEQUENCE.unpack_from(self.buf, SEQUENCE_OFFSET)[0] != before:
+                self.retries += 1
+                continue
+
+            drives = {}
+            for side, (timestamp, status, velocity, decimal, whole, modbuscntrl, fault, faulted, valid) in zip(SIDES, records):
+                drives[side] = DriveTelemetry(timestamp, status, velocity, [decimal, whole],
+                                              modbuscntrl, fault, bool(faulted), bool(valid))
+            return before, drives
+        return None
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
+def main():
+    from config import Config
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--name", type=str, default=Config.TELEMETRY_SHM_NAME, help="shared memory block name")
+    parser.add_argument("--interval", type=float, default=0.5, help="seconds between prints")
+    args = parser.parse_args()
+
+    reader = TelemetryReader(args.name)
+    try:
+        while True:
+            result = reader.read()
+            if result is not None:
+                sequence, drives = result
+                print(f"#{sequence // 2} " + " | ".join(
+                    f"{side}: pos {drive.modbuscntrl} status {drive.status:#06x} fault {drive.fault:#06x} "
+                    f"age {drive.age() * 1000:.0f} ms" for side, drive in drives.items()))
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+
+if __name__ == "__main__":
+    main()
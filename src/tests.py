@@ -19,6 +19,93 @@ from utils import (
     convert_vel_rpm_revs,
     convert_acc_rpm_revs,
 )
+import asyncio
+import time
+import logging
+from unittest import mock
+from config import Config
+from ModbusClients import ModbusClients
+from control_loop import ControlLoop
+from position_state import PositionState
+from utils import revs_to_modbuscntrl
+from register_map import Register, build_register_map, plan_spans
+from pipelined_client import PipelinedModbusClient, MBAP_HEADER
+import struct
+from multiprocessing import shared_memory
+from gateway import DriveGateway
+from fast_writer import ModbusCntrlFastWriter
+from connection_supervisor import ConnectionSupervisor
+from retry_policy import CircuitBreaker
+from latency_stats import LatencyHistogram, TimedClient
+from drive_simulator import start_drives
+from fault_monitor import FaultMonitor
+from telemetry_shm import TelemetryWriter, TelemetryReader, SEQUENCE, SEQUENCE_OFFSET, BLOCK_SIZE
+from register_map import DriveSnapshot
+import os
+import tempfile
+import json
+from module_manager import ModuleManager
+from init_pipeline import InitPipeline
+from drive_state import DriveStateStore
+from kinematics import PlatformKinematics, KinematicsTable, prepare_table
+from setpoint_stream import Setpoint, SETPOINT, ACK, encode_setpoint, decode_setpoint, encode_ack
+from udp_setpoints import UdpSetpointListener
+from trajectory import TrajectoryPlayer, parse_trajectory, validate_trajectory
+import io
+
+
+class FakeResponse:
+    def __init__(self, error=False, registers=None):
+        self.error = error
+        self.registers = registers or []
+
+    def isError(self):
+        return self.error
+
+
+class FakeClient:
+    """
+    Stands in for AsyncModbusTcpClient, fails the first fail_count requests
+    """
+    def __init__(self, fail_count=0, delay=0.0, refuse_connects=0):
+        self.fail_count = fail_count
+        self.refuse_connects = refuse_connects
+        self.connects = 0
+        self.delay = delay
+        self.writes = []
+        self.reads = []
+        self.connected = True
+
+    async def _respond(self):
+        await asyncio.sleep(self.delay)
+        if self.fail_count > 0:
+            self.fail_count -= 1
+            return FakeResponse(error=True)
+        return FakeResponse(registers=[0, 0])
+
+    async def write_register(self, address, value, slave=1):
+        self.writes.append((address, value))
+        return await self._respond()
+
+    async def write_registers(self, address, values, slave=1):
+        self.writes.append((address, values))
+        return await self._respond()
+
+    async def read_holding_registers(self, address, count=1, slave=1):
+        self.reads.append((address, count))
+        response = await self._respond()
+        if not response.isError():
+            # Every register holds its own address so decoding can be checked
+            response.registers = list(range(address, address + count))
+        return response
+
+    async def connect(self):
+        self.connects += 1
+        self.connected = self.connects > self.refuse_connects
+        return self.connected
+
+    def close(self):
+        self.connected = False
 
 class TestBitFunctions(unittest.TestCase):
     def test_split_20bit_to_components(self):
@@ -216,5 +303,1042 @@ class TestBitFunctions(unittest.TestCase):
         # self.assertEqual(result[0], 48) 
         # self.assertEqual(result[1], 0)
 
+
+def make_clients(left, right):
+    logger = logging.getLogger("tests")
+    logger.disabled = True
+    clients = ModbusClients(config=Config(), logger=logger)
+    clients.client_left = left
+    clients.client_right = right
+    clients.retry_policy.base_delay = 0
+    clients.critical_policy.base_delay = 0
+    return clients
+
+
+class TestDualDriveEngine(unittest.IsolatedAsyncioTestCase):
+    async def test_writes_both_motors(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        self.assertTrue(await clients.set_analog_modbus_cntrl((100, 200)))
+        self.assertEqual(clients.client_left.writes, [(Config.ANALOG_MODBUS_CNTRL, 100)])
+        self.assertEqual(clients.client_right.writes, [(Config.ANALOG_MODBUS_CNTRL, 200)])
+
+    async def test_sides_retry_independently(self):
+        clients = make_clients(FakeClient(fail_count=2), FakeClient())
+        self.assertTrue(await clients.set_analog_pos_max(61406, 28))
+        self.assertEqual(len(clients.client_left.writes), 3)
+        self.assertEqual(len(clients.client_right.writes), 1)
+
+    async def test_reports_failing_side(self):
+        clients = make_clients(FakeClient(), FakeClient(fail_count=10))
+        left, right = await clients._read_both(Config.OEG_STATUS, 1, "read status")
+        self.assertIsNotNone(left)
+        self.assertIsNone(right)
+
+    async def test_motors_are_written_concurrently(self):
+        clients = make_clients(FakeClient(delay=0.05), FakeClient(delay=0.05))
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await clients.set_host_command_mode(2)
+        self.assertLess(loop.time() - start, 0.09)
+
+    async def test_deadline_bounds_slow_drive(self):
+        clients = make_clients(FakeClient(), FakeClient(delay=5))
+        clients.retry_policy.deadline = 0.1
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.assertFalse(await clients.set_host_command_mode(2))
+        self.assertLess(loop.time() - start, 0.3)
+        self.assertEqual(len(clients.client_left.writes), 1)
+
+    async def test_open_breaker_fails_fast(self):
+        clients = make_clients(FakeClient(), FakeClient(fail_count=100))
+        for _ in range(2):
+            await clients.set_host_command_mode(2)
+        self.assertTrue(clients.breakers["right"].is_open())
+        writes_before = len(clients.client_right.writes)
+        self.assertFalse(await clients.set_host_command_mode(2))
+        self.assertEqual(len(clients.client_right.writes), writes_before)
+        self.assertFalse(clients.breakers["left"].is_open())
+        # Stop is still tried on a motor with an open breaker
+        await clients.stop()
+        self.assertGreater(len(clients.client_right.writes), writes_before)
+
+    def test_half_open_breaker_lets_one_probe_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+    async def test_keepalive_leaves_breaker_alone(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        breaker = clients.breakers["right"]
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertTrue(await clients.ping("right"))
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    async def test_disconnected_motor_fails_without_waiting(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        clients.client_right.connected = False
+        left, right = await clients._read_both(Config.OEG_STATUS, 1, "read status")
+        self.assertIsNotNone(left)
+        self.assertIsNone(right)
+        self.assertEqual(clients.client_right.reads, [])
+
+    async def test_stop_reconnects_within_the_critical_deadline(self):
+        clients = make_clients(FakeClient(), FakeClient(refuse_connects=2))
+        clients.client_right.connected = False
+        self.assertTrue(await clients.stop())
+        self.assertEqual(clients.client_right.connects, 3)
+        self.assertEqual(clients.client_right.writes, [(Config.IEG_MOTION, 4)])
+
+        clients = make_clients(FakeClient(), FakeClient(refuse_connects=1000))
+        clients.client_right.connected = False
+        clients.critical_policy.deadline = 0.3
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.assertFalse(await clients.stop())
+        self.assertLess(loop.time() - start, 0.5)
+        self.assertEqual(clients.client_right.writes, [])
+
+    async def test_analog_parameters_are_one_bulk_write(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        self.assertTrue(await clients.set_analog_parameters(input_channel=2, pos_min=[25801, 0], pos_max=[61406, 28],
+                                                            vel_max=[1, 2], acc_max=[3, 4]))
+        expected = [(Config.ANALOG_INPUT_CHANNEL, [2, 25801, 0, 61406, 28, 1, 2, 3, 4])]
+        self.assertEqual(clients.client_left.writes, expected)
+        self.assertEqual(clients.client_right.writes, expected)
+
+class TestInitPipeline(unittest.IsolatedAsyncioTestCase):
+    async def test_independent_steps_run_concurrently_and_failure_skips_dependents(self):
+        logger = logging.getLogger("tests")
+        logger.disabled = True
+        pipeline = InitPipeline(logger)
+
+        async def slow():
+            await asyncio.sleep(0.1)
+            return True
+
+        async def fail():
+            return False
+
+        pipeline.add("root", slow)
+        pipeline.add("a", slow, ["root"])
+        pipeline.add("b", slow, ["root"])
+        pipeline.add("joined", slow, ["a", "b"])
+        pipeline.add("broken", fail, ["root"])
+        pipeline.add("after_broken", slow, ["broken", "joined"])
+        self.assertFalse(await pipeline.run())
+
+        timings = pipeline.summary()["steps"]
+        self.assertLess(abs(timings["a"]["start_ms"] - timings["b"]["start_ms"]), 50)
+        self.assertLess(pipeline.total_ms, 400)
+        self.assertEqual(timings["joined"]["status"], "ok")
+        self.assertEqual(pipeline.failed(), ["broken"])
+        self.assertEqual(timings["after_broken"]["status"], "skipped")
+
+    def test_unknown_dependency_is_rejected(self):
+        pipeline = InitPipeline(logging.getLogger("tests"))
+        with self.assertRaises(ValueError):
+            pipeline.add("step", None, ["missing"])
+
+class TestDriveStateStore(unittest.TestCase):
+    def test_snapshot_is_only_used_for_the_same_drives(self):
+        logger = logging.getLogger("tests")
+        logger.disabled = True
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "state", "drive_state.json")
+            DriveStateStore(Config(), logger, path).save([2, 25801, 0], homed=True)
+
+            state = DriveStateStore(Config(), logger, path).load()
+            self.assertEqual((state["analog_parameters"], state["homed"]), ([2, 25801, 0], True))
+            self.assertIsNone(DriveStateStore(Config(SERVER_IP_LEFT="10.0.0.1"), logger, path).load())
+
+            DriveStateStore(Config(), logger, path).clear()
+            self.assertIsNone(DriveStateStore(Config(), logger, path).load())
+
+class TestConnectionSupervisor(unittest.IsolatedAsyncioTestCase):
+    async def test_lost_connection_is_reconnected_in_background(self):
+        clients = make_clients(FakeClient(), FakeClient(refuse_connects=2))
+        config = Config(KEEPALIVE_INTERVAL=0.01, RECONNECT_MIN_DELAY=0.01)
+        supervisor = ConnectionSupervisor(clients=clients, config=config, logger=clients.logger)
+        supervisor.start()
+        clients.client_right.connected = False
+        await asyncio.sleep(0.1)
+        await supervisor.stop()
+        self.assertTrue(supervisor.is_connected("right"))
+        self.assertEqual(clients.client_right.connects, 3)
+        self.assertEqual(supervisor.reconnects, {"left": 0, "right": 1})
+        self.assertGreater(len(clients.client_left.reads), 1)
+
+class TestLatencyStats(unittest.IsolatedAsyncioTestCase):
+    def test_histogram_percentiles(self):
+        histogram = LatencyHistogram()
+        for _ in range(99):
+            histogram.record(100_000)
+        histogram.record(50_000_000)
+        # Within one bucket, an eighth of a doubling
+        self.assertGreaterEqual(histogram.percentile(0.5), 100_000)
+        self.assertLess(histogram.percentile(0.5), 100_000 * 2 ** (1 / 8))
+        # Never above the largest sample
+        self.assertEqual(histogram.percentile(1.0), 50_000_000)
+        self.assertEqual(histogram.max_ns, 50_000_000)
+
+        single = LatencyHistogram()
+        single.record(10_382_000)
+        self.assertEqual(single.percentile(0.99), 10_382_000)
+
+    async def test_requests_are_timed_per_register(self):
+        clients = make_clients(FakeClient(), FakeClient(fail_count=1))
+        clients.client_left = TimedClient(clients.client_left, "left", clients.latency)
+        clients.client_right = TimedClient(clients.client_right, "right", clients.latency)
+        await clients.set_analog_modbus_cntrl((1, 2))
+        summary = clients.latency.summary()
+        self.assertEqual(summary["drives"]["left"]["count"], 1)
+        self.assertEqual(summary["drives"]["right"]["count"], 2)
+        self.assertEqual(summary["drives"]["right"]["errors"], 1)
+        self.assertEqual(summary["registers"][0]["register"], Config.ANALOG_MODBUS_CNTRL)
+        self.assertEqual(summary["retries"], [{"side": "right", "operation": "set analog modbuscntrl value", "count": 1}])
+
+class TestControlLoop(unittest.IsolatedAsyncioTestCase):
+    async def test_only_latest_target_is_written(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        config = Config(POS_UPDATE_HZ=50)
+        control_loop = ControlLoop(clients=clients, config=config, logger=clients.logger)
+        control_loop.set_target((100, 100))
+        control_loop.set_target((200, 20000))
+        control_loop.start()
+        await asyncio.sleep(0.1)
+        await control_loop.stop()
+        self.assertEqual(clients.client_left.writes, [(Config.ANALOG_MODBUS_CNTRL, 200)])
+        self.assertEqual(clients.client_right.writes, [(Config.ANALOG_MODBUS_CNTRL, Config.MODBUSCTRL_MAX)])
+
+    async def test_pending_setpoint_is_replaced_while_write_in_flight(self):
+        clients = make_clients(FakeClient(delay=0.05), FakeClient())
+        control_loop = ControlLoop(clients=clients, config=Config(POS_UPDATE_HZ=100), logger=clients.logger)
+        control_loop.start()
+        for value in range(1, 11):
+            control_loop.set_target((value, value))
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.15)
+        await control_loop.stop()
+        left_values = [value for _, value in clients.client_left.writes]
+        self.assertEqual(left_values[-1], 10)
+        self.assertLess(len(left_values), 4)
+        self.assertEqual(control_loop.mailboxes["left"].coalesced, 10 - len(left_values))
+        self.assertEqual(control_loop.written, (10, 10))
+        self.assertEqual(control_loop.stats()["left"]["ack_latency"]["count"], len(left_values))
+
+    async def test_same_target_is_resent_after_invalidate(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        control_loop = ControlLoop(clients=clients, config=Config(POS_UPDATE_HZ=100), logger=clients.logger)
+        control_loop.start()
+        control_loop.set_target((300, 300))
+        await asyncio.sleep(0.05)
+        control_loop.set_target((300, 300))
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(clients.client_left.writes), 1)
+
+        # Drive stopped where it was, the same target has to go out again
+        control_loop.invalidate()
+        control_loop.set_target((300, 300))
+        await asyncio.sleep(0.05)
+        self.assertEqual(len(clients.client_left.writes), 2)
+
+        control_loop.invalidate("right")
+        control_loop.set_target((300, 300))
+        await asyncio.sleep(0.05)
+        await control_loop.stop()
+        self.assertEqual((len(clients.client_left.writes), len(clients.client_right.writes)), (2, 3))
+
+class TestPositionState(unittest.IsolatedAsyncioTestCase):
+    def test_revs_to_modbuscntrl(self):
+        config = Config()
+        self.assertEqual(revs_to_modbuscntrl(config.POS_MIN_REVS, config), 0)
+        self.assertEqual(revs_to_modbuscntrl(config.POS_MAX_REVS, config), config.MODBUSCTRL_MAX)
+        self.assertEqual(revs_to_modbuscntrl(100, config), config.MODBUSCTRL_MAX)
+        self.assertEqual(revs_to_modbuscntrl(0, config), 0)
+
+    async def test_commanded_position_skips_read(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        reads = []
+        async def get_current_revs():
+            reads.append(1)
+            return FakeResponse(registers=[0, 1]), FakeResponse(registers=[0, 1])
+        clients.get_current_revs = get_current_revs
+
+        position_state = PositionState(config=Config(), logger=clients.logger)
+        first = await position_state.get_position(clients)
+        self.assertEqual(len(reads), 1)
+        # Fresh feedback is reused
+        self.assertEqual(await position_state.get_position(clients), first)
+        self.assertEqual(len(reads), 1)
+
+        position_state.set_commanded((5000, 4000))
+        position_state.feedback_time -= 10
+        self.assertEqual(await position_state.get_position(clients), (5000, 4000))
+        self.assertEqual(len(reads), 1)
+
+        position_state.invalidate()
+        await position_state.get_position(clients)
+        self.assertEqual(len(reads), 2)
+
+class TestPlatformKinematics(unittest.TestCase):
+    def test_level_platform_is_neutral_stroke(self):
+        kinematics = PlatformKinematics(Config())
+        self.assertEqual(kinematics.actuator_strokes(0, 0), (Config.ACTUATOR_NEUTRAL_STROKE, Config.ACTUATOR_NEUTRAL_STROKE))
+        values, clamped = kinematics.setpoint(0, 0)
+        self.assertEqual(values, (5000, 5000))
+        self.assertFalse(clamped)
+
+    def test_combined_pitch_and_roll(self):
+        kinematics = PlatformKinematics(Config())
+        (pitch_left, pitch_right), _ = kinematics.setpoint(3, 0)
+        self.assertEqual(pitch_left, pitch_right)
+        self.assertGreater(pitch_left, 5000)
+        (left, right), clamped = kinematics.setpoint(3, 4)
+        # Roll raises the left side and lowers the right side on top of the pitch
+        self.assertGreater(left, pitch_left)
+        self.assertLess(right, pitch_right)
+        self.assertFalse(clamped)
+        self.assertEqual(kinematics.setpoint(3, -4)[0], (right, left))
+
+    def test_limits_and_acceleration_cues(self):
+        kinematics = PlatformKinematics(Config())
+        self.assertEqual(kinematics.setpoint(30, 0), (kinematics.setpoint(Config.PITCH_MAX_DEG, 0)[0], True))
+        # Forward acceleration tilts the platform nose up like a small pitch
+        cue_pitch, cue_roll = kinematics.tilt_coordination(1.0, 0.0)
+        self.assertGreater(cue_pitch, 0)
+        self.assertEqual(cue_roll, 0)
+        self.assertEqual(kinematics.setpoint(0, 0, acc_x=1.0)[0], kinematics.setpoint(cue_pitch, 0)[0])
+
+class TestKinematicsTable(unittest.TestCase):
+    def test_table_matches_exact_model(self):
+        config = Config()
+        exact = PlatformKinematics(config)
+        kinematics = PlatformKinematics(config)
+        table = KinematicsTable.build(kinematics, config.KINEMATICS_LUT_STEP)
+        self.assertLess(table.validate(kinematics), config.KINEMATICS_LUT_MAX_ERROR)
+        kinematics.use_table(table)
+
+        for pitch, roll in ((0, 0), (1.234, -5.01), (-config.PITCH_MAX_DEG, config.ROLL_MAX_DEG), (3.99, 2.5)):
+            left, right = table.lookup(pitch, roll)
+            exact_left, exact_right = exact.exact_modbuscntrl(pitch, roll)
+            self.assertAlmostEqual(left, exact_left, delta=config.KINEMATICS_LUT_MAX_ERROR)
+            self.assertAlmostEqual(right, exact_right, delta=config.KINEMATICS_LUT_MAX_ERROR)
+
+        # Batch gives the same setpoints as single lookups
+        pitch = np.array([0.0, 1.5, -2.25, 10.0])
+        roll = np.array([0.0, -3.0, 5.5, 0.0])
+        values, clamped = kinematics.setpoints(pitch, roll)
+        for index in range(len(pitch)):
+            single_values, single_clamped = kinematics.setpoint(pitch[index], roll[index])
+            self.assertEqual(tuple(values[index]), single_values)
+            self.assertEqual(bool(clamped[index]), single_clamped)
+
+    def test_cache_is_reused_only_for_same_geometry(self):
+        logger = logging.getLogger("test")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "lut.npz")
+            config = Config()
+            kinematics = PlatformKinematics(config)
+            self.assertIsNotNone(prepare_table(kinematics, config, logger, path))
+            self.assertIsNotNone(kinematics.table)
+
+            with mock.patch.object(KinematicsTable, "build", side_effect=AssertionError("rebuilt")):
+                self.assertIsNotNone(prepare_table(PlatformKinematics(config), config, logger, path))
+
+            wider = Config(PLATFORM_ATTACH_HALF_WIDTH=350.0)
+            table = prepare_table(PlatformKinematics(wider), wider, logger, path)
+            self.assertTrue(np.array_equal(table.geometry, PlatformKinematics(wider).geometry()))
+
+    def test_falls_back_to_exact_model_on_large_error(self):
+        config = Config(KINEMATICS_LUT_STEP=2.0, KINEMATICS_LUT_MAX_ERROR=0.001)
+        kinematics = PlatformKinematics(config)
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertIsNone(prepare_table(kinematics, config, logging.getLogger("test"), os.path.join(directory, "lut.npz")))
+        self.assertIsNone(kinematics.table)
+
+class TestSetpointStream(unittest.TestCase):
+    def test_binary_and_text_messages(self):
+        setpoint = decode_setpoint(encode_setpoint(Setpoint(7, 12.5, 1.5, -2.25, 0.5, 0.0)))
+        self.assertEqual(setpoint, Setpoint(7, 12.5, 1.5, -2.25, 0.5, 0.0))
+        self.assertEqual(decode_setpoint('{"seq": 3, "pitch": 1, "roll": -2}'), Setpoint(3, 0.0, 1.0, -2.0))
+
+        self.assertEqual(ACK.unpack(encode_ack(setpoint, (6000, 4000), False, binary=True)), (7, 6000, 4000, 0))
+        self.assertEqual(json.loads(encode_ack(setpoint, (6000, 4000), True, binary=False)),
+                         {"seq": 7, "target": [6000, 4000], "clamped": True})
+
+    def test_malformed_messages_are_rejected(self):
+        for message in (b"\x00" * (SETPOINT.size - 1), '{"pitch": 1}', '{"pitch": "a", "roll": 0}', "[1, 2]",
+                        "not json", encode_setpoint(Setpoint(1, 0.0, float("nan"), 0.0))):
+            with self.assertRaises(ValueError):
+                decode_setpoint(message)
+
+class TestUdpSetpoints(unittest.IsolatedAsyncioTestCase):
+    def make_listener(self, **config):
+        applied = []
+        listener = UdpSetpointListener(Config(**config), logging.getLogger("test"), applied.append)
+        return listener, applied
+
+    def test_sequence_drops_and_loss(self):
+        listener, applied = self.make_listener()
+        now = time.time()
+        sender = ("127.0.0.1", 40000)
+        for sequence, sent in ((1, now), (2, now), (5, now), (3, now), (5, now), (6, now - 1.0), (7, now)):
+            listener.datagram_received(encode_setpoint(Setpoint(sequence, sent, 1.0, 0.0)), sender)
+        listener.datagram_received(b"short", sender)
+
+        self.assertEqual([setpoint.sequence for setpoint in applied], [1, 2, 5, 7])
+        stats = listener.stats()
+        # 3 and 4 were skipped, 3 arrived late after all
+        self.assertEqual((stats["lost"], stats["reordered"], stats["duplicates"]), (1, 1, 1))
+        self.assertEqual((stats["stale"], stats["rejected"], stats["received"]), (1, 1, 8))
+
+    def test_sequence_wraps_and_new_sender_resyncs(self):
+        listener, applied = self.make_listener(UDP_SENDER_TIMEOUT=0.05)
+        now = time.time()
+        listener.datagram_received(encode_setpoint(Setpoint(2 ** 32 - 1, now, 0.0, 0.0)), ("127.0.0.1", 1))
+        listener.datagram_received(encode_setpoint(Setpoint(0, now, 0.0, 0.0)), ("127.0.0.1", 1))
+        # Another source is ignored while the sender is live
+        listener.datagram_received(encode_setpoint(Setpoint(7, now, 0.0, 0.0)), ("127.0.0.1", 2))
+        self.assertEqual((len(applied), listener.rejected), (2, 1))
+
+        # Restarted sender with a new port counts from 0 again once the old one went silent
+        time.sleep(0.06)
+        listener.datagram_received(encode_setpoint(Setpoint(0, time.time(), 0.0, 0.0)), ("127.0.0.1", 2))
+        self.assertEqual(len(applied), 3)
+        self.assertEqual(listener.stats()["lost"], 0)
+        self.assertEqual(listener.resyncs, 2)
+
+    async def test_receives_datagrams(self):
+        listener, applied = self.make_listener(UDP_SETPOINT_HOST="127.0.0.1", UDP_SETPOINT_PORT=0)
+        transport = await listener.start()
+        port = transport.get_extra_info("sockname")[1]
+        loop = asyncio.get_running_loop()
+        sender, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=("127.0.0.1", port))
+        try:
+            for sequence in range(3):
+                sender.sendto(encode_setpoint(Setpoint(sequence, time.time(), 2.0, -1.0)))
+            for _ in range(50):
+                if len(applied) == 3:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            sender.close()
+            listener.stop()
+        self.assertEqual([setpoint.sequence for setpoint in applied], [0, 1, 2])
+
+def smooth_trajectory(duration=2.0, rate=50, pitch=0.25, roll=0.0):
+    times = np.arange(0, duration + 1e-9, 1 / rate)
+    shape = (1 - np.cos(np.pi * times / duration)) / 2
+    return np.column_stack([times, pitch * shape, roll * shape])
+
+class TestTrajectory(unittest.TestCase):
+    def test_parse_npy_and_raw(self):
+        samples = smooth_trajectory()
+        buffer = io.BytesIO()
+        np.save(buffer, samples)
+        parsed = parse_trajectory(buffer.getvalue(), Config.TRAJECTORY_MAX_SAMPLES)
+        self.assertEqual(parsed.shape, (len(samples), 5))
+        self.assertTrue(np.array_equal(parsed[:, :3], samples))
+        self.assertTrue(np.array_equal(parse_trajectory(parsed.astype("<f8").tobytes(), Config.TRAJECTORY_MAX_SAMPLES), parsed))
+
+        with self.assertRaises(ValueError):
+            parse_trajectory(b"\x00" * 41, Config.TRAJECTORY_MAX_SAMPLES)
+        with self.assertRaises(ValueError):
+            parse_trajectory(parsed.tobytes(), 10)
+
+    def test_validation(self):
+        config = Config()
+        kinematics = PlatformKinematics(config)
+        samples = np.hstack([smooth_trajectory(), np.zeros((101, 2))])
+        trajectory, errors = validate_trajectory(samples, kinematics, config)
+        self.assertEqual(errors, [])
+        self.assertEqual(tuple(trajectory.values[0]), kinematics.setpoint(0, 0)[0])
+        self.assertLessEqual(trajectory.max_velocity, config.VEL / 60)
+
+        too_fast = samples.copy()
+        too_fast[:, 0] /= 10
+        _, errors = validate_trajectory(too_fast, kinematics, config)
+        self.assertEqual([error["error"].split(" over")[0] for error in errors], ["actuator velocity", "actuator acceleration"])
+
+        out_of_range = samples.copy()
+        out_of_range[60:, 2] = 30
+        _, errors = validate_trajectory(out_of_range, kinematics, config)
+        self.assertEqual(errors[0]["error"], "outside the angle or stroke limits")
+        self.assertEqual((errors[0]["count"], errors[0]["first_index"]), (41, 60))
+
+        unordered = samples.copy()
+        unordered[10, 0] = unordered[9, 0]
+        _, errors = validate_trajectory(unordered, kinematics, config)
+        self.assertEqual(errors, [{"error": "times have to increase", "count": 1, "first_index": 9, "first_time": unordered[10, 0]}])
+
+class TestTrajectoryPlayer(unittest.IsolatedAsyncioTestCase):
+    async def test_playback_timing_and_tracking(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        config = Config()
+        config.VEL, config.ACC = 6000, 60000
+        control_loop = ControlLoop(clients=clients, config=config, logger=clients.logger)
+        position_state = PositionState(config=config, logger=clients.logger)
+        samples = np.hstack([smooth_trajectory(duration=0.2, pitch=1.0), np.zeros((11, 2))])
+        trajectory, errors = validate_trajectory(samples, PlatformKinematics(config), config)
+        self.assertEqual(errors, [])
+
+        player = TrajectoryPlayer(control_loop, position_state, clients, config, clients.logger)
+        self.assertFalse(player.start())
+        await player.load(trajectory)
+
+        async def feedback():
+            # Motors exactly where they should be
+            while True:
+                if control_loop.target is not None:
+                    position_state.update_feedback(control_loop.target)
+                await asyncio.sleep(0.03)
+        feedback_task = asyncio.create_task(feedback())
+        self.assertTrue(player.start())
+        await player.task
+        feedback_task.cancel()
+
+        stats = player.stats()
+        self.assertEqual((stats["state"], stats["played"]), ("done", 11))
+        self.assertEqual(control_loop.target, tuple(trajectory.values[-1]))
+        self.assertAlmostEqual(stats["actual_duration_s"], 0.2, delta=0.05)
+        self.assertEqual(stats["lateness"]["count"], 11)
+        self.assertGreater(stats["tracking"]["samples"], 0)
+        # Feedback of the last target before the feedback time, at most one sample step off,
+        # or two if the event loop was busy and the sample was set late
+        self.assertLess(stats["tracking"]["left"]["max"], 2 * np.abs(np.diff(trajectory.values[:, 0])).max() + 1)
+
+    async def test_playback_waits_for_the_start_position(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        config = Config(TRAJECTORY_APPROACH_TIMEOUT=0.1)
+        control_loop = ControlLoop(clients=clients, config=config, logger=clients.logger)
+        position_state = PositionState(config=config, logger=clients.logger)
+        trajectory, _ = validate_trajectory(np.hstack([smooth_trajectory(), np.zeros((101, 2))]),
+                                            PlatformKinematics(config), config)
+        player = TrajectoryPlayer(control_loop, position_state, clients, config, clients.logger)
+        await player.load(trajectory)
+        # Motors stuck at the bottom
+        position_state.update_feedback((0, 0))
+        player.start()
+        await asyncio.sleep(0)
+        self.assertEqual(player.state, "approaching")
+        self.assertEqual(control_loop.target, tuple(trajectory.values[0]))
+        await player.task
+        self.assertEqual((player.state, player.played), ("approach_failed", 0))
+
+    async def test_stop_while_approaching(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        config = Config()
+        control_loop = ControlLoop(clients=clients, config=config, logger=clients.logger)
+        position_state = PositionState(config=config, logger=clients.logger)
+        trajectory, _ = validate_trajectory(np.hstack([smooth_trajectory(), np.zeros((101, 2))]),
+                                            PlatformKinematics(config), config)
+        player = TrajectoryPlayer(control_loop, position_state, clients, config, clients.logger)
+        await player.load(trajectory)
+        position_state.update_feedback((0, 0))
+        player.start()
+        await asyncio.sleep(0)
+        self.assertEqual(player.state, "approaching")
+        await player.stop()
+        self.assertEqual((player.state, player.task), ("stopped", None))
+
+class TestRegisterSpanPlanner(unittest.TestCase):
+    def test_contiguous_registers_are_merged(self):
+        spans = plan_spans([Register("a", 7102, 2), Register("b", 7104, 2), Register("c", 7101, 1)])
+        self.assertEqual(len(spans), 1)
+        self.assertEqual((spans[0].address, spans[0].count), (7101, 5))
+
+    def test_gap_limit(self):
+        register_map = build_register_map(Config())
+        self.assertEqual(len(plan_spans(register_map.values(), max_gap=0)), 4)
+        spans = plan_spans(register_map.values(), max_gap=20)
+        self.assertEqual([(span.address, span.count) for span in spans], [(104, 1), (361, 19), (846, 1)])
+
+    def test_max_count(self):
+        spans = plan_spans([Register("a", 0, 100), Register("b", 100, 100)], max_gap=10, max_count=125)
+        self.assertEqual(len(spans), 2)
+
+class TestReadSnapshot(unittest.IsolatedAsyncioTestCase):
+    async def test_snapshot_is_decoded_per_drive(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        left, right = await clients.read_snapshot()
+        self.assertEqual(len(clients.client_left.reads), 3)
+        for snapshot in (left, right):
+            self.assertEqual(snapshot.status, Config.OEG_STATUS)
+            self.assertEqual(snapshot.velocity, Config.VFEEDBACK_VELOCITY)
+            self.assertEqual(snapshot.position, [Config.PFEEDBACK_POSITION, Config.PFEEDBACK_POSITION + 1])
+            self.assertEqual(snapshot.fault, Config.RECENT_FAULT_ADDRESS)
+
+class TestPipelinedClient(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.received_tids = []
+
+        async def handle(reader, writer):
+            # Collects two requests and answers them in reverse order
+            requests = []
+            while len(requests) < 2:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, unit = MBAP_HEADER.unpack(header)
+                pdu = await reader.readexactly(length - 1)
+                requests.append((tid, unit, pdu))
+                self.received_tids.append(tid)
+            for tid, unit, pdu in reversed(requests):
+                _, address, count = struct.unpack(">BHH", pdu)
+                reply = struct.pack(f">BB{count}H", 3, count * 2, *range(address, address + count))
+                writer.write(MBAP_HEADER.pack(tid, 0, len(reply) + 1, unit) + reply)
+            await writer.drain()
+
+        self.server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_replies_are_matched_by_tid(self):
+        config = Config(START_TID=100, LAST_TID=200)
+        logger = logging.getLogger("tests")
+        client = PipelinedModbusClient("127.0.0.1", self.port, config=config, logger=logger)
+        self.assertTrue(await client.connect())
+        status, position = await asyncio.gather(
+            client.read_holding_registers(address=104, count=1),
+            client.read_holding_registers(address=378, count=2),
+        )
+        client.close()
+        self.assertEqual(status.registers, [104])
+        self.assertEqual(position.registers, [378, 379])
+        self.assertEqual(self.received_tids, [101, 102])
+
+    async def test_tids_wrap_inside_range(self):
+        config = Config(START_TID=10, LAST_TID=12)
+        client = PipelinedModbusClient("127.0.0.1", self.port, config=config, logger=logging.getLogger("tests"))
+        self.assertEqual([client._allocate_tid() for _ in range(3)], [11, 12, 11])
+
+class TestDriveGateway(unittest.IsolatedAsyncioTestCase):
+    async def test_local_clients_share_one_drive_connection(self):
+        upstream_connections = []
+
+        async def drive(reader, writer):
+            upstream_connections.append(writer)
+            while True:
+                header = await reader.readexactly(MBAP_HEADER.size)
+                tid, _, length, unit = MBAP_HEADER.unpack(header)
+                pdu = await reader.readexactly(length - 1)
+                _, address, count = struct.unpack(">BHH", pdu)
+                reply = struct.pack(f">BB{count}H", 3, count * 2, *range(address, address + count))
+                writer.write(MBAP_HEADER.pack(tid, 0, len(reply) + 1, unit) + reply)
+
+        drive_server = await asyncio.start_server(drive, "127.0.0.1", 0)
+        drive_port = drive_server.sockets[0].getsockname()[1]
+        logger = logging.getLogger("tests")
+        config = Config(PIPELINED=True, SERVER_IP_LEFT="127.0.0.1", SERVER_PORT_LEFT=drive_port)
+        clients = ModbusClients(config=config, logger=logger)
+        clients.client_left = TimedClient(clients._create_client(*clients.drive_address("left")), "left", clients.latency)
+        self.assertTrue(await clients.client_left.connect())
+
+        gateway = DriveGateway("left", clients, logger)
+        gateway_server = await asyncio.start_server(gateway.handle_client, "127.0.0.1", 0)
+        gateway_port = gateway_server.sockets[0].getsockname()[1]
+
+        local_config = Config(START_TID=0, LAST_TID=100)
+        local_clients = [PipelinedModbusClient("127.0.0.1", gateway_port, config=local_config, logger=logger)
+                         for _ in range(2)]
+        for local_client in local_clients:
+            self.assertTrue(await local_client.connect())
+        responses = await asyncio.gather(*(local_client.read_holding_registers(address=104, count=1)
+                                           for local_client in local_clients))
+
+        for local_client in local_clients:
+            local_client.close()
+        clients.client_left.close()
+        gateway_server.close()
+        drive_server.close()
+
+        self.assertEqual([response.registers for response in responses], [[104], [104]])
+        self.assertEqual(len(upstream_connections), 1)
+        self.assertEqual(gateway.forwarded, 2)
+        # Upstream requests are timed like any other
+        self.assertEqual(clients.latency.summary()["registers"][0]["register"], 104)
+        self.assertEqual(clients.latency.summary()["drives"]["left"]["count"], 2)
+
+class TestFastWriter(unittest.IsolatedAsyncioTestCase):
+    async def test_frames_are_patched_and_echo_checked(self):
+        requests = []
+
+        async def drive(reader, writer):
+            while True:
+                frame = await reader.readexactly(12)
+                requests.append(struct.unpack(">HHHBBHH", frame))
+                writer.write(frame)
+
+        server = await asyncio.start_server(drive, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        config = Config(START_TID=10, LAST_TID=20)
+        for use_table in (False, True):
+            writer = ModbusCntrlFastWriter("127.0.0.1", port, config, logging.getLogger("tests"), use_table=use_table)
+            self.assertTrue(await writer.connect())
+            self.assertTrue(await writer.write(1234))
+            self.assertTrue(await writer.write(Config.MODBUSCTRL_MAX))
+            writer.close()
+        server.close()
+
+        self.assertEqual(requests[0], (11, 0, 6, 1, 6, Config.ANALOG_MODBUS_CNTRL, 1234))
+        self.assertEqual(requests[1][0], 12)
+        self.assertEqual(requests[3][-1], Config.MODBUSCTRL_MAX)
+
+    async def test_exception_reply_fails_without_timeout(self):
+        async def drive(reader, writer):
+            while True:
+                frame = await reader.readexactly(12)
+                tid, value = struct.unpack(">H", frame[:2])[0], struct.unpack(">H", frame[10:])[0]
+                if value == 0xFFFF:
+                    # Illegal data value
+                    writer.write(struct.pack(">HHHBBB", tid, 0, 3, 1, 0x86, 3))
+                else:
+                    writer.write(frame)
+
+        server = await asyncio.start_server(drive, "127.0.0.1", 0)
+        writer = ModbusCntrlFastWriter("127.0.0.1", server.sockets[0].getsockname()[1], Config(),
+                                       logging.getLogger("tests"))
+        self.assertTrue(await writer.connect())
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.assertFalse(await writer.write(0xFFFF, timeout=1.0))
+        self.assertLess(loop.time() - start, 0.5)
+        # Connection stays usable
+        self.assertTrue(writer.connected)
+        self.assertTrue(await writer.write(100))
+        writer.close()
+        server.close()
+
+    async def test_silent_drive_times_out_on_the_shared_timer(self):
+        async def drive(reader, writer):
+            while True:
+                frame = await reader.readexactly(12)
+                if struct.unpack(">H", frame[10:])[0] != 0xFFFF:
+                    writer.write(frame)
+
+        server = await asyncio.start_server(drive, "127.0.0.1", 0)
+        writer = ModbusCntrlFastWriter("127.0.0.1", server.sockets[0].getsockname()[1], Config(),
+                                       logging.getLogger("tests"))
+        self.assertTrue(await writer.connect())
+        protocol = writer.protocol
+        for value in range(20):
+            self.assertTrue(await writer.write(value, timeout=0.1))
+        # One timer for all of the writes above
+        watchdog = protocol.watchdog
+        self.assertIsNotNone(watchdog)
+        self.assertTrue(await writer.write(20, timeout=0.1))
+        self.assertIs(protocol.watchdog, watchdog)
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        self.assertFalse(await writer.write(0xFFFF, timeout=0.1))
+        self.assertGreaterEqual(loop.time() - start, 0.1)
+        self.assertLess(loop.time() - start, 0.3)
+        self.assertFalse(writer.connected)
+        server.close()
+
+class TestDriveSimulator(unittest.IsolatedAsyncioTestCase):
+    async def test_homing_and_modbuscntrl_motion(self):
+        logger = logging.getLogger("tests")
+        logger.disabled = True
+        drives = await start_drives(Config(), logger, (0, 0), homing_time=0.05)
+        ports = [server.sockets[0].getsockname()[1] for _, server, _ in drives]
+        config = Config(SERVER_IP_LEFT="127.0.0.1", SERVER_IP_RIGHT="127.0.0.1",
+                        SERVER_PORT_LEFT=ports[0], SERVER_PORT_RIGHT=ports[1])
+        clients = ModbusClients(config=config, logger=logger)
+        try:
+            self.assertTrue(await clients.connect())
+            self.assertTrue(await clients.home())
+            self.assertTrue(await clients.set_analog_vel_max(0, 10 << 8))
+            self.assertTrue(await clients.set_analog_acc_max(0, 100 << 4))
+            self.assertTrue(await clients.set_host_command_mode(config.ANALOG_POSITION_MODE))
+            self.assertTrue(await clients.set_ieg_mode(2))
+            self.assertTrue(await clients.set_analog_modbus_cntrl((1000, 500)))
+            await asyncio.sleep(0.5)
+            left, right = await clients.read_snapshot()
+            self.assertTrue(left.is_homed())
+            self.assertFalse(left.is_faulted())
+            self.assertGreater(left.position[1] + left.position[0] / 65535, 3)
+            self.assertLess(right.position[1], left.position[1])
+
+            drives[1][0].inject_fault(1 << 10)
+            self.assertTrue(await clients.check_fault_stauts())
+            self.assertEqual((await clients.get_recent_fault())[1], 1 << 10)
+            self.assertTrue(await clients.set_ieg_mode(65535))
+            self.assertFalse(await clients.check_fault_stauts())
+        finally:
+            clients.cleanup()
+            for _, server, physics in drives:
+                physics.cancel()
+                server.close()
+
+class TestFaultMonitor(unittest.IsolatedAsyncioTestCase):
+    async def test_detects_and_resets_fault_from_snapshot(self):
+        logger = logging.getLogger("tests")
+        logger.disabled = True
+        drives = await start_drives(Config(), logger, (0, 0), homing_time=0.05)
+        ports = [server.sockets[0].getsockname()[1] for _, server, _ in drives]
+        config = Config(SERVER_IP_LEFT="127.0.0.1", SERVER_IP_RIGHT="127.0.0.1",
+                        SERVER_PORT_LEFT=ports[0], SERVER_PORT_RIGHT=ports[1])
+        clients = ModbusClients(config=config, logger=logger)
+        position_state = PositionState(config=config, logger=logger)
+        control_loop = ControlLoop(clients=clients, config=config, logger=logger)
+        monitor = FaultMonitor(clients=clients, config=config, logger=logger, position_state=position_state,
+                               control_loop=control_loop)
+        try:
+            self.assertTrue(await clients.connect())
+            self.assertFalse(await monitor.poll())
+            self.assertTrue(position_state.is_feedback_fresh())
+
+            position_state.set_commanded((5000, 5000))
+            for mailbox in control_loop.mailboxes.values():
+                mailbox.written = 5000
+            drives[0][0].inject_fault(1 << 10)
+            self.assertTrue(await monitor.poll())
+            self.assertEqual(monitor.faults, {"left": 1, "right": 0})
+            self.assertEqual(monitor.last_fault["left"], 1 << 10)
+            self.assertEqual(monitor.resets, 1)
+            self.assertIsNone(position_state.commanded)
+            self.assertIsNone(control_loop.mailboxes["left"].written)
+            self.assertEqual(control_loop.mailboxes["right"].written, 5000)
+
+            self.assertFalse(await monitor.poll())
+            self.assertEqual(monitor.faulted, {"left": False, "right": False})
+            self.assertEqual(monitor.bit_counts, {"communication": 1})
+            self.assertEqual(monitor.recovery_latency["communication"].count, 1)
+            self.assertEqual(monitor.interruption["left"].count, 1)
+            event = monitor.events[0]
+            self.assertEqual((event.side, event.bit, event.critical), ("left", 10, False))
+            self.assertLessEqual(event.reset_us, event.recovered_us)
+        finally:
+            clients.cleanup()
+            for _, server, physics in drives:
+                physics.cancel()
+                server.close()
+
+    async def test_control_loop_checks_faults_every_period(self):
+        logger = logging.getLogger("tests")
+        logger.disabled = True
+        drives = await start_drives(Config(), logger, (0, 0), homing_time=0.05)
+        ports = [server.sockets[0].getsockname()[1] for _, server, _ in drives]
+        config = Config(SERVER_IP_LEFT="127.0.0.1", SERVER_IP_RIGHT="127.0.0.1",
+                        SERVER_PORT_LEFT=ports[0], SERVER_PORT_RIGHT=ports[1], POS_UPDATE_HZ=20)
+        clients = ModbusClients(config=config, logger=logger)
+        position_state = PositionState(config=config, logger=logger)
+        control_loop = ControlLoop(clients=clients, config=config, logger=logger)
+        control_loop.monitor = FaultMonitor(clients=clients, config=config, logger=logger,
+                                            position_state=position_state, control_loop=control_loop)
+        loop = asyncio.get_running_loop()
+        try:
+            self.assertTrue(await clients.connect())
+            control_loop.start()
+            await asyncio.sleep(0.1)
+            self.assertTrue(position_state.is_feedback_fresh())
+
+            # No setpoints are written, the fault is still seen within a period
+            drives[1][0].inject_fault(1 << 10)
+            start = loop.time()
+            while control_loop.monitor.faults["right"] == 0 and loop.time() - start < 1:
+                await asyncio.sleep(0.005)
+            self.assertLess(loop.time() - start, control_loop.period + 0.02)
+            self.assertEqual(control_loop.monitor.last_fault["right"], 1 << 10)
+
+            # A setpoint posted while idle is written right away, not on the next check
+            start = loop.time()
+            control_loop.set_target((1000, 1000))
+            while control_loop.written[0] != 1000 and loop.time() - start < 1:
+                await asyncio.sleep(0.001)
+            self.assertLess(loop.time() - start, control_loop.period / 2)
+        finally:
+            await control_loop.stop()
+            clients.cleanup()
+            for _, server, physics in drives:
+                physics.cancel()
+                server.close()
+
+    async def test_critical_fault_is_not_reset(self):
+        clients = make_clients(FakeClient(), FakeClient())
+        monitor = FaultMonitor(clients=clients, config=Config(), logger=clients.logger)
+        monitor.on_fault("right", (1 << 7) | (1 << 1), time.perf_counter_ns())
+        self.assertEqual([event.name for event in monitor.active["right"]],
+                         ["continuous_current", "board_temperature"])
+        self.assertFalse(monitor.should_reset("right"))
+        self.assertEqual(monitor.critical, 1)
+
+class TestTelemetryShm(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("tests")
+        self.logger.disabled = True
+        self.writer = TelemetryWriter(f"test_telemetry_{os.getpid()}", self.logger)
+        # Reader and writer share the resource tracker registration in one process
+        with mock.patch("multiprocessing.resource_tracker.unregister"):
+            self.reader = TelemetryReader(self.writer.shm.name)
+
+    def tearDown(self):
+        self.reader.close()
+        self.writer.close()
+
+    def test_reader_sees_published_snapshot(self):
+        left = DriveSnapshot(status=0b1010, velocity=256, position=[32768, 5], fault=1 << 10)
+        self.writer.publish({"left": left, "right": None}, {"left": 1500})
+        sequence, drives = self.reader.read()
+        self.assertEqual(sequence, 2)
+        self.assertEqual(drives["left"].position, [32768, 5])
+        self.assertEqual((drives["left"].modbuscntrl, drives["left"].fault), (1500, 1 << 10))
+        self.assertTrue(drives["left"].faulted)
+        self.assertTrue(drives["left"].valid)
+        self.assertFalse(drives["right"].valid)
+
+    def test_reader_retries_while_write_in_progress(self):
+        SEQUENCE.pack_into(self.writer.buf, SEQUENCE_OFFSET, 3)
+        self.assertIsNone(self.reader.read(max_attempts=5))
+        self.assertEqual(self.reader.retries, 5)
+
+    def test_writer_recreates_block_with_another_layout(self):
+        name = f"test_telemetry_stale_{os.getpid()}"
+        stale = shared_memory.SharedMemory(name=name, create=True, size=16)
+        stale.buf[:4] = b"OLDM"
+        try:
+            writer = TelemetryWriter(name, self.logger)
+            try:
+                self.assertGreaterEqual(writer.shm.size, BLOCK_SIZE)
+                with mock.patch("multiprocessing.resource_tracker.unregister"):
+                    reader = TelemetryReader(name)
+                reader.close()
+            finally:
+                writer.close()
+        finally:
+            stale.close()
+
+HUNG_MODULE = """
+import asyncio, sys, time
+sys.path.insert(0, {src!r})
+from heartbeat import start_heartbeat
+
+async def main():
+    start_heartbeat(0.02)
+    await asyncio.sleep(0.2)
+    time.sleep(30) # blocks the event loop, heartbeats stop
+
+asyncio.run(main())
+"""
+
+STANDBY_MODULE = """
+import asyncio, sys
+sys.path.insert(0, {src!r})
+from heartbeat import start_heartbeat, wait_until_active
+
+async def main():
+    start_heartbeat(0.02)
+    await wait_until_active()
+    await asyncio.sleep(30)
+
+asyncio.run(main())
+"""
+
+class TestModuleSupervision(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("tests")
+        self.logger.disabled = True
+        self.tmp = tempfile.TemporaryDirectory()
+        self.manager = ModuleManager(self.logger)
+        self.manager.src_dir = self.tmp.name
+        with open(os.path.join(self.tmp.name, "exits.py"), "w") as f:
+            f.write("import sys\nsys.exit(3)\n")
+        with open(os.path.join(self.tmp.name, "hung.py"), "w") as f:
+            f.write(HUNG_MODULE.format(src=os.path.dirname(os.path.abspath(__file__))))
+        with open(os.path.join(self.tmp.name, "standby.py"), "w") as f:
+            f.write(STANDBY_MODULE.format(src=os.path.dirname(os.path.abspath(__file__))))
+
+    async def asyncTearDown(self):
+        self.manager.cleanup_all()
+        await asyncio.gather(*self.manager.supervisors.values(), return_exceptions=True)
+        self.tmp.cleanup()
+
+    async def test_exited_module_is_relaunched(self):
+        self.manager.MIN_UPTIME = 0
+        self.manager.start_supervised("exits")
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if self.manager.supervised["exits"]["restarts"] >= 2:
+                break
+        stats = self.manager.stats()["exits"]
+        self.assertGreaterEqual(stats["restarts"], 2)
+        self.assertEqual((stats["last_exit"], stats["last_reason"]), (3, "exited"))
+
+    async def test_crash_looping_module_backs_off(self):
+        self.manager.BACKOFF_INITIAL, self.manager.BACKOFF_MAX = 0.05, 0.2
+        self.manager.start_supervised("exits")
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if self.manager.supervised["exits"]["crash_restarts"] >= 4:
+                break
+        stats = self.manager.stats()["exits"]
+        self.assertGreaterEqual(stats["crash_restarts"], 4)
+        self.assertEqual(stats["backoff"], 0.2)
+        self.assertEqual((stats["restarts"], stats["restart_latency"]["count"]), (0, 0))
+
+    async def test_silent_module_is_killed_and_relaunched(self):
+        self.manager.MIN_UPTIME = 0
+        self.manager.start_supervised("hung", heartbeat_timeout=0.2)
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            if self.manager.supervised["hung"]["restarts"] >= 1:
+                break
+        stats = self.manager.supervised["hung"]
+        self.assertEqual(stats["last_reason"], "missed heartbeat")
+        self.assertEqual(stats["restarts"], 1)
+        self.assertEqual(stats["restart_latency"].count, 1)
+
+    async def test_standby_is_promoted_when_active_dies(self):
+        self.manager.MIN_UPTIME = 0
+        self.manager.start_supervised("standby", heartbeat_timeout=0.2, standby=True)
+        stats = self.manager.supervised
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            pid, standby_pid = stats["standby"]["pid"], stats["standby"]["standby_pid"]
+            if standby_pid and self.manager.processes[standby_pid]["last-heartbeat"] is not None:
+                break
+
+        self.manager.processes[pid]["process"].kill()
+        for _ in range(100):
+            await asyncio.sleep(0.02)
+            if stats["standby"]["restarts"] >= 1:
+                break
+        self.assertEqual(stats["standby"]["failovers"], 1)
+        self.assertEqual(stats["standby"]["pid"], standby_pid)
+        self.assertNotEqual(stats["standby"]["standby_pid"], standby_pid)
+        self.assertEqual(stats["standby"]["restart_latency"].count, 1)
+
+    async def test_standby_is_promoted_without_crash_backoff(self):
+        # Dies well within MIN_UPTIME, the backoff would hold a relaunch for 5 s
+        self.manager.BACKOFF_INITIAL = 5.0
+        self.manager.start_supervised("standby", heartbeat_timeout=0.2, standby=True)
+        stats = self.manager.supervised
+        for _ in range(100):
+            await asyncio.sleep(0.05)
+            pid, standby_pid = stats["standby"]["pid"], stats["standby"]["standby_pid"]
+            if standby_pid and self.manager.processes[standby_pid]["last-heartbeat"] is not None:
+                break
+
+        self.manager.processes[pid]["process"].kill()
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if stats["standby"]["failovers"] >= 1:
+                break
+        self.assertEqual(stats["standby"]["failovers"], 1)
+        self.assertEqual(stats["standby"]["crash_restarts"], 1)
+        self.assertEqual(stats["standby"]["pid"], standby_pid)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""
+Timestamped platform trajectories, validated in one vectorized pass and played back on the server.
+
+A trajectory is a float array with one row per sample:
+    time s | pitch deg | roll deg [| acc_x m/s^2 | acc_y m/s^2]
+uploaded either as a .npy file (np.save) or as raw little endian float64 rows of all 5 columns.
+Times start from 0 or later and have to increase.
+"""
+import asyncio
+import io
+import numpy as np
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from latency_stats import LatencyHistogram
+from utils import cancel_and_wait
+
+COLUMNS = 5
+NPY_MAGIC = b"\x93NUMPY"
+
+@dataclass
+class Trajectory:
+    times: np.ndarray # seconds from the start of playback
+    values: np.ndarray # (n, 2) int (left, right) ModbusCtrl
+    max_velocity: float # highest actuator velocity, revs/s
+    max_acceleration: float # revs/s^2
+
+    def summary(self):
+        return {
+            "samples": len(self.times),
+            "duration_s": float(self.times[-1] - self.times[0]),
+            "max_velocity_revs": round(self.max_velocity, 3),
+            "max_acceleration_revs": round(self.max_acceleration, 3),
+        }
+
+def parse_trajectory(data: bytes, max_samples: int) -> np.ndarray:
+    """
+    Uploaded bytes to an (n, 5) float64 array, missing acceleration columns are 0.
+    Raises ValueError if the data is not a trajectory
+    """
+    if data.startswith(NPY_MAGIC):
+        samples = np.load(io.BytesIO(data), allow_pickle=False)
+    else:
+        if len(data) % (COLUMNS * 8) != 0:
+            raise ValueError(f"raw trajectory has to be rows of {COLUMNS} little endian float64")
+        samples = np.frombuffer(data, dtype="<f8").reshape(-1, COLUMNS)
+
+    if samples.ndim != 2 or samples.shape[1] not in (3, COLUMNS):
+        raise ValueError(f"trajectory has to have 3 or {COLUMNS} columns, got shape {samples.shape}")
+    if not 2 <= len(samples) <= max_samples:
+        raise ValueError(f"trajectory has to have 2 - {max_samples} samples, got {len(samples)}")
+    samples = samples.astype(np.float64)
+    if samples.shape[1] == 3:
+        samples = np.hstack([samples, np.zeros((len(samples), 2))])
+    return samples
+
+def first_violation(mask: np.ndarray, times: np.ndarray, message: str) -> Optional[dict]:
+    indexes = np.flatnonzero(mask)
+    if len(indexes) == 0:
+        return None
+    return {"error": message, "count": int(len(indexes)), "first_index": int(indexes[0]),
+            "first_time": float(times[indexes[0]])}
+
+def validate_trajectory(samples: np.ndarray, kinematics, config) -> Tuple[Optional[Trajectory], List[dict]]:
+    """
+    Checks every sample at once against the angle and stroke limits and the velocity and
+    acceleration limits the drives are set to (config.VEL and config.ACC). Velocities come
+    from unrounded actuator positions, so ModbusCtrl quantization does not show up as speed.
+    Returns (trajectory, []) or (None, a list of the violations)
+    """
+    times = samples[:, 0]
+    if not np.all(np.isfinite(samples)):
+        return None, [{"error": "trajectory has non finite values"}]
+
+    errors = []
+    if times[0] < 0:
+        errors.append({"error": "times have to start from 0 or later"})
+    intervals = np.diff(times)
+    errors.append(first_violation(intervals <= 0, times[1:], "times have to increase"))
+    if any(errors):
+        return None, [error for error in errors if error]
+
+    raw_values, clamped = kinematics.modbuscntrl_batch(samples[:, 1], samples[:, 2], samples[:, 3], samples[:, 4])
+    revs_per_count = (config.POS_MAX_REVS - config.POS_MIN_REVS) / config.MODBUSCTRL_MAX
+    velocity = np.diff(raw_values, axis=0) * revs_per_count / intervals[:, np.newaxis]
+    acceleration = np.diff(velocity, axis=0) / ((intervals[1:] + intervals[:-1]) / 2)[:, np.newaxis]
+    speed = np.max(np.abs(velocity), axis=1)
+    acceleration_magnitude = np.max(np.abs(acceleration), axis=1) if len(acceleration) else np.zeros(0)
+    max_velocity = config.VEL / 60.0
+    max_acceleration = config.ACC / 60.0
+
+    errors = [
+        first_violation(clamped, times, "outside the angle or stroke limits"),
+        first_violation(speed > max_velocity, times[1:], f"actuator velocity over {max_velocity:.3f} revs/s"),
+        first_violation(acceleration_magnitude > max_acceleration, times[1:-1],
+                        f"actuator acceleration over {max_acceleration:.3f} revs/s^2"),
+    ]
+    errors = [error for error in errors if error]
+    if errors:
+        return None, errors
+
+    values = np.clip(np.floor(raw_values), 0, config.MODBUSCTRL_MAX).astype(np.int64)
+    return Trajectory(times.copy(), values, float(speed.max()),
+                      float(acceleration_magnitude.max()) if len(acceleration_magnitude) else 0.0), []
+
+class TrajectoryPlayer:
+    """
+    Plays a validated trajectory through the control loop. The motors are first driven to
+    the first sample, playback timing starts once they are within TRAJECTORY_START_TOLERANCE
+    of it, and then each sample's targets are set at its time from the start of playback.
+    Records how late every sample was set and, for every position feedback sample
+    (fault monitor) during playback, how far the motors were from the planned position.
+    """
+    def __init__(self, control_loop, position_state, clients, config, logger):
+        self.control_loop = control_loop
+        self.position_state = position_state
+        self.clients = clients
+        self.config = config
+        self.logger = logger
+        self.trajectory: Optional[Trajectory] = None
+        self.task: Optional[asyncio.Task] = None
+        self.state = "empty"
+        self.reset_report()
+
+    def reset_report(self):
+        self.played = 0
+        self.lateness = LatencyHistogram()
+        self.actual_duration = None
+        self.tracking_errors: List[Tuple[int, int]] = []
+
+    async def load(self, trajectory: Trajectory):
+        await self.stop()
+        self.trajectory = trajectory
+        self.state = "loaded"
+        self.reset_report()
+
+    async def approach(self, first) -> bool:
+        """
+        Moves the motors to the first sample, returns False if they do not get
+        there within TRAJECTORY_APPROACH_TIMEOUT
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.TRAJECTORY_APPROACH_TIMEOUT
+        self.state = "approaching"
+        self.control_loop.set_target(first)
+        self.position_state.set_commanded(self.control_loop.target)
+        while True:
+            if self.position_state.is_feedback_fresh():
+                feedback = self.position_state.feedback
+            else:
+                feedback = await self.position_state.sample_feedback(self.clients)
+            if feedback is not None and all(abs(position - target) <= self.config.TRAJECTORY_START_TOLERANCE
+                                            for position, target in zip(feedback, self.control_loop.target)):
+                return True
+            if loop.time() > deadline:
+                self.logger.error(f"Motors did not reach the trajectory start {first}, at {feedback}")
+                return False
+            await asyncio.sleep(0.05)
+
+    async def run(self):
+        trajectory = self.trajectory
+        loop = asyncio.get_running_loop()
+        times = trajectory.times.tolist()
+        values = trajectory.values.tolist()
+        if not await self.approach(values[0]):
+            self.state = "approach_failed"
+            return
+        feedback_seen = self.position_state.feedback_time
+        # Shift so the first sample is set right away
+        start = loop.time() - times[0]
+        self.state = "playing"
+        self.logger.info(f"Playing trajectory of {len(times)} samples, {times[-1]:.2f} s")
+
+        for index, (planned, value) in enumerate(zip(times, values)):
+            delay = start + planned - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.lateness.record(max(0, int((loop.time() - start - planned) * 1e9)))
+            self.control_loop.set_target(value)
+            self.position_state.set_commanded(self.control_loop.target)
+            self.played = index + 1
+
+            # Feedback timestamps use the same monotonic clock as the event loop
+            feedback_time = self.position_state.feedback_time
+            if feedback_time != feedback_seen and self.position_state.feedback is not None:
+                feedback_seen = feedback_time
+                elapsed = feedback_time - start
+                if times[0] <= elapsed:
+                    planned_left = np.interp(elapsed, trajectory.times, trajectory.values[:, 0])
+                    planned_right = np.interp(elapsed, trajectory.times, trajectory.values[:, 1])
+                    feedback_left, feedback_right = self.position_state.feedback
+                    self.tracking_errors.append((feedback_left - planned_left, feedback_right - planned_right))
+
+        self.actual_duration = loop.time() - start - times[0]
+        self.state = "done"
+        self.logger.info(f"Trajectory done, max lateness {self.lateness.max_ns / 1e6:.2f} ms")
+
+    def start(self) -> bool:
+        if self.trajectory is None:
+            return False
+        if self.task is None or self.task.done():
+            self.reset_report()
+            self.task = asyncio.create_task(self.run())
+        return True
+
+    async def stop(self):
+        if self.task is not None:
+            # Interrupted while approaching or playing, a finished run keeps its result
+            interrupted = not self.task.done()
+            await cancel_and_wait(self.task)
+            self.task = None
+            if interrupted:
+                self.state = "stopped"
+
+    def stats(self):
+        stats = {
+            "state": self.state,
+            "trajectory": self.trajectory.summary() if self.trajectory is not None else None,
+            "played": self.played,
+            "planned_duration_s": float(self.trajectory.times[-1] - self.trajectory.times[0])
+                                  if self.trajectory is not None else None,
+            "actual_duration_s": round(self.actual_duration, 4) if self.actual_duration is not None else None,
+            "lateness": self.lateness.summary(),
+            "tracking": None,
+        }
+        if self.tracking_errors:
+            errors = np.abs(np.array(self.tracking_errors, dtype=np.float64))
+            stats["tracking"] = {
+                "unit": "ModbusCtrl",
+                "samples": len(errors),
+                **{side: {"mean": round(float(errors[:, index].mean()), 1),
+                          "rms": round(float(np.sqrt((errors[:, index] ** 2).mean())), 1),
+                          "max": round(float(errors[:, index].max()), 1)}
+                   for index, side in enumerate(("left", "right"))},
+            }
+        return stats
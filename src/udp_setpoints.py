@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Callable, Optional
+from latency_stats import LatencyHistogram
+from setpoint_stream import Setpoint, decode_setpoint
+
+SEQUENCE_MODULO = 2 ** 32
+
+class UdpSetpointListener(asyncio.DatagramProtocol):
+    """
+    Setpoint input over UDP, one binary setpoint message (setpoint_stream.py) per datagram.
+    Only the newest setpoint matters, so nothing is ever waited for or resent: a datagram
+    with an older sequence number than one already applied is dropped, and so is one that
+    took more than UDP_STALE_AFTER seconds longer than the fastest datagram of the sender.
+    The sender timestamp is only compared to itself, the clocks do not have to be in sync.
+    The listener locks onto one sender address, datagrams from any other address are
+    rejected until the sender has been silent for UDP_SENDER_TIMEOUT. Then the next
+    datagram, from it or a new address, starts the sequence over.
+    """
+    def __init__(self, config, logger, apply: Callable[[Setpoint], object]):
+        self.config = config
+        self.logger = logger
+        self.apply = apply
+        self.transport: Optional[asyncio.DatagramTransport] = None
+        self.sender = None
+        self.last_sequence: Optional[int] = None
+        self.last_received = 0.0
+        # Smallest receive time - sender timestamp, the clock offset plus the fastest delivery
+        self.min_delay: Optional[float] = None
+        self.received = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.stale = 0
+        self.resyncs = 0
+        self.handling = LatencyHistogram()
+
+    async def start(self):
+        if self.transport is None:
+            loop = asyncio.get_running_loop()
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: self, local_addr=(self.config.UDP_SETPOINT_HOST, self.config.UDP_SETPOINT_PORT))
+            self.logger.info(f"Listening for UDP setpoints on port {self.config.UDP_SETPOINT_PORT}")
+        return self.transport
+
+    def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def datagram_received(self, data, address):
+        received_ns = time.perf_counter_ns()
+        now = time.time()
+        self.received += 1
+        try:
+            setpoint = decode_setpoint(data)
+        except ValueError:
+            self.rejected += 1
+            return
+
+        if now - self.last_received > self.config.UDP_SENDER_TIMEOUT:
+            self.sender = None
+        if self.sender is not None and address != self.sender:
+            # Another source while the current sender is still live
+            self.rejected += 1
+            return
+        if self.sender is None:
+            self.sender = address
+            self.last_sequence = None
+            self.min_delay = None
+            self.resyncs += 1
+        self.last_received = now
+
+        if self.last_sequence is not None:
+            gap = (setpoint.sequence - self.last_sequence) % SEQUENCE_MODULO
+            if gap == 0:
+                self.duplicates += 1
+                return
+            if gap >= SEQUENCE_MODULO // 2:
+                # Older than one already applied, it was counted lost when it was skipped
+                self.reordered += 1
+                self.lost = max(0, self.lost - 1)
+                return
+            self.lost += gap - 1
+        self.last_sequence = setpoint.sequence
+
+        delay = now - setpoint.timestamp
+        if self.min_delay is None or delay < self.min_delay:
+            self.min_delay = delay
+        if delay - self.min_delay > self.config.UDP_STALE_AFTER:
+            self.stale += 1
+            return
+
+        self.apply(setpoint)
+        self.accepted += 1
+        self.handling.record(time.perf_counter_ns() - received_ns)
+
+    def error_received(self, exc):
+        self.logger.warning(f"UDP setpoint listener error: {exc}")
+
+    def stats(self):
+        expected = self.accepted + self.stale + self.lost
+        return {
+            "listening": self.transport is not None,
+            "received": self.received,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "lost": self.lost,
+            "loss_ratio": round(self.lost / expected, 4) if expected else 0.0,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "stale": self.stale,
+            "resyncs": self.resyncs,
+            "handling": self.handling.summary(),
+        }
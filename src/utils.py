@@ -1,3 +1,4 @@
+import asyncio
 import math
 
 FAULT_RESET_BIT = 15
@@ -184,3 +185,33 @@ def convert_acc_rpm_revs(rpm):
         whole_num_register_bits = combine_12_4bit(int(whole), four_b)
         return (whole_num_register_bits, sixteen_b)
 
+def convert_to_revs(pfeedback):
+    """
+    Converts PFEEDBACK_POSITION response or its register list
+    (decimal register first, whole second) into revs
+    """
+    registers = getattr(pfeedback, "registers", pfeedback)
+    decimal = registers[0] / 65535
+    num = registers[1]
+    return num + decimal
+
+def revs_to_modbuscntrl(revs, config):
+    """
+    Calculates with linear interpolation the percentile where revs are
+    in the current max_rev - min_rev range and multiplies it with
+    the maximum modbuscntrl value (10k)
+    """
+    ## Percentile = x - pos_min / (pos_max - pos_min)
+    percentile = (revs - config.POS_MIN_REVS) / (config.POS_MAX_REVS - config.POS_MIN_REVS)
+    percentile = max(0, min(percentile, 1))
+    return math.floor(percentile * config.MODBUSCTRL_MAX)
+
+async def cancel_and_wait(task, poll_interval=0.1):
+    """
+    Cancels task and waits until it has finished. Cancels again if the task
+    swallowed the cancellation (asyncio.wait_for can do that before Python 3.12
+    when the inner request finishes at the same moment).
+    """
+    while not task.done():
+        task.cancel()
+        await asyncio.wait({task}, timeout=poll_interval)